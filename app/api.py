@@ -1,122 +1,603 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import asyncio
+import base64
+import logging
+import os
+import posixpath
+import re
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse
+from botocore.exceptions import ClientError
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from sqlalchemy import and_, or_
 from sqlmodel import select
-from app.db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db import get_async_engine, get_async_session
 from app.models import Video, Room
 from app.schemas import VideoRead, RoomRead, RoomCreate
-from app.s3 import upload_video_file, make_video_url 
-from app.s3 import s3, S3_BUCKET_NAME
+from app.schemas import UploadInit, UploadSession, UploadPart, UploadStatus, UploadComplete
+from app.schemas import UploadPresignRequest, UploadPresigned
+from app.s3 import make_video_url, new_video_key
+from app.s3 import get_s3, S3_BUCKET_NAME, S3_UPLOAD_PART_SIZE, S3_URL_CACHE_MARGIN, UrlCache
+from app.s3 import start_multipart_upload, upload_part, list_uploaded_parts
+from app.s3 import complete_multipart_upload, abort_multipart_upload, presign_upload_part
+from app import websocket
+from app.edge_cache import get_edge_cache
+from app.uploads import StreamingUpload, iter_form_file, read_limited
 from pathlib import Path
 
 router = APIRouter(prefix="/api")
 
 
-@router.post("/videos", response_model=VideoRead)
-async def upload_video(file: UploadFile = File(...)):
-    try:
-        s3_key = upload_video_file(file.file, file.filename)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"S3 upload error: {e}")
+def _video_read(v: Video, signed: bool = True) -> VideoRead:
+    return VideoRead(
+        id=v.id,
+        filename=v.filename,
+        s3_key=v.s3_key,
+        url=make_video_url(v.s3_key) if signed else None,
+        hls_master=v.hls_master,
+        status=v.status,
+        content_hash=v.content_hash,
+    )
+
+
+# chunked (resumable) uploads: a single part request is buffered in memory
+UPLOAD_MAX_PART_SIZE = 4 * S3_UPLOAD_PART_SIZE
+# direct-to-S3 uploads: how long a presigned part URL stays valid and how many
+# can be requested at once (the browser asks for more as it goes)
+UPLOAD_PRESIGN_EXPIRES = 3600
+UPLOAD_PRESIGN_BATCH = 100
+_UPLOAD_KEY_RE = re.compile(r"^videos/[0-9a-f]{32}\.[A-Za-z0-9]+$")
+
 
-    with get_session() as session:
-        v = Video(filename=file.filename, s3_key=s3_key)
+async def _register_video(session: AsyncSession, filename: str, s3_key: str, content_hash: Optional[str] = None) -> Video:
+    from app.tasks import cached_output_query
+
+    cached = None
+    if content_hash:
+        cached = (await session.exec(cached_output_query(content_hash))).first()
+    if cached is not None:
+        # the same file was already transcoded with this ladder: share its
+        # source and HLS output, drop the copy that was just uploaded
+        v = Video(
+            filename=filename,
+            s3_key=cached.s3_key,
+            hls_master=cached.hls_master,
+            status="ready",
+            content_hash=content_hash,
+            ladder_fingerprint=cached.ladder_fingerprint,
+        )
         session.add(v)
-        session.commit()
-        session.refresh(v)
+        await session.commit()
+        await session.refresh(v)
+        try:
+            await run_in_threadpool(get_s3().delete_object, Bucket=S3_BUCKET_NAME, Key=s3_key)
+        except Exception:
+            # unowned, the orphan sweep removes it later
+            pass
+        return v
+
+    v = Video(filename=filename, s3_key=s3_key, content_hash=content_hash)
+    session.add(v)
+    await session.commit()
+    await session.refresh(v)
 
     # enqueue transcode / HLS creation job
     try:
         from app.tasks import transcode_video
-        transcode_video.send(s3_key, v.id)
+        # the broker call is a blocking Redis round trip
+        await run_in_threadpool(transcode_video.send, s3_key, v.id)
     except Exception:
         # don't fail upload if the worker is not available
         pass
+    return v
 
-    return VideoRead(
-        id=v.id,
-        filename=v.filename,
-        s3_key=v.s3_key,
-        url=make_video_url(v.s3_key),
-        hls_master=v.hls_master,
-        status=v.status,
+
+@router.post(
+    "/videos",
+    response_model=VideoRead,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "multipart/form-data": {"schema": {"type": "object", "properties": {"file": {"type": "string", "format": "binary"}}}},
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+            }
+        }
+    },
+)
+async def upload_video(request: Request, filename: Optional[str] = None, session: AsyncSession = Depends(get_async_session)):
+    """Upload a video, streaming the body straight into S3.
+
+    Accepts either a multipart form with a `file` field or the raw file as the
+    request body (name passed via `?filename=` or the `X-Filename` header).
+    A file identical to one already transcoded (same sha256 and ladder) comes
+    back ready, sharing the existing objects.
+    """
+    upload: Optional[StreamingUpload] = None
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            async for kind, value in iter_form_file(request):
+                if kind == "file":
+                    filename = value[0]
+                    upload = StreamingUpload(new_video_key(filename))
+                else:
+                    await upload.write(value)
+        else:
+            filename = filename or request.headers.get("x-filename")
+            if filename:
+                upload = StreamingUpload(new_video_key(filename))
+                async for chunk in request.stream():
+                    await upload.write(chunk)
+        if upload is None:
+            raise HTTPException(status_code=400, detail="No file in request")
+        s3_key = await upload.finish()
+    except HTTPException:
+        raise
+    except ClientDisconnect:
+        if upload is not None:
+            await upload.abort()
+        raise HTTPException(status_code=400, detail="Client disconnected during upload")
+    except ValueError as e:
+        # malformed multipart body (e.g. no boundary): the client's fault
+        if upload is not None:
+            await upload.abort()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        if upload is not None:
+            await upload.abort()
+        raise HTTPException(status_code=500, detail=f"S3 upload error: {e}")
+
+    v = await _register_video(session, filename, s3_key, upload.sha256)
+    return _video_read(v)
+
+
+def _check_upload_key(key: str):
+    if not _UPLOAD_KEY_RE.match(key):
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+
+
+@router.post("/uploads", response_model=UploadSession)
+async def create_upload(in_data: UploadInit):
+    """Start a resumable upload; the client then PUTs numbered parts."""
+    key = new_video_key(in_data.filename)
+    try:
+        upload_id = await run_in_threadpool(start_multipart_upload, key)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"S3 upload error: {e}")
+    return UploadSession(key=key, upload_id=upload_id, part_size=S3_UPLOAD_PART_SIZE)
+
+
+@router.put("/uploads/{upload_id}/parts/{part_number}", response_model=UploadPart)
+async def put_upload_part(upload_id: str, part_number: int, key: str, request: Request):
+    _check_upload_key(key)
+    if not 1 <= part_number <= 10000:
+        raise HTTPException(status_code=400, detail="part_number must be within 1..10000")
+    try:
+        data = await read_limited(request, UPLOAD_MAX_PART_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        etag = await run_in_threadpool(upload_part, key, upload_id, part_number, data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"S3 upload error: {e}")
+    return UploadPart(part_number=part_number, etag=etag, size=len(data))
+
+
+@router.post("/uploads/{upload_id}/presign", response_model=UploadPresigned)
+def presign_upload(upload_id: str, in_data: UploadPresignRequest):
+    """Presigned part URLs so the browser can upload straight to S3.
+
+    Signing is local (no S3 round-trip). Parts PUT this way are picked up by
+    `/complete` through `list_parts`, so the client doesn't need to read ETags.
+    """
+    _check_upload_key(in_data.key)
+    if len(in_data.part_numbers) > UPLOAD_PRESIGN_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {UPLOAD_PRESIGN_BATCH} parts per request")
+    if any(not 1 <= n <= 10000 for n in in_data.part_numbers):
+        raise HTTPException(status_code=400, detail="part_number must be within 1..10000")
+    urls = {n: presign_upload_part(in_data.key, upload_id, n, UPLOAD_PRESIGN_EXPIRES) for n in in_data.part_numbers}
+    return UploadPresigned(urls=urls, expires_in=UPLOAD_PRESIGN_EXPIRES)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatus)
+async def get_upload(upload_id: str, key: str):
+    """List parts already stored so an interrupted client can resume."""
+    _check_upload_key(key)
+    try:
+        parts = await run_in_threadpool(list_uploaded_parts, key, upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=f"Upload not found: {e}")
+    return UploadStatus(
+        key=key,
+        upload_id=upload_id,
+        part_size=S3_UPLOAD_PART_SIZE,
+        parts=[UploadPart(part_number=p["PartNumber"], etag=p["ETag"], size=p.get("Size")) for p in parts],
     )
 
 
+@router.post("/uploads/{upload_id}/complete", response_model=VideoRead)
+async def complete_upload(upload_id: str, in_data: UploadComplete, session: AsyncSession = Depends(get_async_session)):
+    _check_upload_key(in_data.key)
+    try:
+        await run_in_threadpool(complete_multipart_upload, in_data.key, upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"S3 upload error: {e}")
+    v = await _register_video(session, in_data.filename, in_data.key)
+    return _video_read(v)
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, key: str):
+    _check_upload_key(key)
+    try:
+        await run_in_threadpool(abort_multipart_upload, key, upload_id)
+    except Exception:
+        pass
+    return {"ok": True}
+
+
+CATALOG_DEFAULT_LIMIT = 100
+CATALOG_MAX_LIMIT = 1000
+
+
+def _encode_cursor(v: Video, order: str) -> str:
+    raw = str(v.id) if order == "id" else f"{v.uploaded_at.isoformat()}|{v.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, order: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if order == "id":
+            return int(raw)
+        ts, vid = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(vid)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/videos", response_model=list[VideoRead])
-def list_videos():
-    with get_session() as session:
-        videos = session.exec(select(Video)).all()
-    return [
-        VideoRead(
-            id=v.id,
-            filename=v.filename,
-            s3_key=v.s3_key,
-            url=make_video_url(v.s3_key),
-            hls_master=v.hls_master,
-            status=v.status,
-        )
-        for v in videos
-    ]
+async def list_videos(
+    response: Response,
+    limit: int = Query(CATALOG_DEFAULT_LIMIT, ge=1, le=CATALOG_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    order: Literal["id", "newest"] = "id",
+    slim: bool = False,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Keyset-paginated catalog.
+
+    The cursor for the next page is returned in the `X-Next-Cursor` header
+    (absent on the last page). `order=id` walks oldest-first by primary key,
+    `order=newest` walks by `uploaded_at` descending. With `slim=true` the
+    presigned `url` is left out; fetch `/api/videos/{id}` once a video is picked.
+    Videos being deleted are hidden unless asked for with `status=deleting`.
+    """
+    q = select(Video)
+    if status:
+        q = q.where(Video.status == status)
+    else:
+        q = q.where(or_(Video.status.is_(None), Video.status != "deleting"))
+    if order == "id":
+        if cursor:
+            q = q.where(Video.id > _decode_cursor(cursor, order))
+        q = q.order_by(Video.id)
+    else:
+        if cursor:
+            ts, vid = _decode_cursor(cursor, order)
+            q = q.where(or_(Video.uploaded_at < ts, and_(Video.uploaded_at == ts, Video.id < vid)))
+        q = q.order_by(Video.uploaded_at.desc(), Video.id.desc())
+    # one extra row tells us whether there is a next page
+    videos = (await session.exec(q.limit(limit + 1))).all()
+    if len(videos) > limit:
+        videos = videos[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(videos[-1], order)
+    if slim:
+        return [_video_read(v, signed=False) for v in videos]
+    return [_video_read(v) for v in videos]
 
 
 @router.get("/videos/{video_id}", response_model=VideoRead)
-def get_video(video_id: int):
-    with get_session() as session:
-        v = session.get(Video, video_id)
-        if not v:
-            raise HTTPException(status_code=404, detail="Video not found")
-    return VideoRead(
-        id=v.id,
-        filename=v.filename,
-        s3_key=v.s3_key,
-        url=make_video_url(v.s3_key),
-        hls_master=v.hls_master,
-        status=v.status,
-    )
+async def get_video(video_id: int, session: AsyncSession = Depends(get_async_session)):
+    v = await session.get(Video, video_id)
+    if not v:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return _video_read(v)
+
 
+@router.delete("/videos/{video_id}", status_code=202)
+async def delete_video(video_id: int, session: AsyncSession = Depends(get_async_session)):
+    """Mark the video as deleting and hand the S3 cleanup to the worker.
 
-@router.delete("/videos/{video_id}")
-def delete_video(video_id: int):
-    with get_session() as session:
-        v = session.get(Video, video_id)
-        if not v:
-            raise HTTPException(status_code=404, detail="Video not found")
+    The row disappears once every object under its prefixes is gone (see
+    app.tasks.delete_video_objects); deleting an already deleting video
+    enqueues the job again.
+    """
+    v = await session.get(Video, video_id)
+    if not v:
+        raise HTTPException(status_code=404, detail="Video not found")
+    v.status = "deleting"
+    session.add(v)
+    await session.commit()
 
-        # delete original object
+    from app.tasks import delete_video_objects, delete_video_objects_sync
+
+    try:
+        await run_in_threadpool(delete_video_objects.send, v.id, v.s3_key)
+    except Exception:
+        # no broker: clean up in-process (boto3 is blocking, keep it off the loop)
         try:
-            s3.delete_object(Bucket=S3_BUCKET_NAME, Key=v.s3_key)
+            await run_in_threadpool(delete_video_objects_sync, v.id, v.s3_key)
         except Exception:
-            # best-effort: continue even if S3 fails
-            pass
+            raise HTTPException(status_code=502, detail="S3 cleanup failed, retry the delete")
+
+    return {"ok": True, "status": "deleting"}
+
+
+# playlists are small and hot: keep them in-process for a few seconds.
+# Finished (ENDLIST) variants never change, EVENT playlists of running
+# transcodes must be refetched quickly.
+HLS_PLAYLIST_CACHE_SIZE = 2048
+HLS_LIVE_PLAYLIST_TTL = 2
+HLS_FINAL_PLAYLIST_TTL = 300
+HLS_MASTER_MAX_AGE = 60
+HLS_FINAL_MAX_AGE = 86400
+# segment redirects point at cached presigned URLs that stay valid for at
+# least S3_URL_CACHE_MARGIN seconds; caches must drop the redirect before that
+HLS_REDIRECT_MAX_AGE = S3_URL_CACHE_MARGIN // 2
+_HLS_STEM_RE = re.compile(r"^[A-Za-z0-9._-]+$")
+# text files served (and cached) by the app; anything else is redirected to S3
+# or, with the edge cache on (app.edge_cache), served from local disk
+_HLS_TEXT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".vtt": "text/vtt"}
+_HLS_MEDIA_TYPES = {".ts": "video/mp2t", ".m4s": "video/iso.segment", ".mp4": "video/mp4", ".aac": "audio/aac", ".jpg": "image/jpeg"}
+playlist_cache = UrlCache(HLS_PLAYLIST_CACHE_SIZE, HLS_FINAL_PLAYLIST_TTL)
+
+
+def _load_playlist(key: str) -> Optional[tuple[str, bytes, bool]]:
+    """Return (etag, body, final) for a playlist, via the in-process cache."""
+    cached = playlist_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        obj = get_s3().get_object(Bucket=S3_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    body = obj["Body"].read()
+    # the trickplay index is written once, after the encode
+    final = key.endswith(("/master.m3u8", ".vtt")) or b"#EXT-X-ENDLIST" in body
+    entry = (obj["ETag"], body, final)
+    playlist_cache.put(key, entry, ttl=HLS_FINAL_PLAYLIST_TTL if final else HLS_LIVE_PLAYLIST_TTL)
+    return entry
 
-        # delete all HLS objects under prefix
+
+class _CachedFileResponse(FileResponse):
+    """FileResponse for a pinned edge cache entry; unpins it once sent."""
+
+    def __init__(self, cache, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._cache = cache
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._cache.release(self.path)
+
+
+async def _hls_file(key: str) -> Response:
+    cache = get_edge_cache()
+    entry = None
+    if cache is not None:
         try:
-            prefix = f"hls/{Path(v.s3_key).stem}/"
-            resp = s3.list_objects_v2(Bucket=S3_BUCKET_NAME, Prefix=prefix)
-            keys = [obj["Key"] for obj in resp.get("Contents", [])]
-            if keys:
-                # batch delete
-                s3.delete_objects(Bucket=S3_BUCKET_NAME, Delete={"Objects": [{"Key": k} for k in keys]})
+            # pinned so eviction can't unlink the file before FileResponse opens it
+            entry = await cache.get(key, pin=True)
         except Exception:
-            pass
+            # S3 trouble: fall back to the redirect and let the client try
+            logging.getLogger("edge_cache").exception("Edge cache fetch of %s failed", key)
+        else:
+            if entry is None:
+                raise HTTPException(status_code=404, detail="Not found")
+    if entry is None:
+        return RedirectResponse(
+            make_video_url(key),
+            status_code=302,
+            headers={"Cache-Control": f"private, max-age={HLS_REDIRECT_MAX_AGE}"},
+        )
+    media_type = _HLS_MEDIA_TYPES.get(Path(key).suffix, "application/octet-stream")
+    # segments and sprites are immutable once written
+    return _CachedFileResponse(cache, entry[0], media_type=media_type, headers={"Cache-Control": f"public, max-age={HLS_FINAL_MAX_AGE}"})
 
-        session.delete(v)
-        session.commit()
 
-    return {"ok": True}
+@router.get("/hls/{stem}/{path:path}")
+async def get_hls(stem: str, path: str, request: Request):
+    """Serve HLS output with stable URLs.
+
+    Playlists and the trickplay WebVTT index are returned from here with
+    ETag/Cache-Control so a reverse proxy or CDN can cache them; every other
+    file (segments, sprite sheets) comes from the edge cache when it is on,
+    otherwise it is answered with a short-lived redirect to a presigned S3
+    URL, signed on demand.
+    """
+    parts = path.split("/")
+    if not _HLS_STEM_RE.match(stem) or not path or any(p in ("", ".", "..") for p in parts):
+        raise HTTPException(status_code=404, detail="Not found")
+    key = f"hls/{stem}/{path}"
+
+    media_type = _HLS_TEXT_TYPES.get(Path(path).suffix)
+    if media_type is None:
+        return await _hls_file(key)
+
+    entry = await run_in_threadpool(_load_playlist, key)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    etag, body, final = entry
+    if path == "master.m3u8":
+        cache_control = f"public, max-age={HLS_MASTER_MAX_AGE}"
+    elif final:
+        cache_control = f"public, max-age={HLS_FINAL_MAX_AGE}"
+    else:
+        cache_control = "no-cache"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+@router.get("/edge-cache")
+def edge_cache_stats():
+    """Hit ratio, bytes saved and occupancy of this process's HLS edge cache."""
+    cache = get_edge_cache()
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Edge cache disabled (HLS_EDGE_CACHE_DIR)")
+    return cache.report()
+
+
+@router.get("/transcode/queue")
+async def transcode_queue():
+    """Transcode backlog: broker queue length plus running/waiting jobs per worker."""
+    from app.tasks import queue_depth
+
+    try:
+        return await run_in_threadpool(queue_depth)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Queue unavailable: {e}")
 
 
 @router.post("/rooms", response_model=RoomRead)
-def create_room(in_data: RoomCreate):
-    with get_session() as session:
-        r = Room(code=in_data.code)
-        session.add(r)
-        session.commit()
-        session.refresh(r)
-    return RoomRead(id=r.id, code=r.code)
+async def create_room(in_data: RoomCreate, session: AsyncSession = Depends(get_async_session)):
+    r = Room(code=in_data.code)
+    session.add(r)
+    await session.commit()
+    await session.refresh(r)
+    return RoomRead(id=r.id, code=r.code, video_id=r.video_id)
+
+
+@router.get("/rooms/{code}/presence")
+async def room_presence(code: str):
+    """Number of connected viewers (cluster-wide with WS_BACKEND=streams)."""
+    return {"code": code, "viewers": await websocket.manager.presence(code)}
 
 
 @router.get("/rooms", response_model=list[RoomRead])
-def list_rooms():
-    with get_session() as session:
-        rooms = session.exec(select(Room)).all()
-    return [RoomRead(id=r.id, code=r.code) for r in rooms]
+async def list_rooms(session: AsyncSession = Depends(get_async_session)):
+    rooms = (await session.exec(select(Room))).all()
+    return [RoomRead(id=r.id, code=r.code, video_id=r.video_id) for r in rooms]
+
+
+# room prefetch: when a room picks a video, the master playlist, the variants
+# players start on and their first segments are pulled into the playlist and
+# edge caches once, so the viewers' cold start waits on a single fetch
+# (0 turns the prefetch off)
+ROOM_PREFETCH_SEGMENTS = int(os.environ.get("ROOM_PREFETCH_SEGMENTS", "3"))
+_prefetches: dict[int, asyncio.Task] = {}
+_room_tasks: set[asyncio.Task] = set()
+
+
+def _start_variants(master: bytes) -> list[str]:
+    """Variant URIs players open first: the first listed (native players and
+    hls.js start there) and the lowest-bandwidth video variant (ABR start)."""
+    variants = []
+    attrs = None
+    for line in master.decode("utf-8", "replace").splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attrs = line
+        elif line and not line.startswith("#") and attrs is not None:
+            m = re.search(r"[:,]BANDWIDTH=(\d+)", attrs)
+            variants.append((int(m.group(1)) if m else 0, "RESOLUTION=" in attrs, line))
+            attrs = None
+    if not variants:
+        return []
+    video = [v for v in variants if v[1]] or variants
+    return list(dict.fromkeys([variants[0][2], min(video)[2]]))
+
+
+def _first_segments(playlist: bytes, count: int) -> list[str]:
+    """URIs of the init section (fMP4) and the first `count` segments."""
+    uris = []
+    for line in playlist.decode("utf-8", "replace").splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-MAP:"):
+            m = re.search(r'URI="([^"]+)"', line)
+            if m:
+                uris.append(m.group(1))
+        elif line and not line.startswith("#"):
+            if count <= 0:
+                break
+            uris.append(line)
+            count -= 1
+    return uris
+
+
+def _relative_key(base: str, uri: str) -> Optional[str]:
+    if "://" in uri or uri.startswith("/"):
+        return None
+    key = posixpath.normpath(posixpath.join(base, uri))
+    return key if key.startswith("hls/") else None
+
+
+async def prefetch_video(video_id: int) -> list[str]:
+    """Warm the caches for a video about to be played; returns the segment keys.
+
+    Only with the edge cache on: without it there is nothing local to warm.
+    """
+    cache = get_edge_cache()
+    if cache is None:
+        return []
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        v = await session.get(Video, video_id)
+    if v is None or not v.hls_master or v.status == "deleting":
+        return []
+    prefix = f"hls/{Path(v.s3_key).stem}"
+    master = await run_in_threadpool(_load_playlist, f"{prefix}/master.m3u8")
+    if master is None:
+        return []
+    keys = []
+    for uri in _start_variants(master[1]):
+        variant_key = _relative_key(prefix, uri)
+        entry = await run_in_threadpool(_load_playlist, variant_key) if variant_key else None
+        if entry is None:
+            continue
+        base = posixpath.dirname(variant_key)
+        keys += [k for k in (_relative_key(base, u) for u in _first_segments(entry[1], ROOM_PREFETCH_SEGMENTS)) if k]
+    await asyncio.gather(*(cache.warm(k) for k in keys), return_exceptions=True)
+    return keys
+
+
+async def _select_room_video(room_code: str, video_id: Optional[int]):
+    log = logging.getLogger("prefetch")
+    if video_id is not None and ROOM_PREFETCH_SEGMENTS > 0 and video_id not in _prefetches:
+        # one prefetch per video at a time, however many rooms pick it
+        task = asyncio.create_task(prefetch_video(video_id))
+        _prefetches[video_id] = task
+        task.add_done_callback(lambda t: _prefetches.pop(video_id, None))
+    try:
+        async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+            # only rooms created through POST /rooms are stored; socket
+            # traffic for any other code must not add rows
+            room = (await session.exec(select(Room).where(Room.code == room_code).order_by(Room.id))).first()
+            if room is not None:
+                room.video_id = video_id
+                session.add(room)
+                await session.commit()
+    except Exception:
+        log.exception("Failed to store video %s for room %s", video_id, room_code)
+    task = _prefetches.get(video_id)
+    if task is not None:
+        try:
+            keys = await asyncio.shield(task)
+            log.info("Prefetched %d segments of video %s for room %s", len(keys), video_id, room_code)
+        except Exception:
+            log.exception("Prefetch of video %s failed", video_id)
+
+
+def select_room_video(room_code: str, video_id: Optional[int]):
+    """Store a room's video choice (Room.video_id) and warm its caches in the background."""
+    task = asyncio.create_task(_select_room_video(room_code, video_id))
+    _room_tasks.add(task)
+    task.add_done_callback(_room_tasks.discard)
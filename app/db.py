@@ -1,18 +1,79 @@
-from typing import Optional
+from typing import AsyncIterator, Optional
+import threading
 
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
 from os import environ
 
+from app import metrics
+
 
 DATABASE_URL = environ.get("DATABASE_URL", "sqlite:///./data/dev.db")
 
+# pool sizing is shared by the sync engine (worker, scripts) and the async
+# engine used by the API routes; each process gets its own pair of pools
+DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(environ.get("DB_POOL_RECYCLE", "1800"))
+# app startup and worker boot apply the schema themselves; turn off when
+# running `python -m app.db` as a separate step (docker-compose does)
+DB_AUTO_MIGRATE = environ.get("DB_AUTO_MIGRATE", "1").lower() in ("1", "true", "yes")
+
+_engine: Optional[Engine] = None
+_async_engine: Optional[AsyncEngine] = None
+_engine_lock = threading.Lock()
+
+
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL to the matching asyncio driver."""
+    override = environ.get("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+def _engine_kwargs(url: str) -> dict:
+    if url.startswith("sqlite"):
+        # sqlite connections are handed between threadpool workers
+        return {"connect_args": {"check_same_thread": False}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
 
-def get_engine():
-    
-    echo = False
-    engine = create_engine(DATABASE_URL, echo=echo)
-    return engine
+def get_engine() -> Engine:
+    """Return the process-wide sync engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(DATABASE_URL, echo=False, **_engine_kwargs(DATABASE_URL))
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """Return the process-wide async engine used by the API routes."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                url = _async_url(DATABASE_URL)
+                _async_engine = create_async_engine(url, echo=False, **_engine_kwargs(url))
+    return _async_engine
 
 
 def create_db_and_tables():
@@ -32,18 +93,44 @@ def create_db_and_tables():
         if 'status' not in cols:
             with engine.begin() as conn:
                 conn.execute(text("ALTER TABLE video ADD COLUMN status VARCHAR NULL DEFAULT 'uploaded'"))
+        for col in ('content_hash', 'ladder_fingerprint'):
+            if col not in cols:
+                with engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE video ADD COLUMN {col} VARCHAR NULL'))
+        # indexes backing catalog lookups and keyset pagination; create_all only
+        # adds them for new tables
+        with engine.begin() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_video_s3_key ON video (s3_key)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_video_status ON video (status)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_video_uploaded_at ON video (uploaded_at)'))
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_video_content_hash ON video (content_hash)'))
     except Exception:
         # best-effort migration: ignore if DB doesn't support or fails
         pass
 
 
 def get_session() -> Session:
-    engine = get_engine()
-    return Session(engine)
+    return Session(get_engine())
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency yielding an async session bound to the shared pool."""
+    with metrics.db_session_seconds.time():
+        async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+            yield session
+
+
+async def dispose_engines():
+    """Close pooled connections; called on app shutdown."""
+    global _engine, _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
 
 
-# Ensure DB exists and migrations applied during import (helps tests and startup scenarios)
-try:
+if __name__ == "__main__":
+    # run migrations explicitly: python -m app.db
     create_db_and_tables()
-except Exception:
-    pass
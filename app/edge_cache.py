@@ -0,0 +1,227 @@
+"""On-disk LRU cache for HLS segments served by the app.
+
+Off unless HLS_EDGE_CACHE_DIR is set. With the cache on, `/api/hls` serves
+segments and sprite sheets from local disk instead of redirecting every
+viewer to a presigned S3 URL: each object is downloaded once per process,
+concurrent misses for the same key share that one download, and the files
+are answered with FileResponse (Range requests; the ASGI pathsend extension,
+i.e. sendfile, where the server offers it). HLS output never changes once
+written, so entries are only dropped to stay under HLS_EDGE_CACHE_MAX_BYTES,
+least recently used first; files that are being sent are pinned and never
+dropped mid-response. The budget is per process.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from botocore.exceptions import ClientError
+
+from app import metrics
+from app.s3 import get_s3, S3_BUCKET_NAME
+
+HLS_EDGE_CACHE_DIR = os.environ.get("HLS_EDGE_CACHE_DIR", "")
+HLS_EDGE_CACHE_MAX_BYTES = int(os.environ.get("HLS_EDGE_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+
+
+class EdgeCache:
+    """Objects are stored as <dir>/<aa>/<sha1 of key><suffix>; the index lives in memory
+    and is rebuilt from the directory (oldest files first) on start."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.stats = {
+            "requests": 0, "hits": 0, "coalesced": 0, "misses": 0, "prefetched": 0,
+            "evictions": 0, "bytes_served": 0, "bytes_fetched": 0,
+        }
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._pins: dict[str, int] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load()
+
+    def _name(self, key: str) -> str:
+        return hashlib.sha1(key.encode()).hexdigest() + Path(key).suffix
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name[:2] / name
+
+    def _load(self):
+        files = []
+        for path in self.directory.glob("*/*"):
+            if path.suffix == ".part":
+                # a download interrupted by a restart
+                path.unlink(missing_ok=True)
+                continue
+            st = path.stat()
+            files.append((st.st_mtime, path.name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._size += size
+        self._evict()
+
+    def _add(self, name: str, size: int):
+        with self._lock:
+            self._size += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+        self._evict()
+
+    def _evict(self):
+        victims = []
+        with self._lock:
+            excess = self._size - self.max_bytes
+            if excess > 0:
+                newest = next(reversed(self._entries))
+                for name, size in self._entries.items():
+                    # never evict the entry that was just added, or one being served
+                    if excess <= 0 or name == newest:
+                        break
+                    if name not in self._pins:
+                        victims.append(name)
+                        excess -= size
+                for name in victims:
+                    self._size -= self._entries.pop(name)
+            self.stats["evictions"] += len(victims)
+        for name in victims:
+            self._path(name).unlink(missing_ok=True)
+
+    def _lookup(self, name: str) -> Optional[int]:
+        with self._lock:
+            size = self._entries.get(name)
+            if size is not None:
+                self._entries.move_to_end(name)
+        if size is not None and not self._path(name).exists():
+            # removed behind our back (another process sharing the directory)
+            with self._lock:
+                if self._entries.pop(name, None) is not None:
+                    self._size -= size
+            return None
+        return size
+
+    def _pin(self, name: str) -> bool:
+        with self._lock:
+            if name not in self._entries:
+                return False
+            self._pins[name] = self._pins.get(name, 0) + 1
+            return True
+
+    def release(self, path: Path):
+        """Unpin a file returned by `get(key, pin=True)` once it has been sent."""
+        name = Path(path).name
+        with self._lock:
+            count = self._pins.pop(name, 0) - 1
+            if count > 0:
+                self._pins[name] = count
+        # eviction skipped it while pinned
+        self._evict()
+
+    def _download(self, key: str, name: str) -> Optional[tuple[Path, int]]:
+        path = self._path(name)
+        path.parent.mkdir(exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+        os.close(fd)
+        try:
+            get_s3().download_file(S3_BUCKET_NAME, key, tmp)
+            os.replace(tmp, path)
+        except ClientError as e:
+            os.unlink(tmp)
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        size = path.stat().st_size
+        self.stats["bytes_fetched"] += size
+        self._add(name, size)
+        return path, size
+
+    def _fetch_done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # retrieved here so an error nobody waited for isn't logged as lost
+            task.exception()
+
+    async def get(self, key: str, pin: bool = False) -> Optional[tuple[Path, int]]:
+        """Local path and size of the S3 object `key`, fetched on a miss; None if it doesn't exist.
+
+        With `pin` the file is not evicted until `release(path)` is called.
+        """
+        self.stats["requests"] += 1
+        name = self._name(key)
+        while True:
+            size = self._lookup(name)
+            if size is not None and (not pin or self._pin(name)):
+                self.stats["hits"] += 1
+                self.stats["bytes_served"] += size
+                return self._path(name), size
+            task, started = self._fetch(key, name)
+            self.stats["misses" if started else "coalesced"] += 1
+            entry = await asyncio.shield(task)
+            if entry is None:
+                return None
+            if not pin or self._pin(name):
+                self.stats["bytes_served"] += entry[1]
+                return entry
+            # evicted by a concurrent download before we could pin it; fetch again
+
+    async def warm(self, key: str) -> bool:
+        """Fetch `key` ahead of the viewers; not counted as a request. True if it is on disk."""
+        name = self._name(key)
+        if self._lookup(name) is not None:
+            return True
+        task, started = self._fetch(key, name)
+        if started:
+            self.stats["prefetched"] += 1
+        return await asyncio.shield(task) is not None
+
+    def _fetch(self, key: str, name: str) -> tuple[asyncio.Task, bool]:
+        task = self._inflight.get(key)
+        if task is not None:
+            return task, False
+        # a task of its own: a viewer that disconnects doesn't cancel the
+        # download the others are waiting for
+        task = asyncio.create_task(asyncio.to_thread(self._download, key, name))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._fetch_done(key, t))
+        return task, True
+
+    def report(self) -> dict:
+        s = dict(self.stats)
+        with self._lock:
+            s.update(entries=len(self._entries), size_bytes=self._size, max_bytes=self.max_bytes)
+        s["hit_ratio"] = round(1 - s["misses"] / s["requests"], 4) if s["requests"] else 0.0
+        # object bytes sent to viewers that did not have to come from S3
+        s["bytes_saved"] = max(s["bytes_served"] - s["bytes_fetched"], 0)
+        return s
+
+
+_cache: Optional[EdgeCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_edge_cache() -> Optional[EdgeCache]:
+    """The process-wide cache, or None when HLS_EDGE_CACHE_DIR is unset."""
+    global _cache
+    if _cache is None and HLS_EDGE_CACHE_DIR:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EdgeCache(HLS_EDGE_CACHE_DIR, HLS_EDGE_CACHE_MAX_BYTES)
+    return _cache
+
+
+def _report_stats():
+    cache = _cache
+    if cache is None:
+        return []
+    return [((k,), v) for k, v in cache.report().items()]
+
+
+metrics.gauge("kino_hls_edge_cache", "HLS edge cache counters on this process (requests, hits, bytes_saved, ...).", ("stat",), _report_stats)
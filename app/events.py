@@ -0,0 +1,179 @@
+"""Worker -> browser events.
+
+Workers publish typed, versioned events on one Redis channel. Every app
+process runs a single app.websocket.EventBridge that subscribes to that
+channel and pushes the events to its `/ws/updates` sockets, whichever room
+manager backend is in use. Messages go out exactly as published:
+
+    {"type": "video_status", "v": 1, "id": 42, "status": "ready",
+     "hls_master": "/api/hls/<stem>/master.m3u8", "ts": 1700000000000}
+
+Workers never publish directly: an event is stored as an OutboxEvent row in
+the same transaction as the change it announces, and StatusPublisher relays
+the rows to Redis after the commit, so a row update and its notification
+cannot diverge.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from app.models import OutboxEvent, Video
+from app.room_state import now_ms
+
+EVENTS_CHANNEL = os.environ.get("EVENTS_CHANNEL", "kino:events")
+EVENTS_VERSION = 1
+
+
+@dataclass
+class VideoStatusEvent:
+    id: int
+    status: str
+    hls_master: Optional[str] = None
+    type: str = "video_status"
+    v: int = EVENTS_VERSION
+    ts: int = field(default_factory=now_ms)
+
+    def to_json(self) -> str:
+        return json.dumps({k: v for k, v in asdict(self).items() if v is not None})
+
+
+# concurrent jobs of a worker process share one transaction and one Redis
+# pipeline per flush
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "100"))
+# rows left behind (Redis down, crashed worker) are picked up this often
+OUTBOX_POLL_INTERVAL = float(os.environ.get("OUTBOX_POLL_INTERVAL", "5"))
+STATUS_WRITE_TIMEOUT = 30
+
+
+class StatusPublisher:
+    """Group-commit writer of Video.status with a transactional outbox.
+
+    set_status() queues the change and blocks until a single flush thread has
+    applied every queued change, with one OutboxEvent each, in one
+    transaction. The new rows are then published through one pipeline and
+    deleted. Delivery is at-least-once: rows that could not be published stay
+    in the table and are retried by the next poll.
+    """
+
+    def __init__(self, client, session_factory: Callable[[], Session]):
+        self.client = client
+        self.session_factory = session_factory
+        self.stats = {"flushes": 0, "writes": 0, "published": 0}
+        self._pending: list[tuple[tuple, Future]] = []
+        self._wake = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def set_status(self, video_id: int, status: str, hls_master: Optional[str] = None, **fields) -> bool:
+        """Persist and announce a status change; False if the row is gone or being deleted.
+
+        Extra keyword arguments are Video columns written in the same update.
+        """
+        future: Future = Future()
+        with self._cond:
+            self._start()
+            self._pending.append(((video_id, status, hls_master, fields), future))
+            self._cond.notify()
+        return future.result(timeout=STATUS_WRITE_TIMEOUT)
+
+    def wake(self):
+        """Relay outbox rows committed elsewhere (e.g. by the delete job) now."""
+        with self._cond:
+            self._start()
+            self._wake = True
+            self._cond.notify()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="status-publisher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        log = logging.getLogger("outbox")
+        while True:
+            with self._cond:
+                if not self._pending and not self._wake:
+                    self._cond.wait(OUTBOX_POLL_INTERVAL)
+                batch = self._pending[:OUTBOX_BATCH_SIZE]
+                del self._pending[:OUTBOX_BATCH_SIZE]
+                self._wake = False
+            try:
+                if batch:
+                    self._write(batch)
+                else:
+                    self._relay_pending()
+            except Exception:
+                log.exception("Outbox flush failed")
+
+    def _write(self, batch: list[tuple[tuple, Future]]):
+        results = []
+        try:
+            with self.session_factory() as session:
+                ids = {change[0] for change, _ in batch}
+                videos = {v.id: v for v in session.exec(select(Video).where(Video.id.in_(ids)))}
+                events = []
+                for (video_id, status, hls_master, fields), _ in batch:
+                    v = videos.get(video_id)
+                    if v is None or v.status == "deleting":
+                        results.append(False)
+                        continue
+                    v.status = status
+                    if hls_master:
+                        v.hls_master = hls_master
+                    for name, value in fields.items():
+                        setattr(v, name, value)
+                    event = VideoStatusEvent(id=video_id, status=status, hls_master=hls_master)
+                    events.append(OutboxEvent(channel=EVENTS_CHANNEL, payload=event.to_json()))
+                    results.append(True)
+                session.add_all(events)
+                session.flush()
+                rows = [(e.id, e.channel, e.payload) for e in events]
+                session.commit()
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.stats["flushes"] += 1
+        self.stats["writes"] += len(batch)
+        for (_, future), ok in zip(batch, results):
+            future.set_result(ok)
+        if rows:
+            self._publish(rows)
+
+    def _relay_pending(self):
+        if self.client is None:
+            return
+        while True:
+            with self.session_factory() as session:
+                q = select(OutboxEvent).order_by(OutboxEvent.id).limit(OUTBOX_BATCH_SIZE)
+                rows = [(e.id, e.channel, e.payload) for e in session.exec(q.with_for_update(skip_locked=True))]
+                if rows:
+                    self._publish(rows, session)
+            if len(rows) < OUTBOX_BATCH_SIZE:
+                return
+
+    def _publish(self, rows: list[tuple[int, str, str]], session: Optional[Session] = None):
+        if self.client is None:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for _, channel, payload in rows:
+            pipe.publish(channel, payload)
+        pipe.execute()
+        if session is None:
+            with self.session_factory() as session:
+                self._delete(session, rows)
+        else:
+            self._delete(session, rows)
+        self.stats["published"] += len(rows)
+
+    @staticmethod
+    def _delete(session: Session, rows: list[tuple]):
+        session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([r[0] for r in rows])))
+        session.commit()
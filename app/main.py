@@ -1,53 +1,152 @@
+import json
 import os
+import threading
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 
-from app.api import router as api_router
-from app.db import create_db_and_tables
-from app import websocket
+from app.api import router as api_router, select_room_video
+from app.db import DB_AUTO_MIGRATE, create_db_and_tables, dispose_engines
+from app.edge_cache import get_edge_cache
+from app import metrics, websocket
+from app.protocol import choose_subprotocol, decode_binary
+from app.room_state import STATE_EVENTS, now_ms
+from app.s3 import prepare_storage
 
 
+# offer the compact struct format to clients that ask for it
+WS_BINARY = os.environ.get("WS_BINARY", "1").lower() in ("1", "true", "yes")
+
 app = FastAPI(title="Kino — synced watch party (MVP)")
 
 app.include_router(api_router)
 
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+if METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
+PRELOAD_SAMPLE_VIDEOS = os.environ.get("PRELOAD_SAMPLE_VIDEOS", "1").lower() in ("1", "true", "yes")
+
+
+def _warm_up():
+    """Startup work that talks to S3, HTTP or the broker; runs in a background thread."""
+    prepare_storage(preload_samples=PRELOAD_SAMPLE_VIDEOS)
+    # rebuild the edge cache index from disk before the first segment request
+    get_edge_cache()
+    # start the periodic orphan sweep unless it is running; the worker keeps it going
     try:
-        from app.s3 import ensure_sample_videos
+        from app.tasks import start_sweeper
 
-        SHOULD_PRELOAD = os.environ.get("PRELOAD_SAMPLE_VIDEOS", "1")
-        if SHOULD_PRELOAD in ("1", "true", "yes"):
-            ensure_sample_videos()
+        start_sweeper()
     except Exception:
         pass
 
 
+@app.on_event("startup")
+def on_startup():
+    if DB_AUTO_MIGRATE:
+        create_db_and_tables()
+    # the app serves requests right away; a slow or unreachable MinIO only
+    # delays the bucket check and the sample videos
+    threading.Thread(target=_warm_up, name="startup-warm-up", daemon=True).start()
+
+
+@app.on_event("startup")
+async def start_event_bridge():
+    websocket.bridge.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await websocket.bridge.close()
+    await websocket.manager.close()
+    await dispose_engines()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus text exposition of app.metrics."""
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.websocket("/ws/updates")
+async def ws_updates(ws: WebSocket):
+    """Push channel for worker events (see app.events), read-only for clients."""
+    bridge = websocket.bridge
+    await bridge.connect(ws)
+    try:
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await bridge.disconnect(bridge.ROOM, ws)
+
+
 @app.websocket("/ws/{room_code}")
 async def ws_endpoint(ws: WebSocket, room_code: str):
-    
+    """Room channel.
+
+    On join the client gets the room's authoritative playback state; `ping`
+    messages are answered with the server clock so clients can estimate their
+    offset; play/pause/seek/rate/video events update the state and are
+    relayed to the other sockets of the room with the authoritative position
+    and server timestamp. Seek/rate bursts are coalesced per room. Clients
+    offering the binary subprotocol exchange sync events as structs (see
+    app.protocol). A `video` event is also stored on the room and warms the
+    caches for the chosen video (app.api.select_room_video).
+    """
     manager = websocket.manager
-    await manager.connect(room_code, ws)
+    subprotocol = choose_subprotocol(ws.scope.get("subprotocols", []), allow_binary=WS_BINARY)
+    # the streams backend replays what a reconnecting client missed
+    last_event_id = ws.query_params.get("last_event_id")
+    origin = await manager.connect(room_code, ws, subprotocol=subprotocol, last_event_id=last_event_id)
     try:
+        state = await manager.get_state(room_code)
+        manager.send(room_code, ws, {"type": "state", **state.snapshot(), "now": now_ms()})
         while True:
-            data = await ws.receive_text()
-            
-            await manager.broadcast(room_code, {
-                "from": "peer",
-                "payload": data,
-            })
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            if msg.get("bytes") is not None:
+                event = decode_binary(msg["bytes"])
+            else:
+                try:
+                    event = json.loads(msg.get("text") or "")
+                except ValueError:
+                    event = None
+            if not isinstance(event, dict):
+                continue
+            kind = event.get("type")
+            if kind == "ping":
+                manager.send(room_code, ws, {"type": "pong", "t0": event.get("t0"), "t1": now_ms()})
+                continue
+            if kind in STATE_EVENTS:
+                state = await manager.get_state(room_code)
+                if not state.apply(event):
+                    continue
+                await manager.set_state(room_code, state)
+                event = {"type": kind, **state.snapshot()}
+                if kind == "video":
+                    # the whole room is about to start this video
+                    select_room_video(room_code, state.video_id)
+            await websocket.coalescer.publish(manager, room_code, event, origin=origin)
     except WebSocketDisconnect:
+        pass
+    finally:
         await manager.disconnect(room_code, ws)
@@ -0,0 +1,231 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+No client library: counters and histograms are a dict lookup plus a few
+additions under an uncontended lock, and gauges that describe current state
+(sockets, rooms, queue lengths) are computed only when /metrics is scraped,
+so the hot paths pay close to nothing.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+# seconds; covers in-process fan-out (tens of µs) up to slow S3 calls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (32, 64, 128, 256, 512, 1024, 4096, 16384, 65536)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    def _samples(self) -> Iterable[str]:
+        return ()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Metric):
+    """Gauge whose samples come from a callback evaluated at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), callback: Optional[Callable] = None):
+        super().__init__(name, help, labelnames)
+        self.callback = callback
+
+    def _samples(self):
+        if self.callback is None:
+            return
+        try:
+            result = self.callback()
+        except Exception:
+            return
+        if not self.labelnames:
+            result = [((), result)]
+        for labels, value in result:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            # re-registering (module reloads) keeps the first instance
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labelnames: tuple = ()) -> Counter:
+    return registry.register(Counter(name, help, labelnames))
+
+
+def gauge(name: str, help: str, labelnames: tuple = (), callback: Optional[Callable] = None) -> Gauge:
+    return registry.register(Gauge(name, help, labelnames, callback))
+
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help, labelnames, buckets))
+
+
+def render() -> str:
+    return registry.render()
+
+
+# shared instruments; the modules they measure import them from here
+http_request_seconds = histogram(
+    "kino_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+)
+ws_broadcast_seconds = histogram(
+    "kino_ws_broadcast_seconds", "Time to fan a message out to the local sockets of a room.", ("backend",)
+)
+ws_message_bytes = histogram(
+    "kino_ws_message_bytes", "Size of room messages fanned out to sockets.", ("backend",), SIZE_BUCKETS
+)
+ws_send_failures = counter("kino_ws_send_failures_total", "Sockets dropped after a failed or stalled send.")
+ws_dropped_messages = counter(
+    "kino_ws_dropped_messages_total", "Messages discarded by the slow-consumer policy.", ("policy",)
+)
+ws_slow_disconnects = counter("kino_ws_slow_disconnects_total", "Sockets closed for falling behind (policy disconnect).")
+redis_publish_seconds = histogram("kino_redis_publish_seconds", "Latency of publishing a room message to Redis.", ("backend",))
+db_session_seconds = histogram("kino_db_session_seconds", "Lifetime of request-scoped async DB sessions.")
+s3_call_seconds = histogram("kino_s3_call_seconds", "Latency of S3 API calls by operation.", ("operation", "status"))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route HTTP latency (route templates, not raw paths)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_request_seconds.observe(time.perf_counter() - t0, scope["method"], path, str(status["code"]))
+
+
+def instrument_boto3_client(client):
+    """Time every API call of a boto3 client through its event hooks."""
+
+    def before(context, **kwargs):
+        context["kino_t0"] = time.perf_counter()
+
+    def after(http_response, model, context, **kwargs):
+        t0 = context.get("kino_t0")
+        if t0 is not None:
+            status = getattr(http_response, "status_code", 0)
+            s3_call_seconds.observe(time.perf_counter() - t0, model.name, str(status))
+
+    events = client.meta.events
+    events.register("before-call.s3.*", before, unique_id="kino-metrics-before")
+    events.register("after-call.s3.*", after, unique_id="kino-metrics-after")
@@ -6,13 +6,27 @@ from datetime import datetime
 class Video(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     filename: str
-    s3_key: str
-    uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    s3_key: str = Field(index=True)
+    uploaded_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     hls_master: Optional[str] = None
-    status: Optional[str] = "uploaded"
+    status: Optional[str] = Field(default="uploaded", index=True)
+    # sha256 of the source; duplicates share s3_key and HLS output
+    content_hash: Optional[str] = Field(default=None, index=True)
+    # app.tasks.LADDER_FINGERPRINT of the settings the HLS output was made with
+    ladder_fingerprint: Optional[str] = None
 
 
 class Room(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     code: str
     video_id: Optional[int] = None
+
+
+class OutboxEvent(SQLModel, table=True):
+    """Event written in the same transaction as the change it announces;
+    app.events.StatusPublisher relays it to Redis and deletes it."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    channel: str
+    payload: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,132 @@
+"""Wire formats of the room channel.
+
+Messages are JSON objects by default. A client that offers the
+``kino.bin.v1`` WebSocket subprotocol gets sync events as fixed-size
+little-endian structs instead, which avoids JSON work on both ends for the
+hottest messages:
+
+    event  (video/play/pause/seek/rate)  <B B d f i q     26 bytes
+           type, flags (bit 0: paused), position, rate, video id (-1: none), server time ms
+    state  (join snapshot)               <B B d f i q q   34 bytes  (+ server now ms)
+    ping                                 <B q             9 bytes   t0
+    pong                                 <B q q           17 bytes  t0, t1
+
+Events and snapshots with flag bit 1 set are followed by the Redis Streams
+id of the event (`eid`, "<ms>-<seq>") as <Q Q, 16 more bytes, so binary
+clients can resume with ?last_event_id= like JSON ones.
+
+Anything else (and every message on a JSON connection) is sent as text.
+"""
+import struct
+from typing import Optional
+
+BINARY_SUBPROTOCOL = "kino.bin.v1"
+JSON_SUBPROTOCOL = "kino.json.v1"
+
+TYPE_CODES = {"video": 1, "play": 2, "pause": 3, "seek": 4, "rate": 5, "ping": 6, "pong": 7, "state": 8}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+_EVENT = struct.Struct("<BBdfiq")
+_STATE = struct.Struct("<BBdfiqq")
+_PING = struct.Struct("<Bq")
+_PONG = struct.Struct("<Bqq")
+_EID = struct.Struct("<QQ")
+
+FLAG_PAUSED = 1
+FLAG_EID = 2
+
+
+def choose_subprotocol(offered: list[str], allow_binary: bool = True) -> Optional[str]:
+    if allow_binary and BINARY_SUBPROTOCOL in offered:
+        return BINARY_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
+
+
+def _int(value, default: int = 0) -> int:
+    return int(value) if isinstance(value, (int, float)) else default
+
+
+def encode_binary(message: dict) -> Optional[bytes]:
+    """Pack a message as a binary frame; None if it has no binary form.
+
+    Values that don't fit the struct (out of range, NaN) also give None, so
+    the caller sends the message as JSON text instead.
+    """
+    kind = message.get("type")
+    code = TYPE_CODES.get(kind)
+    if code is None:
+        return None
+    try:
+        return _pack(kind, code, message)
+    except (struct.error, ValueError, OverflowError):
+        return None
+
+
+def _pack(kind: str, code: int, message: dict) -> bytes:
+    if kind == "ping":
+        return _PING.pack(code, _int(message.get("t0")))
+    if kind == "pong":
+        return _PONG.pack(code, _int(message.get("t0")), _int(message.get("t1")))
+    eid = message.get("eid")
+    ms, sep, seq = eid.partition("-") if isinstance(eid, str) else ("", "", "")
+    has_eid = bool(sep) and ms.isdigit() and seq.isdigit()
+    fields = (
+        code,
+        (FLAG_PAUSED if message.get("paused") else 0) | (FLAG_EID if has_eid else 0),
+        float(message.get("position") or 0.0),
+        float(message.get("rate") or 1.0),
+        _int(message.get("videoId"), -1),
+        _int(message.get("serverTime")),
+    )
+    if kind == "state":
+        frame = _STATE.pack(*fields, _int(message.get("now")))
+    else:
+        frame = _EVENT.pack(*fields)
+    return frame + _EID.pack(int(ms), int(seq)) if has_eid else frame
+
+
+def decode_binary(frame: bytes) -> Optional[dict]:
+    """Unpack a binary frame into the same dict shape the JSON format uses."""
+    if not frame:
+        return None
+    kind = TYPE_NAMES.get(frame[0])
+    try:
+        if kind == "ping":
+            _, t0 = _PING.unpack(frame)
+            return {"type": kind, "t0": t0}
+        if kind == "pong":
+            _, t0, t1 = _PONG.unpack(frame)
+            return {"type": kind, "t0": t0, "t1": t1}
+        if kind == "state":
+            base = _STATE
+            _, flags, position, rate, video_id, server_time, now = _STATE.unpack_from(frame)
+        elif kind is not None:
+            base = _EVENT
+            _, flags, position, rate, video_id, server_time = _EVENT.unpack_from(frame)
+            now = None
+        else:
+            return None
+        eid = None
+        if flags & FLAG_EID:
+            if len(frame) != base.size + _EID.size:
+                return None
+            eid = "%d-%d" % _EID.unpack_from(frame, base.size)
+        elif len(frame) != base.size:
+            return None
+    except struct.error:
+        return None
+    message = {
+        "type": kind,
+        "position": position,
+        "rate": rate,
+        "paused": bool(flags & FLAG_PAUSED),
+        "videoId": video_id if video_id >= 0 else None,
+        "serverTime": server_time,
+    }
+    if now is not None:
+        message["now"] = now
+    if eid is not None:
+        message["eid"] = eid
+    return message
@@ -0,0 +1,109 @@
+"""Authoritative playback state of a watch-party room.
+
+The server keeps one PlaybackState per room and updates it from the
+play/pause/seek/rate/video events clients send. Positions are stored
+together with the server time they were valid at, so any client that knows
+its clock offset to the server can extrapolate the current position locally
+instead of chasing every peer with seeks.
+"""
+import math
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+# rooms nobody touched for this long start over from an empty state
+ROOM_STATE_TTL = int(os.environ.get("ROOM_STATE_TTL", "86400"))
+
+STATE_EVENTS = ("video", "play", "pause", "seek", "rate")
+MAX_RATE = 16.0
+# video ids travel as int32 in binary frames (app.protocol)
+MAX_VIDEO_ID = 2 ** 31 - 1
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _video_id(value) -> Optional[int]:
+    """A valid video id, or None; raises ValueError for anything else."""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"bad video id {value!r}")
+    if not math.isfinite(value) or value != int(value) or not 0 <= value <= MAX_VIDEO_ID:
+        raise ValueError(f"bad video id {value!r}")
+    return int(value)
+
+
+def _number(value, default: float) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value if math.isfinite(value) else default
+
+
+@dataclass
+class PlaybackState:
+    video_id: Optional[int] = None
+    position: float = 0.0
+    rate: float = 1.0
+    paused: bool = True
+    # server time (ms) at which `position` was exact
+    updated_at: int = 0
+
+    def position_at(self, t_ms: int) -> float:
+        if self.paused or not self.updated_at:
+            return self.position
+        return self.position + max(0, t_ms - self.updated_at) / 1000 * self.rate
+
+    def expired(self, t_ms: Optional[int] = None) -> bool:
+        return bool(self.updated_at) and (t_ms or now_ms()) - self.updated_at > ROOM_STATE_TTL * 1000
+
+    def apply(self, event: dict, t_ms: Optional[int] = None) -> bool:
+        """Fold a client event into the state; False (state untouched) if it is
+        not a state event or carries an invalid video id."""
+        kind = event.get("type")
+        if kind not in STATE_EVENTS:
+            return False
+        t_ms = t_ms or now_ms()
+        position = self.position_at(t_ms)
+        if kind == "video":
+            try:
+                self.video_id = _video_id(event.get("videoId"))
+            except ValueError:
+                return False
+            position = 0.0
+            self.paused = True
+        elif kind == "rate":
+            rate = _number(event.get("rate"), self.rate)
+            self.rate = min(max(rate, 1 / MAX_RATE), MAX_RATE)
+        if kind != "video" and "position" in event:
+            position = _number(event.get("position"), position)
+        if kind == "play":
+            self.paused = False
+        elif kind == "pause":
+            self.paused = True
+        self.position = max(0.0, position)
+        self.updated_at = t_ms
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "videoId": self.video_id,
+            "position": self.position,
+            "rate": self.rate,
+            "paused": self.paused,
+            "serverTime": self.updated_at,
+        }
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "PlaybackState":
+        if not data:
+            return cls()
+        state = cls(**{k: data[k] for k in cls.__dataclass_fields__ if k in data})
+        return cls() if state.expired() else state
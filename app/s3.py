@@ -1,9 +1,16 @@
+import logging
 import os
+import threading
+import time
 import uuid
+from collections import OrderedDict
 import boto3
 from botocore.client import Config
 import httpx
 from pathlib import Path
+from typing import Optional
+
+from app.metrics import instrument_boto3_client
 
 S3_INTERNAL_ENDPOINT = os.environ.get("S3_ENDPOINT_URL", "http://minio:9000")
 S3_PUBLIC_ENDPOINT = os.environ.get("S3_PUBLIC_ENDPOINT", S3_INTERNAL_ENDPOINT)
@@ -11,56 +18,210 @@ S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME", "kino-videos")
 S3_ACCESS_KEY = os.environ.get("S3_ACCESS_KEY", "minioadmin")
 S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY", "minioadmin123")
 
-s3 = boto3.client(
-    "s3",
-    endpoint_url=S3_INTERNAL_ENDPOINT,
-    aws_access_key_id=S3_ACCESS_KEY,
-    aws_secret_access_key=S3_SECRET_KEY,
-    config=Config(signature_version="s3v4"),
-    region_name="us-east-1",
-)
-
-# ensure bucket exists (idempotent)
-try:
+# clients are created on first use: building one loads botocore's service
+# models, and nothing at import time should touch the network
+_clients: dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+
+def _client(endpoint: str):
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        aws_access_key_id=S3_ACCESS_KEY,
+        aws_secret_access_key=S3_SECRET_KEY,
+        config=Config(signature_version="s3v4"),
+        region_name="us-east-1",
+    )
+
+
+def get_s3():
+    """Process-wide client for the internal endpoint."""
+    client = _clients.get("internal")
+    if client is None:
+        with _clients_lock:
+            client = _clients.get("internal")
+            if client is None:
+                client = _client(S3_INTERNAL_ENDPOINT)
+                # per-operation latency for /metrics
+                instrument_boto3_client(client)
+                _clients["internal"] = client
+    return client
+
+
+def get_s3_public():
+    """Client configured with the public endpoint; only used to sign URLs for browsers."""
+    client = _clients.get("public")
+    if client is None:
+        with _clients_lock:
+            client = _clients.get("public")
+            if client is None:
+                client = _clients["public"] = _client(S3_PUBLIC_ENDPOINT)
+    return client
+
+
+def ensure_bucket():
+    """Create the bucket if it is missing (idempotent); called from app startup."""
+    s3 = get_s3()
     existing = [b["Name"] for b in s3.list_buckets().get("Buckets", [])]
     if S3_BUCKET_NAME not in existing:
         s3.create_bucket(Bucket=S3_BUCKET_NAME)
-except Exception:
-    # don't crash app import if minio is unreachable during local runs/tests
-    pass
 
 
-def upload_video_file(file_obj, original_filename: str) -> str:
+# multipart uploads: parts are buffered in memory, so memory per upload is
+# roughly part_size * (concurrency + 1); S3 requires parts >= 5 MiB except the last
+S3_UPLOAD_PART_SIZE = max(int(os.environ.get("S3_UPLOAD_PART_SIZE", str(8 * 1024 * 1024))), 5 * 1024 * 1024)
+S3_UPLOAD_CONCURRENCY = max(int(os.environ.get("S3_UPLOAD_CONCURRENCY", "4")), 1)
+
+
+def new_video_key(original_filename: str) -> str:
     ext = original_filename.rsplit(".", 1)[-1] if "." in original_filename else "bin"
-    key = f"videos/{uuid.uuid4().hex}.{ext}"
+    return f"videos/{uuid.uuid4().hex}.{ext}"
+
+
+def video_content_type(key: str) -> str:
+    return f"video/{key.rsplit('.', 1)[-1]}"
 
-    s3.upload_fileobj(
+
+def upload_video_file(file_obj, original_filename: str) -> str:
+    key = new_video_key(original_filename)
+
+    get_s3().upload_fileobj(
         Fileobj=file_obj,
         Bucket=S3_BUCKET_NAME,
         Key=key,
-        ExtraArgs={"ContentType": f"video/{ext}"},
+        ExtraArgs={"ContentType": video_content_type(key)},
     )
     return key
 
 
+def start_multipart_upload(key: str) -> str:
+    resp = get_s3().create_multipart_upload(Bucket=S3_BUCKET_NAME, Key=key, ContentType=video_content_type(key))
+    return resp["UploadId"]
+
+
+def upload_part(key: str, upload_id: str, part_number: int, data: bytes) -> str:
+    resp = get_s3().upload_part(
+        Bucket=S3_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=data,
+    )
+    return resp["ETag"]
+
+
+def list_uploaded_parts(key: str, upload_id: str) -> list[dict]:
+    """Return the parts S3 already holds for an upload, following pagination."""
+    parts = []
+    paginator = get_s3().get_paginator("list_parts")
+    for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Key=key, UploadId=upload_id):
+        parts.extend(page.get("Parts", []))
+    return parts
+
+
+def complete_multipart_upload(key: str, upload_id: str, parts: Optional[list[dict]] = None):
+    """Complete an upload. Without explicit parts, whatever S3 holds is used."""
+    if parts is None:
+        parts = [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in list_uploaded_parts(key, upload_id)]
+    parts = sorted(parts, key=lambda p: p["PartNumber"])
+    get_s3().complete_multipart_upload(
+        Bucket=S3_BUCKET_NAME,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": parts},
+    )
+
+
+def abort_multipart_upload(key: str, upload_id: str):
+    get_s3().abort_multipart_upload(Bucket=S3_BUCKET_NAME, Key=key, UploadId=upload_id)
+
+
+def presign_upload_part(key: str, upload_id: str, part_number: int, expires_in: int = 3600) -> str:
+    """URL the browser can PUT one part to, bypassing the app servers."""
+    return get_s3_public().generate_presigned_url(
+        ClientMethod="upload_part",
+        Params={"Bucket": S3_BUCKET_NAME, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+        ExpiresIn=expires_in,
+    )
+
+
+# presigned GET URLs are cached and handed out again until `S3_URL_CACHE_MARGIN`
+# seconds before they expire, so a client always gets at least that much validity
+S3_URL_EXPIRES = int(os.environ.get("S3_URL_EXPIRES", "3600"))
+S3_URL_CACHE_MARGIN = int(os.environ.get("S3_URL_CACHE_MARGIN", "600"))
+S3_URL_CACHE_SIZE = int(os.environ.get("S3_URL_CACHE_SIZE", "10000"))
+
+class UrlCache:
+    """Thread-safe LRU cache; entries expire after `ttl` seconds unless put() overrides it."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+url_cache = UrlCache(S3_URL_CACHE_SIZE, S3_URL_EXPIRES - S3_URL_CACHE_MARGIN)
+
+
 def make_video_url(key: str) -> str:
+    url = url_cache.get(key)
+    if url is not None:
+        return url
     try:
-        # Use a client configured with the public endpoint to generate a presigned URL
-        public_client = boto3.client(
-            "s3",
-            endpoint_url=S3_PUBLIC_ENDPOINT,
-            aws_access_key_id=S3_ACCESS_KEY,
-            aws_secret_access_key=S3_SECRET_KEY,
-            config=Config(signature_version="s3v4"),
-            region_name="us-east-1",
-        )
-        return public_client.generate_presigned_url(
+        url = get_s3_public().generate_presigned_url(
             ClientMethod="get_object",
             Params={"Bucket": S3_BUCKET_NAME, "Key": key},
-            ExpiresIn=3600,
+            ExpiresIn=S3_URL_EXPIRES,
         )
     except Exception:
         return f"{S3_PUBLIC_ENDPOINT}/{S3_BUCKET_NAME}/{key}"
+    url_cache.put(key, url)
+    return url
+
+
+# HLS playlists are stored with relative URIs and served by the app (see
+# app.api), so the stored master URL never expires; point this at a CDN or
+# reverse proxy in front of the app if there is one
+HLS_BASE_URL = os.environ.get("HLS_BASE_URL", "/api/hls").rstrip("/")
+
+
+def hls_master_url(s3_key: str) -> str:
+    return f"{HLS_BASE_URL}/{Path(s3_key).stem}/master.m3u8"
 
 
 # list of remote sample videos to preload to the bucket (idempotent)
@@ -76,12 +237,17 @@ SAMPLE_VIDEOS = [
 ]
 
 
+# per-download timeout of sample videos; preload runs off the startup path anyway
+SAMPLE_PRELOAD_TIMEOUT = float(os.environ.get("SAMPLE_PRELOAD_TIMEOUT", "10"))
+
+
 def ensure_sample_videos():
     """Ensure sample videos exist in the S3 bucket. This is idempotent and
     will not overwrite existing objects.
     """
     if not S3_BUCKET_NAME:
         return
+    s3 = get_s3()
     for entry in SAMPLE_VIDEOS:
         key = f"videos/{entry['name']}"
         try:
@@ -104,7 +270,7 @@ def ensure_sample_videos():
         except Exception:
             # object missing — download and upload
             try:
-                resp = httpx.get(entry["url"], timeout=30.0)
+                resp = httpx.get(entry["url"], timeout=SAMPLE_PRELOAD_TIMEOUT)
                 if resp.status_code == 200:
                     bio = resp.content
                     s3.put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=bio, ContentType="video/mp4")
@@ -123,7 +289,7 @@ def ensure_sample_videos():
                                 try:
                                     from app.tasks import transcode_video
 
-                                    transcode_video.send(key, v.id)
+                                    transcode_video.send(key, v.id, kind="preload")
                                 except Exception:
                                     pass
                     except Exception:
@@ -132,3 +298,17 @@ def ensure_sample_videos():
             except Exception:
                 continue
 
+
+
+def prepare_storage(preload_samples: bool = True):
+    """Startup work that needs S3: bucket creation, then the sample preload."""
+    log = logging.getLogger("s3")
+    try:
+        ensure_bucket()
+    except Exception:
+        # don't crash the app if minio is unreachable during local runs/tests
+        log.warning("Could not check bucket %s at %s", S3_BUCKET_NAME, S3_INTERNAL_ENDPOINT)
+        return
+    if preload_samples:
+        ensure_sample_videos()
+
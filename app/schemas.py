@@ -8,6 +8,7 @@ class RoomCreate(BaseModel):
 
 class RoomRead(RoomCreate):
     id: int
+    video_id: Optional[int] = None
 
 
 class VideoCreate(BaseModel):
@@ -19,6 +20,43 @@ class VideoRead(BaseModel):
     id: int
     filename: str
     s3_key: str
-    url: str
+    # not signed in slim catalog listings; fetch the single video to get it
+    url: Optional[str] = None
     hls_master: Optional[str] = None
-    status: Optional[str] = None
\ No newline at end of file
+    status: Optional[str] = None
+    content_hash: Optional[str] = None
+
+
+class UploadInit(BaseModel):
+    filename: str
+
+
+class UploadSession(BaseModel):
+    key: str
+    upload_id: str
+    part_size: int
+
+
+class UploadPart(BaseModel):
+    part_number: int
+    etag: str
+    size: Optional[int] = None
+
+
+class UploadStatus(UploadSession):
+    parts: list[UploadPart] = []
+
+
+class UploadComplete(BaseModel):
+    key: str
+    filename: str
+
+
+class UploadPresignRequest(BaseModel):
+    key: str
+    part_numbers: list[int]
+
+
+class UploadPresigned(BaseModel):
+    urls: dict[int, str]
+    expires_in: int
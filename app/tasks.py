@@ -1,32 +1,63 @@
 import os
+import hashlib
 import dramatiq
 from dramatiq.brokers.redis import RedisBroker
+from dramatiq.common import dq_name
 from pathlib import Path
 import shutil
 import subprocess
 import tempfile
 import logging
+import time
+import heapq
+import itertools
+import socket
+import uuid
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional
-from app.s3 import s3, S3_BUCKET_NAME, make_video_url
+from app.s3 import get_s3, S3_BUCKET_NAME, hls_master_url
 import json
 import redis as redis_lib
-from app.db import get_session
-from app.models import Video
+from sqlmodel import select
+from app.db import DB_AUTO_MIGRATE, create_db_and_tables, get_session
+from app.events import EVENTS_CHANNEL, StatusPublisher, VideoStatusEvent
+from app.models import OutboxEvent, Video
 
 REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
+# the client connects on first command; don't let an unreachable Redis hang
+# the API's enqueue calls
+REDIS_CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", "5"))
 
  
 try:
     import redis as redis_lib
 
     try:
-        redis_client = redis_lib.Redis.from_url(REDIS_URL)
+        redis_client = redis_lib.Redis.from_url(REDIS_URL, socket_connect_timeout=REDIS_CONNECT_TIMEOUT)
     except AttributeError:
-        redis_client = redis_lib.from_url(REDIS_URL)
+        redis_client = redis_lib.from_url(REDIS_URL, socket_connect_timeout=REDIS_CONNECT_TIMEOUT)
 except Exception:
     redis_client = None
 
+
+class SchemaMigration(dramatiq.Middleware):
+    """Apply the schema when a worker process boots.
+
+    The worker writes to tables the web app may not have created yet, if
+    it starts first or runs with DB_AUTO_MIGRATE=0.
+    """
+
+    def before_worker_boot(self, broker, worker):
+        if DB_AUTO_MIGRATE:
+            create_db_and_tables()
+
+
 redis_broker = RedisBroker(client=redis_client)
+redis_broker.add_middleware(SchemaMigration())
 dramatiq.set_broker(redis_broker)
 
 
@@ -45,176 +76,875 @@ def split_video(video_path: str, output_dir: str, segment_seconds: int = 10):
         chunk.write_text(f"Simulated segment {i} from {video_path}\n")
 
 
-def _perform_transcode(s3_key: str, video_id: Optional[int] = None, simulate: bool = False):
-    """Transcode an S3 video into multiple resolutions and produce HLS playlists.
+# job kinds, in scheduling order: user uploads go before sample preloads
+JOB_PRIORITY = {"upload": 0, "preload": 10}
+
+# ffmpeg scheduling per worker process: how many encodes run at once and how
+# many threads each gets; defaults split the host's cores between the slots
+CPU_COUNT = os.cpu_count() or 1
+TRANSCODE_CONCURRENCY = max(int(os.environ.get("TRANSCODE_CONCURRENCY", str(max(1, CPU_COUNT // 4)))), 1)
+FFMPEG_THREADS = max(int(os.environ.get("FFMPEG_THREADS", str(max(1, CPU_COUNT // TRANSCODE_CONCURRENCY)))), 1)
+WORKER_STATS_KEY = "kino:transcode:workers"
+
+
+class TranscodeScheduler:
+    """Admit a bounded number of ffmpeg jobs at a time, best priority first.
+
+    Dramatiq hands messages to worker threads in arrival order; jobs then wait
+    here until a slot frees up. Waiting jobs are ordered by (kind, duration),
+    so user uploads beat preloads and short videos beat long ones.
+    """
+
+    def __init__(self, slots: int, threads_per_job: int):
+        self.slots = slots
+        self.threads_per_job = threads_per_job
+        self.running = 0
+        self.completed = 0
+        self._waiting: list[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, kind: str = "upload", duration: float = 0.0):
+        entry = (JOB_PRIORITY.get(kind, 5), duration, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            while self.running >= self.slots or self._waiting[0] != entry:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self.running += 1
+            # another slot may still be free for the next waiter
+            self._cond.notify_all()
+        self._report()
+        try:
+            yield self.threads_per_job
+        finally:
+            with self._cond:
+                self.running -= 1
+                self.completed += 1
+                self._cond.notify_all()
+            self._report()
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "threads_per_job": self.threads_per_job,
+            "running": self.running,
+            "waiting": len(self._waiting),
+            "completed": self.completed,
+        }
+
+    def _report(self):
+        # best-effort: lets the API report queue depth across worker processes
+        if redis_client is None:
+            return
+        try:
+            stats = dict(self.stats(), ts=time.time())
+            redis_client.hset(WORKER_STATS_KEY, f"{socket.gethostname()}:{os.getpid()}", json.dumps(stats))
+        except Exception:
+            pass
+
+
+scheduler = TranscodeScheduler(TRANSCODE_CONCURRENCY, FFMPEG_THREADS)
+
+
+def queue_depth(queue_name: str = "default", stale_after: float = 300.0) -> dict:
+    """Transcode backlog: messages still in the broker plus per-worker state."""
+    depth = {"queued": None, "delayed": None, "running": 0, "waiting": 0, "slots": 0, "workers": 0}
+    if redis_client is None:
+        return depth
+    ns = redis_broker.namespace
+    depth["queued"] = redis_client.llen(f"{ns}:{queue_name}")
+    depth["delayed"] = redis_client.llen(f"{ns}:{dq_name(queue_name)}")
+    now = time.time()
+    for raw in redis_client.hvals(WORKER_STATS_KEY):
+        stats = json.loads(raw)
+        if now - stats.get("ts", 0) > stale_after:
+            continue
+        depth["workers"] += 1
+        for field in ("running", "waiting", "slots"):
+            depth[field] += stats.get(field, 0)
+    return depth
+
+
+@dataclass
+class Rendition:
+    label: str
+    height: Optional[int]  # None for the audio-only rendition
+    video_kbps: int = 0
+    audio_kbps: int = 128
+    width: Optional[int] = None
 
-    This task will download the object from S3, run ffmpeg to generate HLS
-    segments for a set of target resolutions, upload the results back to S3
-    under a dedicated prefix and update the Video record with the master playlist url.
-    If ffmpeg is not available or `simulate=True`, this creates simulated segments.
+
+def _parse_ladder(spec: str) -> list[Rendition]:
+    """Parse `HLS_LADDER`, e.g. "1080:5000,720:2800" (height:max video kbps)."""
+    ladder = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        height, _, kbps = item.partition(":")
+        ladder.append(Rendition(label=f"{int(height)}p", height=int(height), video_kbps=int(kbps or 0)))
+    return sorted(ladder, key=lambda r: r.height, reverse=True)
+
+
+# bitrate ladder for this deployment; rungs above the source height are
+# skipped so nothing is upscaled
+HLS_LADDER = _parse_ladder(os.environ.get("HLS_LADDER", "1080:5000,720:2800,480:1400,360:800"))
+HLS_AUDIO_ONLY = os.environ.get("HLS_AUDIO_ONLY", "0").lower() in ("1", "true", "yes")
+HLS_AUDIO_KBPS = int(os.environ.get("HLS_AUDIO_KBPS", "128"))
+
+# segments are uploaded while ffmpeg is still encoding; these bound the upload
+# threads per job and how often the output directory is polled
+HLS_UPLOAD_CONCURRENCY = int(os.environ.get("HLS_UPLOAD_CONCURRENCY", "8"))
+HLS_WATCH_INTERVAL = float(os.environ.get("HLS_WATCH_INTERVAL", "1.0"))
+
+# trickplay: a thumbnail every TRICKPLAY_INTERVAL seconds, tiled into JPEG
+# sprite sheets with a WebVTT index under hls/<stem>/thumbs/, plus an
+# I-frame playlist per video rendition for keyframe-accurate scrubbing
+TRICKPLAY_ENABLED = os.environ.get("TRICKPLAY_ENABLED", "1").lower() in ("1", "true", "yes")
+TRICKPLAY_INTERVAL = max(float(os.environ.get("TRICKPLAY_INTERVAL", "5")), 1.0)
+TRICKPLAY_WIDTH = int(os.environ.get("TRICKPLAY_WIDTH", "160"))
+TRICKPLAY_COLUMNS = 10
+TRICKPLAY_ROWS = 10
+TRICKPLAY_DIR = "thumbs"
+# mpegts packet size; every segment starts with its own PAT/PMT
+TS_PACKET_SIZE = 188
+
+
+def _ladder_fingerprint() -> str:
+    """Short hash of every setting that shapes the HLS output.
+
+    A finished output is reused for a duplicate upload only if it was made with
+    the same fingerprint, so changing the ladder re-encodes new uploads.
+    """
+    spec = {
+        "ladder": [(r.label, r.height, r.video_kbps) for r in HLS_LADDER],
+        "audio_only": HLS_AUDIO_ONLY,
+        "audio_kbps": HLS_AUDIO_KBPS,
+        "trickplay": [TRICKPLAY_ENABLED, TRICKPLAY_INTERVAL, TRICKPLAY_WIDTH],
+    }
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+
+LADDER_FINGERPRINT = _ladder_fingerprint()
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cached_output_query(content_hash: str):
+    """Select a ready video with the same source and ladder; works with sync and async sessions."""
+    return (
+        select(Video)
+        .where(
+            Video.content_hash == content_hash,
+            Video.ladder_fingerprint == LADDER_FINGERPRINT,
+            Video.status == "ready",
+            Video.hls_master.is_not(None),
+        )
+        .order_by(Video.id)
+        .limit(1)
+    )
+
+
+def _shared_with_others(s3_key: str, video_id: int) -> bool:
+    """True if a row other than `video_id` plays from `s3_key` (and its HLS prefix)."""
+    with get_session() as session:
+        q = select(Video.id).where(Video.s3_key == s3_key, Video.id != video_id).limit(1)
+        return session.exec(q).first() is not None
+
+
+def _download_source(s3_key: str, dest: Path):
+    """Stream the source object to disk.
+
+    boto3's transfer manager fetches ranged chunks and writes them straight to
+    the file, so worker memory stays flat regardless of the video size.
     """
+    get_s3().download_file(S3_BUCKET_NAME, s3_key, str(dest))
+
+
+def _simulate_rendition(out_dir: Path, label: str):
+    # create placeholder TS segments and playlist
+    segs = []
+    for i in range(3):
+        seg = out_dir / f"seg_{i}.ts"
+        seg.write_text(f"SIMULATED SEGMENT {i} for {label}\n")
+        segs.append(seg.name)
+
+    playlist = out_dir / "playlist.m3u8"
+    playlist.write_text("\n".join(["#EXTM3U", "#EXT-X-VERSION:3"] + [f"#EXTINF:6.0,\n{n}" for n in segs]))
+
+
+def probe_source(path: Path) -> dict:
+    """Return basic stream info for `path` using ffprobe."""
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json", "-show_streams", "-show_format", str(path)],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    ).stdout
+    info = json.loads(out)
+    streams = info.get("streams", [])
+    video = next((st for st in streams if st.get("codec_type") == "video" and st.get("disposition", {}).get("attached_pic") != 1), None)
+    return {
+        "width": int(video["width"]) if video else None,
+        "height": int(video["height"]) if video else None,
+        "has_audio": any(st.get("codec_type") == "audio" for st in streams),
+        "duration": float(info.get("format", {}).get("duration") or 0),
+        "video_profile": video.get("profile") if video else None,
+        "video_level": video.get("level") if video else None,
+    }
+
+
+def select_ladder(source: dict, ladder: Optional[list[Rendition]] = None, audio_only: Optional[bool] = None) -> list[Rendition]:
+    """Pick the renditions for a source without ever upscaling it."""
+    ladder = HLS_LADDER if ladder is None else ladder
+    audio_only = HLS_AUDIO_ONLY if audio_only is None else audio_only
+    audio_kbps = HLS_AUDIO_KBPS if source.get("has_audio", True) else 0
+    chosen = []
+    src_w, src_h = source.get("width"), source.get("height")
+    if src_h:
+        chosen = [replace(r, audio_kbps=audio_kbps) for r in ladder if r.height <= src_h]
+        if not chosen:
+            # source is below the smallest rung: keep its native height
+            smallest = ladder[-1] if ladder else Rendition("source", src_h, 400)
+            height = src_h - src_h % 2
+            chosen = [Rendition(label=f"{height}p", height=height, video_kbps=smallest.video_kbps, audio_kbps=audio_kbps)]
+        for r in chosen:
+            if src_w:
+                r.width = int(round(src_w * r.height / src_h / 2)) * 2
+    if source.get("has_audio", True) and (audio_only or not chosen):
+        chosen.append(Rendition(label="audio", height=None, audio_kbps=HLS_AUDIO_KBPS))
+    return chosen
+
+
+def _hls_output_args(out_dir: Path) -> list[str]:
+    return [
+        "-hls_time",
+        "6",
+        "-hls_playlist_type",
+        "event",
+        "-hls_segment_filename",
+        str(out_dir / "seg_%03d.ts"),
+        str(out_dir / "playlist.m3u8"),
+    ]
+
+
+def _ffmpeg_hls_command(
+    local_input: Path,
+    tmpdir: Path,
+    renditions: list[Rendition],
+    threads: Optional[int] = None,
+    thumbnail_size: Optional[tuple[int, int]] = None,
+) -> list[str]:
+    """Build one ffmpeg invocation that emits every rendition.
+
+    The source is decoded once and the frames are fanned out through a
+    `split` filter to one scaler + encoder per video rendition. `threads` is
+    the job's CPU budget, shared between the encoders. With `thumbnail_size`
+    another branch of the same split writes the trickplay sprite sheets.
+    """
+    video = [r for r in renditions if r.height]
+    thumbnail_size = thumbnail_size if video else None
+    cmd = ["ffmpeg", "-y"]
+    if threads:
+        cmd += ["-threads", str(threads)]
+    cmd += ["-i", str(local_input)]
+    if video:
+        n = len(video) + (1 if thumbnail_size else 0)
+        if threads:
+            cmd += ["-filter_complex_threads", str(threads)]
+        graph = [f"[0:v]split={n}" + "".join(f"[v{i}]" for i in range(n))]
+        # browsers only decode 4:2:0 H.264, so normalise the pixel format as well
+        graph += [f"[v{i}]scale=-2:{r.height},format=yuv420p[v{i}out]" for i, r in enumerate(video)]
+        if thumbnail_size:
+            w, h = thumbnail_size
+            graph.append(
+                f"[v{len(video)}]fps=1/{TRICKPLAY_INTERVAL:g},scale={w}:{h},"
+                f"tile={TRICKPLAY_COLUMNS}x{TRICKPLAY_ROWS}[thumbs]"
+            )
+        cmd += ["-filter_complex", ";".join(graph)]
+
+    for r in renditions:
+        out_dir = tmpdir / r.label
+        if r.height is None:
+            cmd += ["-map", "0:a", "-vn", "-c:a", "aac", "-ar", "48000", "-b:a", f"{r.audio_kbps}k"]
+            cmd += _hls_output_args(out_dir)
+            continue
+        cmd += [
+            "-map",
+            f"[v{video.index(r)}out]",
+            "-map",
+            "0:a?",
+            "-c:a",
+            "aac",
+            "-ar",
+            "48000",
+            "-b:a",
+            f"{r.audio_kbps or HLS_AUDIO_KBPS}k",
+            "-c:v",
+            "libx264",
+            "-profile:v",
+            "main",
+            "-crf",
+            "23",
+        ]
+        if threads:
+            cmd += ["-threads", str(max(1, threads // len(video)))]
+        if r.video_kbps:
+            # capped CRF: quality-driven, but never above the rung's budget
+            cmd += ["-maxrate", f"{r.video_kbps}k", "-bufsize", f"{2 * r.video_kbps}k"]
+        cmd += [
+            "-g",
+            "48",
+            "-keyint_min",
+            "48",
+            "-sc_threshold",
+            "0",
+        ]
+        cmd += _hls_output_args(out_dir)
+    if thumbnail_size:
+        cmd += ["-map", "[thumbs]", "-c:v", "mjpeg", "-q:v", "5", "-f", "image2", "-start_number", "0"]
+        cmd.append(str(tmpdir / TRICKPLAY_DIR / "sprite_%03d.jpg"))
+    return cmd
+
+
+def _thumbnail_size(source: dict) -> tuple[int, int]:
+    width, height = source.get("width"), source.get("height")
+    if not width or not height:
+        return TRICKPLAY_WIDTH, TRICKPLAY_WIDTH * 9 // 16 // 2 * 2
+    return TRICKPLAY_WIDTH, max(2, round(TRICKPLAY_WIDTH * height / width / 2) * 2)
+
+
+def _vtt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+def write_trickplay_vtt(thumbs_dir: Path, duration: float, size: tuple[int, int]) -> Optional[Path]:
+    """Index the sprite sheets ffmpeg wrote: one cue per thumbnail, `sheet#xywh=...`."""
+    sheets = sorted(thumbs_dir.glob("sprite_*.jpg"))
+    if not sheets:
+        return None
+    per_sheet = TRICKPLAY_COLUMNS * TRICKPLAY_ROWS
+    count = len(sheets) * per_sheet
+    if duration > 0:
+        count = min(count, max(1, int(-(-duration // TRICKPLAY_INTERVAL))))
+    w, h = size
+    lines = ["WEBVTT", ""]
+    for i in range(count):
+        start = i * TRICKPLAY_INTERVAL
+        end = min(start + TRICKPLAY_INTERVAL, duration) if duration > 0 else start + TRICKPLAY_INTERVAL
+        sheet, tile = divmod(i, per_sheet)
+        row, col = divmod(tile, TRICKPLAY_COLUMNS)
+        lines += [f"{_vtt_time(start)} --> {_vtt_time(end)}", f"{sheets[sheet].name}#xywh={col * w},{row * h},{w},{h}", ""]
+    vtt = thumbs_dir / "thumbs.vtt"
+    vtt.write_text("\n".join(lines))
+    return vtt
+
+
+def _ts_keyframes(segment: Path) -> tuple[int, list[tuple[int, int, float]]]:
+    """Header length (up to the PMT) and (offset, length, pts seconds) of
+    every video keyframe in an MPEG-TS segment.
+
+    Reads the TS packets directly: the video PID comes from PAT/PMT, a frame
+    starts at a payload_unit_start packet and is a keyframe when the muxer set
+    random_access_indicator; it extends up to the next video frame.
+    """
+    data = segment.read_bytes()
+    pmt_pid = video_pid = None
+    header = 0
+    starts = []  # (offset, keyframe, pts)
+    for offset in range(0, len(data) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        pkt = data[offset:offset + TS_PACKET_SIZE]
+        if pkt[0] != 0x47:
+            continue
+        pid = ((pkt[1] & 0x1F) << 8) | pkt[2]
+        pusi = bool(pkt[1] & 0x40)
+        afc = (pkt[3] >> 4) & 3
+        start = 4
+        random_access = False
+        if afc & 2:
+            af_len = pkt[4]
+            random_access = af_len > 0 and bool(pkt[5] & 0x40)
+            start = 5 + af_len
+        if not afc & 1 or start >= TS_PACKET_SIZE:
+            continue
+        payload = pkt[start:]
+        if pid == 0 and pusi and pmt_pid is None:
+            section = payload[1 + payload[0]:]
+            pmt_pid = ((section[10] & 0x1F) << 8) | section[11]
+        elif pid == pmt_pid and pusi and video_pid is None:
+            header = offset + TS_PACKET_SIZE
+            section = payload[1 + payload[0]:]
+            end = 3 + (((section[1] & 0x0F) << 8) | section[2]) - 4
+            i = 12 + (((section[10] & 0x0F) << 8) | section[11])
+            while i + 5 <= end:
+                if section[i] in (0x1B, 0x24):  # H.264 / HEVC
+                    video_pid = ((section[i + 1] & 0x1F) << 8) | section[i + 2]
+                    break
+                i += 5 + (((section[i + 3] & 0x0F) << 8) | section[i + 4])
+        elif pid == video_pid and pusi:
+            pts = None
+            if payload[:3] == b"\x00\x00\x01" and payload[7] & 0x80:
+                b = payload[9:14]
+                pts = (((b[0] >> 1) & 7) << 30 | b[1] << 22 | (b[2] >> 1) << 15 | b[3] << 7 | b[4] >> 1) / 90000
+            starts.append((offset, random_access, pts))
+    frames = []
+    for i, (offset, keyframe, pts) in enumerate(starts):
+        if keyframe and pts is not None:
+            end = starts[i + 1][0] if i + 1 < len(starts) else len(data)
+            frames.append((offset, end - offset, pts))
+    return header, frames
+
+
+def write_iframe_playlist(out_dir: Path) -> Optional[int]:
+    """Write `iframes.m3u8` (EXT-X-I-FRAMES-ONLY) for a finished rendition.
+
+    Every keyframe is addressed as a byte range of its segment, from its first
+    TS packet up to the next video frame, with the segment's leading PAT/PMT
+    as EXT-X-MAP, so a player can fetch single frames instead of whole segments.
+    Returns the peak bandwidth (bits/s) for the master playlist, or None.
+    """
+    segments = _playlist_segments(out_dir / "playlist.m3u8")
+    frames = []  # (segment, offset, length, pts)
+    headers = {}
+    origin = None
+    for name, _ in segments:
+        headers[name], keyframes = _ts_keyframes(out_dir / name)
+        for offset, length, pts in keyframes:
+            if origin is None:
+                origin = pts
+            frames.append((name, offset, length, pts))
+    if not frames:
+        return None
+    total = sum(duration for _, duration in segments)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:5", "", "#EXT-X-PLAYLIST-TYPE:VOD", "#EXT-X-I-FRAMES-ONLY"]
+    peak = 0.0
+    longest = 0.0
+    current = None
+    for i, (name, offset, length, pts) in enumerate(frames):
+        nxt = frames[i + 1][3] if i + 1 < len(frames) else origin + total
+        duration = max(nxt - pts, 0.001)
+        longest = max(longest, duration)
+        peak = max(peak, length * 8 / duration)
+        if name != current:
+            lines.append(f'#EXT-X-MAP:URI="{name}",BYTERANGE="{headers[name]}@0"')
+            current = name
+        lines += [f"#EXTINF:{duration:.3f},", f"#EXT-X-BYTERANGE:{length}@{offset}", name]
+    lines[2] = f"#EXT-X-TARGETDURATION:{max(1, int(-(-longest // 1)))}"
+    lines.append("#EXT-X-ENDLIST")
+    (out_dir / "iframes.m3u8").write_text("\n".join(lines) + "\n")
+    return int(peak)
+
+
+def build_trickplay(tmpdir: Path, renditions: list[Rendition], duration: float, thumbnail_size: tuple[int, int]) -> dict:
+    """Post-process a finished encode; returns {label: I-frame bandwidth} and writes the VTT."""
     log = logging.getLogger("transcode")
+    iframes = {}
+    for r in renditions:
+        if r.height is None:
+            continue
+        try:
+            bandwidth = write_iframe_playlist(tmpdir / r.label)
+        except Exception:
+            log.exception("I-frame playlist failed for %s", r.label)
+            continue
+        if bandwidth:
+            iframes[r.label] = bandwidth
+    try:
+        write_trickplay_vtt(tmpdir / TRICKPLAY_DIR, duration, thumbnail_size)
+    except Exception:
+        log.exception("Trickplay index failed")
+    return iframes
 
-    if not s3:
-        log.error("No s3 client available, aborting transcode")
-        return
+
+def upload_trickplay(tmpdir: Path, prefix: str, labels: list[str], pool: ThreadPoolExecutor) -> list[str]:
+    """Upload sprites, VTT and I-frame playlists; returns labels whose I-frame playlist is online.
+
+    Trickplay is an extra: failures are logged and never fail the transcode.
+    """
+    log = logging.getLogger("transcode")
+    files = {}
+    thumbs = tmpdir / TRICKPLAY_DIR
+    if (thumbs / "thumbs.vtt").exists():
+        for path in sorted(thumbs.glob("sprite_*.jpg")):
+            files[path] = (f"{prefix}/{TRICKPLAY_DIR}/{path.name}", "image/jpeg", None)
+        files[thumbs / "thumbs.vtt"] = (f"{prefix}/{TRICKPLAY_DIR}/thumbs.vtt", "text/vtt", None)
+    for label in labels:
+        path = tmpdir / label / "iframes.m3u8"
+        if path.exists():
+            files[path] = (f"{prefix}/{label}/iframes.m3u8", "application/vnd.apple.mpegurl", label)
+
+    def put(path: Path, key: str, content_type: str):
+        get_s3().put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=path.read_bytes(), ContentType=content_type)
+
+    online = []
+    futures = {pool.submit(put, path, key, ctype): (key, label) for path, (key, ctype, label) in files.items()}
+    for fut in as_completed(futures):
+        key, label = futures[fut]
+        try:
+            fut.result()
+        except Exception:
+            log.exception("Failed to upload %s", key)
+            continue
+        if label:
+            online.append(label)
+    return online
+
+
+_H264_PROFILES = {"baseline": "42e0", "constrained baseline": "42e0", "main": "4d40", "high": "6400"}
+
+
+def _h264_codec_string(profile: Optional[str], level: Optional[int]) -> str:
+    prefix = _H264_PROFILES.get((profile or "main").lower(), "4d40")
+    return f"avc1.{prefix}{int(level or 31):02x}"
+
+
+def _playlist_segments(playlist: Path) -> list[tuple[str, float]]:
+    segments = []
+    duration = None
+    for line in playlist.read_text().splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+        elif line and not line.startswith("#"):
+            segments.append((line, duration or 0.0))
+            duration = None
+    return segments
+
+
+def measure_rendition(out_dir: Path, rendition: Rendition, has_audio: bool, measure: bool = True) -> dict:
+    """Measure the real peak/average bitrate, resolution and codecs of a rendition.
+
+    With `measure=False` (simulated output, early master while still encoding),
+    or when the output can't be read, the rung's nominal values are used.
+    """
+    audio_codec = "mp4a.40.2"
+    nominal_bps = (rendition.video_kbps + (rendition.audio_kbps if has_audio else 0)) * 1000
+    info = {
+        "bandwidth": nominal_bps or 128000,
+        "average_bandwidth": None,
+        "resolution": f"{rendition.width}x{rendition.height}" if rendition.width and rendition.height else None,
+        "codecs": None,
+    }
+    if rendition.height is None:
+        info["codecs"] = audio_codec
+    if not measure:
+        return info
+    try:
+        segments = _playlist_segments(out_dir / "playlist.m3u8")
+        total_bits = 0
+        total_duration = 0.0
+        peak = 0.0
+        for name, duration in segments:
+            bits = (out_dir / name).stat().st_size * 8
+            total_bits += bits
+            total_duration += duration
+            if duration > 0:
+                peak = max(peak, bits / duration)
+        if total_duration > 0 and peak > 0:
+            info["average_bandwidth"] = int(total_bits / total_duration)
+            info["bandwidth"] = int(peak)
+        if segments and rendition.height is not None and shutil.which("ffprobe"):
+            seg = probe_source(out_dir / segments[0][0])
+            if seg["width"] and seg["height"]:
+                info["resolution"] = f"{seg['width']}x{seg['height']}"
+            info["codecs"] = _h264_codec_string(seg["video_profile"], seg["video_level"]) + (f",{audio_codec}" if seg["has_audio"] else "")
+    except Exception:
+        logging.getLogger("transcode").debug("could not measure rendition %s", rendition.label, exc_info=True)
+    return info
+
+
+class HlsUploader:
+    """Upload HLS output to S3 while ffmpeg is still producing it.
+
+    A segment is only uploaded once it appears in its variant playlist (ffmpeg
+    lists a segment after closing it), and a playlist is only uploaded after
+    every segment it references is in S3, so readers never see dangling URIs.
+    """
+
+    def __init__(self, tmpdir: Path, labels: list[str], prefix: str, pool: ThreadPoolExecutor):
+        self.tmpdir = tmpdir
+        self.labels = labels
+        self.prefix = prefix
+        self.pool = pool
+        self._uploaded: dict[str, set[str]] = {label: set() for label in labels}
+        self._playlists: dict[str, str] = {}
+        self._errors: list[BaseException] = []
+
+    def _put_file(self, path: Path, key: str):
+        with path.open("rb") as fh:
+            get_s3().put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=fh, ContentType="video/mp2t")
+
+    def sync(self) -> bool:
+        """Upload whatever is new; True once every variant playlist is online."""
+        self._errors = []
+        pending = {}
+        snapshots = {}
+        for label in self.labels:
+            playlist = self.tmpdir / label / "playlist.m3u8"
+            try:
+                text = playlist.read_text()
+            except FileNotFoundError:
+                continue
+            if text == self._playlists.get(label):
+                continue
+            snapshots[label] = text
+            for line in text.splitlines():
+                name = line.strip()
+                if name and not name.startswith("#") and name not in self._uploaded[label]:
+                    key = f"{self.prefix}/{label}/{name}"
+                    pending[self.pool.submit(self._put_file, self.tmpdir / label / name, key)] = (label, name)
+
+        failed = set()
+        for fut in as_completed(pending):
+            label, name = pending[fut]
+            try:
+                fut.result()
+                self._uploaded[label].add(name)
+            except Exception as e:
+                self._errors.append(e)
+                failed.add(label)
+
+        for label, text in snapshots.items():
+            if label in failed:
+                continue
+            try:
+                get_s3().put_object(
+                    Bucket=S3_BUCKET_NAME,
+                    Key=f"{self.prefix}/{label}/playlist.m3u8",
+                    Body=text.encode("utf-8"),
+                    ContentType="application/vnd.apple.mpegurl",
+                    CacheControl="no-cache",
+                )
+                self._playlists[label] = text
+            except Exception as e:
+                self._errors.append(e)
+        return len(self._playlists) == len(self.labels)
+
+    def raise_errors(self):
+        """Re-raise the first upload error of the most recent sync."""
+        if self._errors:
+            raise self._errors[0]
+
+
+def _upload_master(master_key: str, variants: list[tuple[Rendition, dict]], iframes: Optional[dict] = None):
+    # build master playlist referencing each variant, highest quality first
+    iframes = iframes or {}
+    master_lines = ["#EXTM3U", "#EXT-X-VERSION:4" if iframes else "#EXT-X-VERSION:3"]
+    for rendition, info in variants:
+        attrs = [f"BANDWIDTH={info['bandwidth']}"]
+        if info.get("average_bandwidth"):
+            attrs.append(f"AVERAGE-BANDWIDTH={info['average_bandwidth']}")
+        if info.get("resolution"):
+            attrs.append(f"RESOLUTION={info['resolution']}")
+        if info.get("codecs"):
+            attrs.append(f'CODECS="{info["codecs"]}"')
+        master_lines.append("#EXT-X-STREAM-INF:" + ",".join(attrs))
+        # relative URI: resolved against wherever the master is served from
+        master_lines.append(f"{rendition.label}/playlist.m3u8")
+    for rendition, info in variants:
+        if rendition.label not in iframes:
+            continue
+        attrs = [f"BANDWIDTH={iframes[rendition.label]}"]
+        if info.get("resolution"):
+            attrs.append(f"RESOLUTION={info['resolution']}")
+        if info.get("codecs"):
+            attrs.append(f'CODECS="{info["codecs"].split(",")[0]}"')
+        attrs.append(f'URI="{rendition.label}/iframes.m3u8"')
+        master_lines.append("#EXT-X-I-FRAME-STREAM-INF:" + ",".join(attrs))
+
+    get_s3().put_object(Bucket=S3_BUCKET_NAME, Key=master_key, Body="\n".join(master_lines).encode("utf-8"), ContentType="application/vnd.apple.mpegurl")
+
+
+status_publisher = StatusPublisher(redis_client, get_session)
+
+
+def _set_video_status(video_id: Optional[int], status: str, hls_master: Optional[str] = None, **fields) -> bool:
+    """Persist a status change and notify UI clients through the event outbox."""
+    log = logging.getLogger("transcode")
+    if not video_id:
+        return False
+    try:
+        return status_publisher.set_status(video_id, status, hls_master, **fields)
+    except Exception:
+        log.exception("Failed to set status %s for video %s", status, video_id)
+        return False
+
+
+def _stored_content_hash(video_id: Optional[int]) -> Optional[str]:
+    if not video_id:
+        return None
+    with get_session() as session:
+        v = session.get(Video, video_id)
+        return v.content_hash if v is not None else None
+
+
+def _reuse_cached_output(video_id: Optional[int], s3_key: str, content_hash: str) -> bool:
+    """Point the video at an identical upload that is already transcoded.
+
+    The row takes over the other upload's source key and HLS output, and its
+    own copy of the source is deleted. Returns False when nothing matches.
+    """
+    log = logging.getLogger("transcode")
+    if not video_id:
+        return False
+    with get_session() as session:
+        cached = session.exec(cached_output_query(content_hash).where(Video.id != video_id)).first()
+        if cached is None:
+            return False
+        shared_key, master = cached.s3_key, cached.hls_master
+    _set_video_status(
+        video_id, "ready", hls_master=master,
+        s3_key=shared_key, content_hash=content_hash, ladder_fingerprint=LADDER_FINGERPRINT,
+    )
+    if shared_key != s3_key and not _shared_with_others(s3_key, video_id):
+        try:
+            _delete_keys([s3_key])
+        except Exception:
+            # unowned now, the orphan sweep removes it later
+            log.exception("Failed to delete duplicate source %s", s3_key)
+    log.info("Video %s reuses the HLS output of %s (sha256 %s)", video_id, shared_key, content_hash)
+    return True
+
+
+def _perform_transcode(s3_key: str, video_id: Optional[int] = None, simulate: bool = False, kind: str = "upload"):
+    """Transcode an S3 video into multiple resolutions and produce HLS playlists.
+
+    This task will stream the object from S3 to disk, pick renditions from the
+    configured ladder based on the ffprobe'd source, run a single ffmpeg pass
+    that generates HLS segments for all of them, upload the results back to S3
+    under a dedicated prefix (with a master playlist carrying the measured
+    bitrates, plus trickplay sprites and I-frame playlists) and update the
+    Video record with the master playlist url.
+    If ffmpeg is not available or `simulate=True`, this creates simulated segments;
+    an ffmpeg run that fails marks the video failed and removes what was
+    already uploaded for early playback.
+    The encode itself waits for a slot from `scheduler` (see `kind`). A source
+    whose sha256 matches a video already transcoded with LADDER_FINGERPRINT
+    reuses that output instead; uploads that bypassed the app (direct to S3)
+    are hashed after the download.
+    """
+    log = logging.getLogger("transcode")
 
     tmpdir = Path(tempfile.mkdtemp(prefix="transcode_"))
+    # set once the job has written its final status (ready, or failed on download)
+    finished = False
     try:
         local_input = tmpdir / "input.mp4"
 
+        content_hash = _stored_content_hash(video_id)
+        if content_hash and _reuse_cached_output(video_id, s3_key, content_hash):
+            finished = True
+            return
+
         # mark processing in DB and publish update as early as possible
-        try:
-            if video_id:
-                with get_session() as session:
-                    v = session.get(Video, video_id)
-                    if v:
-                        v.status = "processing"
-                        session.add(v)
-                        session.commit()
-                        try:
-                            # publish a notification so UI can react immediately
-                            rclient = redis_lib.Redis.from_url(REDIS_URL)
-                            message = {"from": "server", "payload": json.dumps({"type": "video_status", "id": video_id, "status": "processing"})}
-                            rclient.publish("room:updates", json.dumps(message))
-                        except Exception:
-                            log.exception("Failed to publish processing status for video %s", video_id)
-        except Exception:
-            log.exception("Failed to set processing status for id=%s", video_id)
+        _set_video_status(video_id, "processing")
 
         # download from S3
         try:
-            obj = s3.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)
-            data = obj["Body"].read()
-            local_input.write_bytes(data)
+            _download_source(s3_key, local_input)
         except Exception as e:
             log.exception("Failed to download from S3: %s", e)
             # mark failed and publish to UI
-            if video_id:
-                try:
-                    with get_session() as session:
-                        v = session.get(Video, video_id)
-                        if v:
-                            v.status = "failed"
-                            session.add(v)
-                            session.commit()
-                    try:
-                        rclient = redis_lib.Redis.from_url(REDIS_URL)
-                        message = {"from": "server", "payload": json.dumps({"type": "video_status", "id": video_id, "status": "failed"})}
-                        rclient.publish("room:updates", json.dumps(message))
-                    except Exception:
-                        log.exception("Failed to publish failed status for video %s", video_id)
-                except Exception:
-                    log.exception("Failed to mark video %s as failed after download error", video_id)
+            _set_video_status(video_id, "failed")
+            finished = True
             return
-
-        resolutions = [(1080, "1080p"), (720, "720p"), (480, "480p")]
-        master_entries = []
+        if video_id and not content_hash:
+            content_hash = file_sha256(local_input)
+            if _reuse_cached_output(video_id, s3_key, content_hash):
+                finished = True
+                return
 
         ffmpeg_available = shutil.which("ffmpeg") is not None
-        for height, label in resolutions:
-            out_dir = tmpdir / label
-            out_dir.mkdir(parents=True, exist_ok=True)
-            playlist = out_dir / "playlist.m3u8"
-            if simulate or not ffmpeg_available:
-                # create placeholder TS segments and playlist
-                segs = []
-                for i in range(3):
-                    seg = out_dir / f"seg_{i}.ts"
-                    seg.write_text(f"SIMULATED SEGMENT {i} for {label}\n")
-                    segs.append(seg.name)
-
-                playlist.write_text("\n".join(["#EXTM3U", "#EXT-X-VERSION:3"] + [f"#EXTINF:6.0,\n{n}" for n in segs]))
+        use_ffmpeg = not simulate and ffmpeg_available
+        source = {"width": 1920, "height": 1080, "has_audio": True}
+        if use_ffmpeg and shutil.which("ffprobe"):
+            try:
+                source = probe_source(local_input)
+            except Exception:
+                log.exception("ffprobe failed for %s, using the full ladder", s3_key)
+        renditions = select_ladder(source)
+        if not renditions:
+            log.error("No video or audio streams in %s", s3_key)
+            return
+        has_audio = source.get("has_audio", True)
+        labels = [r.label for r in renditions]
+        hls_prefix = f"hls/{Path(s3_key).stem}"
+        master_key = f"{hls_prefix}/master.m3u8"
+        master_url = hls_master_url(s3_key)
+
+        for label in labels:
+            (tmpdir / label).mkdir(parents=True, exist_ok=True)
+        thumbnail_size = _thumbnail_size(source) if use_ffmpeg and TRICKPLAY_ENABLED else None
+        if thumbnail_size:
+            (tmpdir / TRICKPLAY_DIR).mkdir()
+        iframes = {}
+        encode_failed = False
+
+        with ThreadPoolExecutor(max_workers=HLS_UPLOAD_CONCURRENCY, thread_name_prefix="hls-upload") as pool:
+            uploader = HlsUploader(tmpdir, labels, hls_prefix, pool)
+            published = False
+
+            def publish_early():
+                # once every variant has a playlist online, viewers can start
+                # watching the EVENT playlists while the encode continues;
+                # nominal ladder values stand in until the output is measured
+                nonlocal published
+                if published or not uploader.sync():
+                    return
+                nominal = [(r, measure_rendition(tmpdir / r.label, r, has_audio, measure=False)) for r in renditions]
+                _upload_master(master_key, nominal)
+                _set_video_status(video_id, "processing", hls_master=master_url)
+                published = True
+
+            if not use_ffmpeg:
+                for label in labels:
+                    _simulate_rendition(tmpdir / label, label)
             else:
-                # run ffmpeg to produce HLS
-                cmd = [
-                    "ffmpeg",
-                    "-y",
-                    "-i",
-                    str(local_input),
-                    "-vf",
-                    f"scale=-2:{height}",
-                    "-c:a",
-                    "aac",
-                    "-ar",
-                    "48000",
-                    "-b:a",
-                    "128k",
-                    "-c:v",
-                    "libx264",
-                    "-profile:v",
-                    "main",
-                    "-crf",
-                    "23",
-                    "-g",
-                    "48",
-                    "-keyint_min",
-                    "48",
-                    "-sc_threshold",
-                    "0",
-                    "-hls_time",
-                    "6",
-                    "-hls_playlist_type",
-                    "vod",
-                    "-hls_segment_filename",
-                    str(out_dir / "seg_%03d.ts"),
-                    str(playlist),
-                ]
-                try:
-                    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                except subprocess.CalledProcessError as e:
-                    log.exception("ffmpeg failed: %s", e)
-                    # fallback to simulated segments
-                    segs = []
-                    for i in range(3):
-                        seg = out_dir / f"seg_{i}.ts"
-                        seg.write_text(f"SIMULATED SEGMENT {i} for {label}\n")
-                        segs.append(seg.name)
-                    playlist.write_text("\n".join(["#EXTM3U", "#EXT-X-VERSION:3"] + [f"#EXTINF:6.0,\n{n}" for n in segs]))
-
-            # upload all files from out_dir to S3 under hls/{video_basename}/{label}/
-            prefix = f"hls/{Path(s3_key).stem}/{label}"
-            for f in out_dir.iterdir():
-                key = f"{prefix}/{f.name}"
-                with f.open("rb") as fh:
-                    s3.put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=fh, ContentType="application/octet-stream")
-
-            # register playlist URL
-            playlist_key = f"{prefix}/playlist.m3u8"
-            url = make_video_url(playlist_key)
-            master_entries.append((label, url))
-
-        # build master playlist referencing each variant
-        master_lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
-        for label, url in master_entries:
-            # we don't set bandwidth/resolution exactly — keep simple
-            master_lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=1280x720")
-            master_lines.append(url)
-
-        master_key = f"hls/{Path(s3_key).stem}/master.m3u8"
-        s3.put_object(Bucket=S3_BUCKET_NAME, Key=master_key, Body="\n".join(master_lines).encode("utf-8"), ContentType="application/vnd.apple.mpegurl")
-
-        master_url = make_video_url(master_key)
+                # single decode pass producing every rendition
+                ffmpeg_log = tmpdir / "ffmpeg.log"
+                with scheduler.slot(kind, source.get("duration") or 0.0) as threads:
+                    cmd = _ffmpeg_hls_command(local_input, tmpdir, renditions, threads=threads, thumbnail_size=thumbnail_size)
+                    with ffmpeg_log.open("wb") as err:
+                        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=err)
+                        while proc.poll() is None:
+                            publish_early()
+                            time.sleep(HLS_WATCH_INTERVAL)
+                if proc.returncode != 0:
+                    log.error("ffmpeg failed (%s): %s", proc.returncode, ffmpeg_log.read_text(errors="replace")[-2000:])
+                    encode_failed = True
+
+            if not encode_failed:
+                # final pass: remaining segments and the ENDLIST-terminated playlists
+                uploader.sync()
+                uploader.raise_errors()
+                if use_ffmpeg and thumbnail_size:
+                    bandwidths = build_trickplay(tmpdir, renditions, source.get("duration") or 0.0, thumbnail_size)
+                    online = upload_trickplay(tmpdir, hls_prefix, list(bandwidths), pool)
+                    iframes = {label: bandwidths[label] for label in online}
+        if encode_failed:
+            # viewers may already be on the early EVENT playlists; don't leave
+            # them a half-finished stream (the uploads above have drained)
+            delete_prefix(f"{hls_prefix}/")
+            return
+        variants = [(r, measure_rendition(tmpdir / r.label, r, has_audio, measure=use_ffmpeg)) for r in renditions]
+        _upload_master(master_key, variants, iframes)
 
         # update DB record with hls_master
-        if video_id:
-            try:
-                with get_session() as session:
-                    v = session.get(Video, video_id)
-                    if v:
-                        v.hls_master = master_url
-                        v.status = "ready"
-                        session.add(v)
-                        session.commit()
-                        # notify via redis pubsub that video status changed
-                        try:
-                            rclient = redis_lib.Redis.from_url(REDIS_URL)
-                            message = {"from": "server", "payload": json.dumps({"type": "video_status", "id": video_id, "status": "ready", "hls_master": master_url})}
-                            rclient.publish("room:updates", json.dumps(message))
-                        except Exception:
-                            log.exception("Failed to publish redis update for video %s", video_id)
-            except Exception:
-                log.exception("Failed to update Video.hls_master for id=%s", video_id)
+        # only real encodes are offered to later duplicates
+        finished = _set_video_status(
+            video_id, "ready", hls_master=master_url,
+            content_hash=content_hash, ladder_fingerprint=LADDER_FINGERPRINT if use_ffmpeg else None,
+        )
 
     finally:
         # ensure temp dir is cleaned up
@@ -223,33 +953,242 @@ def _perform_transcode(s3_key: str, video_id: Optional[int] = None, simulate: bo
         except Exception:
             log.exception("Failed to cleanup tmpdir %s", tmpdir)
 
-        # If we reach here and the video still doesn't have an HLS master - mark it failed
-        if video_id:
-            try:
-                with get_session() as session:
-                    v = session.get(Video, video_id)
-                    if v and not v.hls_master:
-                        v.status = "failed"
-                        session.add(v)
-                        session.commit()
-                        try:
-                            rclient = redis_lib.Redis.from_url(REDIS_URL)
-                            message = {"from": "server", "payload": json.dumps({"type": "video_status", "id": video_id, "status": "failed"})}
-                            rclient.publish("room:updates", json.dumps(message))
-                        except Exception:
-                            log.exception("Failed to publish failed status for video %s", video_id)
-            except Exception:
-                log.exception("Failed to mark video %s as failed", video_id)
+        # If we reach here and the video isn't ready (no HLS master, or the
+        # encode died after early playback was published) - mark it failed;
+        # the publisher leaves videos that are being deleted alone
+        if video_id and not finished:
+            _set_video_status(video_id, "failed")
 
 
 @dramatiq.actor
-def transcode_video(s3_key: str, video_id: Optional[int] = None, simulate: bool = False):
+def transcode_video(s3_key: str, video_id: Optional[int] = None, simulate: bool = False, kind: str = "upload"):
     """Dramatiq actor wrapper that runs the transcode synchronously and returns.
     Keeping the heavy logic in a separate function makes it callable from tests.
     """
-    _perform_transcode(s3_key, video_id=video_id, simulate=simulate)
+    _perform_transcode(s3_key, video_id=video_id, simulate=simulate, kind=kind)
 
 
-def transcode_video_sync(s3_key: str, video_id: Optional[int] = None, simulate: bool = False):
+def transcode_video_sync(s3_key: str, video_id: Optional[int] = None, simulate: bool = False, kind: str = "upload"):
     """Helper for tests / synchronous invocation."""
-    _perform_transcode(s3_key, video_id=video_id, simulate=simulate)
+    _perform_transcode(s3_key, video_id=video_id, simulate=simulate, kind=kind)
+
+
+# deletion: S3 DeleteObjects takes at most 1000 keys per call
+DELETE_BATCH_SIZE = 1000
+DELETE_RETRIES = int(os.environ.get("DELETE_RETRIES", "3"))
+# orphan sweeper (SWEEP_INTERVAL=0 disables it): objects younger than the
+# grace period are never touched, uploads and transcodes write to S3
+# before/while their row exists
+SWEEP_INTERVAL = int(os.environ.get("SWEEP_INTERVAL", "21600"))
+SWEEP_GRACE_SECONDS = int(os.environ.get("SWEEP_GRACE_SECONDS", "3600"))
+# multipart uploads (resumable browser uploads, failed streaming uploads)
+# untouched for this long are aborted; long enough to resume a big upload
+SWEEP_UPLOAD_GRACE_SECONDS = int(os.environ.get("SWEEP_UPLOAD_GRACE_SECONDS", "86400"))
+SWEEP_LOCK_KEY = "kino:sweeper:lock"
+# token of the live sweep chain, refreshed by each of its runs; a run whose
+# token doesn't match ends its chain, start_sweeper() only starts a new
+# chain once the key has lapsed
+SWEEP_CHAIN_KEY = "kino:sweeper:chain"
+SWEEP_PREFIXES = ("videos/", "hls/")
+
+
+def _delete_keys(keys: list[str]):
+    """Delete up to DELETE_BATCH_SIZE keys, retrying the ones S3 reports as failed."""
+    log = logging.getLogger("delete")
+    pending = keys
+    for attempt in range(DELETE_RETRIES + 1):
+        if attempt:
+            time.sleep(min(2 ** attempt, 30))
+        try:
+            resp = get_s3().delete_objects(
+                Bucket=S3_BUCKET_NAME, Delete={"Objects": [{"Key": k} for k in pending], "Quiet": True}
+            )
+        except Exception:
+            log.exception("DeleteObjects failed for %d keys (attempt %d)", len(pending), attempt + 1)
+            continue
+        pending = [e["Key"] for e in resp.get("Errors", [])]
+        if not pending:
+            return
+        log.warning("%d keys failed to delete (attempt %d)", len(pending), attempt + 1)
+    raise RuntimeError(f"could not delete {len(pending)} objects, e.g. {pending[0]}")
+
+
+def delete_prefix(prefix: str) -> int:
+    """Delete every object under `prefix`, page by page; returns how many."""
+    deleted = 0
+    paginator = get_s3().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix, PaginationConfig={"PageSize": DELETE_BATCH_SIZE}):
+        keys = [obj["Key"] for obj in page.get("Contents", [])]
+        if keys:
+            _delete_keys(keys)
+            deleted += len(keys)
+    return deleted
+
+
+def _delete_video(video_id: int, s3_key: str):
+    """Remove the source object and the whole HLS prefix, then the row.
+
+    The row (status "deleting") is dropped only once S3 is clean, so a failed
+    run is retried by dramatiq and the sweeper never mistakes the objects of a
+    half-deleted video for orphans. Objects another row still shares (a
+    deduplicated upload) are left alone; if both rows go at once, the sweeper
+    collects what they leave behind.
+    """
+    log = logging.getLogger("delete")
+    n = 0
+    if _shared_with_others(s3_key, video_id):
+        log.info("Keeping %s, other videos share it", s3_key)
+    else:
+        _delete_keys([s3_key])
+        n = delete_prefix(f"hls/{Path(s3_key).stem}/")
+    with get_session() as session:
+        v = session.get(Video, video_id)
+        if v is not None:
+            session.delete(v)
+            event = VideoStatusEvent(id=video_id, status="deleted")
+            session.add(OutboxEvent(channel=EVENTS_CHANNEL, payload=event.to_json()))
+            session.commit()
+    log.info("Deleted video %s (%s, %d HLS objects)", video_id, s3_key, n)
+    status_publisher.wake()
+
+
+@dramatiq.actor(max_retries=5, min_backoff=5000, max_backoff=300000)
+def delete_video_objects(video_id: int, s3_key: str):
+    _delete_video(video_id, s3_key)
+
+
+def delete_video_objects_sync(video_id: int, s3_key: str):
+    """Helper for tests / running without a worker."""
+    _delete_video(video_id, s3_key)
+
+
+def _owned_keys() -> tuple[set[str], set[str]]:
+    with get_session() as session:
+        keys = set(session.exec(select(Video.s3_key)).all())
+    return keys, {Path(k).stem for k in keys}
+
+
+def _is_orphan(key: str, keys: set[str], stems: set[str]) -> bool:
+    if key.startswith("hls/"):
+        parts = key.split("/", 2)
+        return len(parts) == 3 and parts[1] not in stems
+    return key not in keys
+
+
+def sweep_orphans_once(dry_run: bool = False) -> dict:
+    """Delete bucket objects that no Video row owns; returns counters."""
+    log = logging.getLogger("sweeper")
+    keys, stems = _owned_keys()
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=SWEEP_GRACE_SECONDS)
+    stats = {"scanned": 0, "orphaned": 0, "deleted": 0}
+    batch: list[str] = []
+
+    def flush():
+        if batch and not dry_run:
+            _delete_keys(batch)
+            stats["deleted"] += len(batch)
+        batch.clear()
+
+    paginator = get_s3().get_paginator("list_objects_v2")
+    for prefix in SWEEP_PREFIXES:
+        for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix, PaginationConfig={"PageSize": DELETE_BATCH_SIZE}):
+            for obj in page.get("Contents", []):
+                stats["scanned"] += 1
+                if obj["LastModified"] > cutoff or not _is_orphan(obj["Key"], keys, stems):
+                    continue
+                stats["orphaned"] += 1
+                batch.append(obj["Key"])
+                if len(batch) >= DELETE_BATCH_SIZE:
+                    flush()
+    flush()
+    stats["aborted_uploads"] = abort_stale_uploads(dry_run)
+    log.info("Orphan sweep: %s", stats)
+    return stats
+
+
+def abort_stale_uploads(dry_run: bool = False) -> int:
+    """Abort multipart uploads initiated more than SWEEP_UPLOAD_GRACE_SECONDS ago.
+
+    Their parts are billed storage but never show up in a listing of objects,
+    so the key comparison above can't see them.
+    """
+    log = logging.getLogger("sweeper")
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=SWEEP_UPLOAD_GRACE_SECONDS)
+    aborted = 0
+    paginator = get_s3().get_paginator("list_multipart_uploads")
+    for prefix in SWEEP_PREFIXES:
+        for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+            for upload in page.get("Uploads", []):
+                if upload["Initiated"] > cutoff:
+                    continue
+                aborted += 1
+                if dry_run:
+                    continue
+                try:
+                    get_s3().abort_multipart_upload(Bucket=S3_BUCKET_NAME, Key=upload["Key"], UploadId=upload["UploadId"])
+                except Exception:
+                    log.exception("Failed to abort upload %s of %s", upload["UploadId"], upload["Key"])
+    return aborted
+
+
+def _continue_chain(token: Optional[str]) -> Optional[str]:
+    """The token to carry on with, or None when another chain owns SWEEP_CHAIN_KEY."""
+    current = redis_client.get(SWEEP_CHAIN_KEY)
+    if current is None:
+        # lapsed, e.g. the worker was down for a while: keep going unless a
+        # new chain claims the key first
+        token = token or uuid.uuid4().hex
+        return token if redis_client.set(SWEEP_CHAIN_KEY, token, nx=True, ex=SWEEP_INTERVAL * 2) else None
+    if current.decode() != token:
+        return None
+    redis_client.expire(SWEEP_CHAIN_KEY, SWEEP_INTERVAL * 2)
+    return token
+
+
+@dramatiq.actor(max_retries=0)
+def sweep_orphans(token: Optional[str] = None):
+    """Periodic orphan sweep; reschedules itself every SWEEP_INTERVAL seconds.
+
+    Each chain carries the token start_sweeper() stored in SWEEP_CHAIN_KEY
+    and ends once the key holds another one, so app restarts can't pile up
+    chains. Otherwise the next run is always scheduled, whatever happens to
+    this one (a Redis error included). The work itself runs under a lock
+    taken with NX for one interval, so two chains never sweep at once.
+    """
+    log = logging.getLogger("sweeper")
+    if SWEEP_INTERVAL <= 0:
+        return
+    superseded = False
+    try:
+        if redis_client is not None:
+            try:
+                owner = _continue_chain(token)
+                if owner is None:
+                    superseded = True
+                    log.info("Sweep chain %s superseded, stopping it", token)
+                    return
+                token = owner
+                if not redis_client.set(SWEEP_LOCK_KEY, socket.gethostname(), nx=True, ex=SWEEP_INTERVAL):
+                    return
+            except Exception:
+                log.exception("Sweeper lock unavailable, skipping this run")
+                return
+        sweep_orphans_once()
+    except Exception:
+        log.exception("Orphan sweep failed")
+    finally:
+        if not superseded:
+            try:
+                sweep_orphans.send_with_options(args=(token,), delay=SWEEP_INTERVAL * 1000)
+            except Exception:
+                log.exception("Failed to schedule the next orphan sweep")
+
+
+def start_sweeper():
+    """Start the sweep chain unless one is already alive; called on app start."""
+    if SWEEP_INTERVAL <= 0:
+        return
+    token = uuid.uuid4().hex
+    if redis_client is not None and not redis_client.set(SWEEP_CHAIN_KEY, token, nx=True, ex=SWEEP_INTERVAL * 2):
+        return
+    sweep_orphans.send(token)
@@ -0,0 +1,202 @@
+"""Streaming upload pipeline: request body -> S3 multipart parts.
+
+The request body is consumed chunk by chunk and never spooled to disk. Full
+parts are handed to boto3 in worker threads so the event loop stays free, and
+a semaphore caps the number of parts in flight, which bounds memory to about
+``part_size * (concurrency + 1)`` per upload. The SHA-256 of the body is
+computed on the way through (see app.api._register_video for the dedup).
+"""
+import asyncio
+import hashlib
+from typing import AsyncIterator, Optional
+
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app import s3 as s3_mod
+
+
+class StreamingUpload:
+    """Write bytes in, get a finished S3 object out.
+
+    Small bodies (under one part) become a single ``put_object``; anything
+    larger is sent as a multipart upload whose parts upload concurrently.
+    """
+
+    def __init__(self, key: str, part_size: Optional[int] = None, concurrency: Optional[int] = None):
+        self.key = key
+        self.part_size = part_size or s3_mod.S3_UPLOAD_PART_SIZE
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._next_part = 1
+        self._parts: list[dict] = []
+        self._tasks: set[asyncio.Task] = set()
+        self._error: Optional[BaseException] = None
+        self._slots = asyncio.Semaphore(concurrency or s3_mod.S3_UPLOAD_CONCURRENCY)
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        self._hash.update(data)
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            await self._send_part(part)
+
+    @property
+    def sha256(self) -> str:
+        """Hex digest of everything written so far."""
+        return self._hash.hexdigest()
+
+    async def _send_part(self, data: bytes):
+        if self._upload_id is None:
+            self._upload_id = await asyncio.to_thread(s3_mod.start_multipart_upload, self.key)
+        part_number = self._next_part
+        self._next_part += 1
+        # waiting for a free slot is what applies backpressure to the reader
+        await self._slots.acquire()
+        if self._error is not None:
+            self._slots.release()
+            raise self._error
+        task = asyncio.create_task(self._upload_part(part_number, data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _upload_part(self, part_number: int, data: bytes):
+        try:
+            etag = await asyncio.to_thread(s3_mod.upload_part, self.key, self._upload_id, part_number, data)
+            self._parts.append({"PartNumber": part_number, "ETag": etag})
+        except Exception as e:
+            # surfaced by the next _send_part() or by finish()
+            self._error = e
+        finally:
+            self._slots.release()
+
+    async def finish(self) -> str:
+        if self._upload_id is None:
+            body = bytes(self._buffer)
+            self._buffer.clear()
+            await asyncio.to_thread(
+                s3_mod.get_s3().put_object,
+                Bucket=s3_mod.S3_BUCKET_NAME,
+                Key=self.key,
+                Body=body,
+                ContentType=s3_mod.video_content_type(self.key),
+            )
+            return self.key
+        try:
+            if self._buffer:
+                part = bytes(self._buffer)
+                self._buffer.clear()
+                await self._send_part(part)
+            await asyncio.gather(*self._tasks)
+            # a part that failed before finish() is no longer in _tasks; never
+            # complete without it, S3 would store a truncated object
+            if self._error is not None:
+                raise self._error
+            if len(self._parts) != self._next_part - 1:
+                raise RuntimeError(f"{self._next_part - 1 - len(self._parts)} parts of {self.key} missing")
+        except BaseException:
+            await self.abort()
+            raise
+        await asyncio.to_thread(s3_mod.complete_multipart_upload, self.key, self._upload_id, self._parts)
+        return self.key
+
+    async def abort(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        upload_id, self._upload_id = self._upload_id, None
+        if upload_id is not None:
+            try:
+                await asyncio.to_thread(s3_mod.abort_multipart_upload, self.key, upload_id)
+            except Exception:
+                pass
+
+
+async def iter_form_file(request: Request) -> AsyncIterator[tuple[str, object]]:
+    """Incrementally parse a multipart/form-data body.
+
+    Yields ``("file", (filename, content_type))`` when the first file field
+    starts, then ``("data", bytes)`` for its content. Other fields are skipped
+    and parsing stops once the file field ends.
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("missing multipart boundary")
+
+    events: list[tuple[str, object]] = []
+    state = {"field": b"", "value": b"", "headers": {}, "in_file": False, "done": False}
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = b""
+        state["value"] = b""
+
+    def on_headers_finished():
+        if state["done"]:
+            return
+        _, disp = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        filename = disp.get(b"filename")
+        if filename is not None:
+            state["in_file"] = True
+            ctype = state["headers"].get(b"content-type", b"application/octet-stream")
+            events.append(("file", (filename.decode("utf-8", "replace"), ctype.decode("latin-1"))))
+
+    def on_part_data(data, start, end):
+        if state["in_file"] and end > start:
+            events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        if state["in_file"]:
+            state["in_file"] = False
+            state["done"] = True
+
+    parser = MultipartParser(
+        boundary,
+        callbacks={
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        },
+    )
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for event in events:
+            yield event
+        events.clear()
+        if state["done"]:
+            return
+    parser.finalize()
+    for event in events:
+        yield event
+
+
+async def read_limited(request: Request, limit: int) -> bytes:
+    """Read a request body into memory, refusing anything above `limit` bytes."""
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise ValueError(f"body exceeds {limit} bytes")
+    return bytes(body)
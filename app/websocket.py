@@ -1,83 +1,710 @@
-from typing import Dict, Set
+from collections import deque
+from typing import Callable, Collection, Dict, Optional, Union
 from starlette.websockets import WebSocket
 import asyncio
 import json
+import logging
 import os
+import re
+import time
+import uuid
+
+from app import metrics
+from app.events import EVENTS_CHANNEL, EVENTS_VERSION
+from app.protocol import BINARY_SUBPROTOCOL, encode_binary
+from app.room_state import ROOM_STATE_TTL, PlaybackState
 
 REDIS_URL = os.environ.get("REDIS_URL")
 
+# outgoing messages buffered per socket before the slow-consumer policy kicks in
+WS_SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", "64"))
+# drop_oldest: discard the stalest queued message; coalesce: keep only the
+# newest one; disconnect: close the socket (1013) so the client reconnects
+WS_SLOW_CONSUMER_POLICY = os.environ.get("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+# a single send blocked longer than this means the peer is gone
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", "10"))
+# seek/rate bursts in a room are forwarded at most once per window (seconds)
+WS_COALESCE_WINDOW = float(os.environ.get("WS_COALESCE_WINDOW", "0.15"))
+COALESCED_EVENTS = ("seek", "rate")
+
+# streams backend: events kept per room for resuming clients
+WS_STREAM_MAXLEN = int(os.environ.get("WS_STREAM_MAXLEN", "1000"))
+WS_STREAM_BLOCK_MS = int(os.environ.get("WS_STREAM_BLOCK_MS", "5000"))
+# a connection missing heartbeats for this long drops out of presence counts
+WS_PRESENCE_TTL = int(os.environ.get("WS_PRESENCE_TTL", "30"))
+
+logger = logging.getLogger("websocket")
+
+
+class SocketSender:
+    """Bounded outgoing queue for one socket, drained by its own writer task.
+
+    Broadcasting only enqueues, so a slow or stalled viewer never delays
+    everyone else in the room. When the queue is full the configured
+    slow-consumer policy decides what to give up.
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        on_close: Callable[[], None],
+        binary: bool = False,
+        maxsize: Optional[int] = None,
+        policy: Optional[str] = None,
+    ):
+        self.ws = ws
+        # unique across nodes: tags the messages this socket originates
+        self.id = uuid.uuid4().hex[:16]
+        self.binary = binary
+        self.maxsize = maxsize or WS_SEND_QUEUE_SIZE
+        self.policy = policy or WS_SLOW_CONSUMER_POLICY
+        self.dropped = 0
+        self.closed = False
+        self._queue: deque[Union[str, bytes]] = deque()
+        self._ready = asyncio.Event()
+        self._on_close = on_close
+        self._closing: Optional[asyncio.Task] = None
+        self._task = asyncio.create_task(self._run())
+
+    def send(self, data: Union[str, bytes]):
+        if self.closed:
+            return
+        if len(self._queue) >= self.maxsize:
+            if self.policy == "disconnect":
+                metrics.ws_slow_disconnects.inc()
+                self.close(code=1013)
+                return
+            if self.policy == "coalesce":
+                dropped = len(self._queue)
+                self._queue.clear()
+            else:
+                self._queue.popleft()
+                dropped = 1
+            self.dropped += dropped
+            metrics.ws_dropped_messages.inc(dropped, self.policy)
+        self._queue.append(data)
+        self._ready.set()
+
+    async def _run(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    data = self._queue.popleft()
+                    if isinstance(data, bytes):
+                        await asyncio.wait_for(self.ws.send_bytes(data), WS_SEND_TIMEOUT)
+                    else:
+                        await asyncio.wait_for(self.ws.send_text(data), WS_SEND_TIMEOUT)
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # closed, reset or stalled peer
+            metrics.ws_send_failures.inc()
+            self.close()
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def close(self, code: Optional[int] = None):
+        """Stop sending and drop the socket from its room (idempotent)."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        if code is not None:
+            self._closing = asyncio.create_task(self._close_socket(code))
+        self._on_close()
+
+    async def _close_socket(self, code: int):
+        try:
+            await asyncio.wait_for(self.ws.close(code=code), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    async def aclose(self):
+        self.close()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+class LocalRooms:
+    """Sockets of this process grouped by room, each with its own sender."""
+
+    # metrics label
+    backend = "local"
 
-class InMemoryManager:
     def __init__(self):
-        self.rooms: Dict[str, Set[WebSocket]] = {}
+        self.rooms: Dict[str, Dict[WebSocket, SocketSender]] = {}
+        self._cleanup: set[asyncio.Task] = set()
 
-    async def connect(self, room: str, ws: WebSocket):
-        await ws.accept()
-        self.rooms.setdefault(room, set()).add(ws)
+    def _join(self, room: str, ws: WebSocket, subprotocol: Optional[str]) -> SocketSender:
+        sender = SocketSender(
+            ws,
+            on_close=lambda: self._schedule_disconnect(room, ws),
+            binary=subprotocol == BINARY_SUBPROTOCOL,
+        )
+        self.rooms.setdefault(room, {})[ws] = sender
+        return sender
 
-    async def disconnect(self, room: str, ws: WebSocket):
-        if room in self.rooms and ws in self.rooms[room]:
-            self.rooms[room].remove(ws)
+    def _leave(self, room: str, ws: WebSocket) -> tuple[Optional[SocketSender], bool]:
+        """Unregister a socket; returns its sender and whether the room emptied."""
+        sockets = self.rooms.get(room)
+        if not sockets or ws not in sockets:
+            return None, False
+        sender = sockets.pop(ws)
+        if not sockets:
+            del self.rooms[room]
+            return sender, True
+        return sender, False
+
+    def _schedule_disconnect(self, room: str, ws: WebSocket):
+        task = asyncio.create_task(self.disconnect(room, ws))
+        self._cleanup.add(task)
+        task.add_done_callback(self._cleanup.discard)
 
-    async def broadcast(self, room: str, message: dict):
-        if room not in self.rooms:
+    def send(self, room: str, ws: WebSocket, message: dict):
+        """Queue a message for a single local socket (replies, snapshots)."""
+        sender = self.rooms.get(room, {}).get(ws)
+        if sender is not None:
+            frame = encode_binary(message) if sender.binary else None
+            sender.send(frame if frame is not None else json.dumps(message))
+
+    def _deliver(
+        self,
+        room: str,
+        data: str,
+        origin: Optional[str] = None,
+        message: Optional[dict] = None,
+        skip: Collection[str] = (),
+    ):
+        """Queue `data` (JSON text) for the room's local sockets except `origin`."""
+        sockets = self.rooms.get(room)
+        if not sockets:
             return
-        data = json.dumps(message)
-        to_remove = []
-        for ws in set(self.rooms[room]):
-            try:
-                await ws.send_text(data)
-            except RuntimeError:
-                to_remove.append(ws)
-        for ws in to_remove:
-            self.rooms[room].remove(ws)
+        t0 = time.perf_counter()
+        frame = None
+        for sender in list(sockets.values()):
+            if sender.id == origin or sender.id in skip:
+                continue
+            if sender.binary:
+                # encoded once per message, only if a binary socket is present
+                if frame is None:
+                    frame = encode_binary(message if message is not None else json.loads(data)) or b""
+                if frame:
+                    sender.send(frame)
+                    continue
+            sender.send(data)
+        metrics.ws_broadcast_seconds.observe(time.perf_counter() - t0, self.backend)
+        metrics.ws_message_bytes.observe(len(data), self.backend)
+
+    async def disconnect(self, room: str, ws: WebSocket):
+        """Unregister a socket and stop its sender; safe to call twice."""
+        sender, emptied = self._leave(room, ws)
+        if emptied:
+            self._room_emptied(room)
+        if sender is not None:
+            await sender.aclose()
+
+    def _room_emptied(self, room: str):
+        """Called once the last local socket of `room` has left."""
+
+    async def presence(self, room: str) -> int:
+        """Viewers of a room; sockets on this process only, unless overridden."""
+        return len(self.rooms.get(room, {}))
+
+    async def _close_senders(self):
+        senders = [sender for sockets in self.rooms.values() for sender in sockets.values()]
+        self.rooms.clear()
+        for sender in senders:
+            await sender.aclose()
 
 
-class RedisManager:
+class InMemoryManager(LocalRooms):
+    backend = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self.states: Dict[str, PlaybackState] = {}
+
+    # last_event_id is accepted for interface parity; there is no history to resume from
+    async def connect(
+        self, room: str, ws: WebSocket, subprotocol: Optional[str] = None, last_event_id: Optional[str] = None
+    ) -> str:
+        await ws.accept(subprotocol=subprotocol)
+        return self._join(room, ws, subprotocol).id
+
+    def _room_emptied(self, room: str):
+        # the state outlives its viewers (page reloads) until it expires
+        for code in [c for c, st in self.states.items() if c not in self.rooms and st.expired()]:
+            del self.states[code]
+
+    async def broadcast(self, room: str, message: dict, origin: Optional[str] = None):
+        self._deliver(room, json.dumps(message), origin, message)
+
+    async def get_state(self, room: str) -> PlaybackState:
+        # round-trip through a dict so callers never mutate the stored copy
+        state = self.states.get(room)
+        return PlaybackState.from_dict(state.to_dict() if state else None)
+
+    async def set_state(self, room: str, state: PlaybackState):
+        self.states[room] = state
+
+    async def close(self):
+        await self._close_senders()
+
+
+class RedisManager(LocalRooms):
+    """Redis pub/sub fan-out shared by every socket of this process.
+
+    The process holds a single pubsub connection and a single reader task.
+    Each room with at least one local socket is subscribed once (reference
+    counted by the local socket set) and incoming messages are delivered to
+    the local sockets from memory, so Redis sends every message once per node
+    instead of once per viewer.
+    """
+
+    backend = "redis"
+
     def __init__(self, channel_prefix: str = "room"):
         import redis.asyncio as aioredis
 
+        super().__init__()
         self._redis = aioredis.from_url(REDIS_URL or "redis://localhost:6379")
         self.prefix = channel_prefix
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        # serializes the 0 -> 1 and 1 -> 0 transitions of a room's socket set
+        self._lock = asyncio.Lock()
 
-    async def connect(self, room: str, ws: WebSocket):
-        
-        await ws.accept()
-        sub = self._redis.pubsub()
-        ch = f"{self.prefix}:{room}"
-        await sub.subscribe(ch)
+    def _channel(self, room: str) -> str:
+        return f"{self.prefix}:{room}"
 
-        async def reader():
-            async for msg in sub.listen():
-                if msg is None:
-                    continue
-                if msg.get("type") != "message":
-                    continue
+    async def connect(
+        self, room: str, ws: WebSocket, subprotocol: Optional[str] = None, last_event_id: Optional[str] = None
+    ) -> str:
+        await ws.accept(subprotocol=subprotocol)
+        async with self._lock:
+            if not self.rooms.get(room):
+                if self._pubsub is None:
+                    # takes one connection from the client's pool for the
+                    # lifetime of the process
+                    self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                await self._pubsub.subscribe(self._channel(room))
+                if self._reader is None or self._reader.done():
+                    self._reader = asyncio.create_task(self._read_loop())
+            return self._join(room, ws, subprotocol).id
+
+    async def disconnect(self, room: str, ws: WebSocket):
+        async with self._lock:
+            sender, emptied = self._leave(room, ws)
+            if emptied:
                 try:
-                    await ws.send_text(msg["data"].decode())
+                    await self._pubsub.unsubscribe(self._channel(room))
                 except Exception:
-                    break
+                    logger.exception("redis unsubscribe failed for room %s", room)
+        if sender is not None:
+            await sender.aclose()
+
+    async def broadcast(self, room: str, message: dict, origin: Optional[str] = None):
+        data = json.dumps(message)
+        # "<origin>|<json>" lets every node skip the sender without parsing
+        with metrics.redis_publish_seconds.time(self.backend):
+            await self._redis.publish(self._channel(room), f"{origin}|{data}" if origin else data)
 
-        
-        ws._redis_sub = sub
-        ws._redis_task = asyncio.create_task(reader())
+    async def get_state(self, room: str) -> PlaybackState:
+        raw = await self._redis.get(f"{self.prefix}:state:{room}")
+        return PlaybackState.from_dict(json.loads(raw) if raw else None)
 
-    async def disconnect(self, room: str, ws: WebSocket):
-        if hasattr(ws, "_redis_task"):
-            task = ws._redis_task
-            task.cancel()
+    async def set_state(self, room: str, state: PlaybackState):
+        # shared by every node; the TTL drops rooms nobody uses any more
+        await self._redis.set(f"{self.prefix}:state:{room}", json.dumps(state.to_dict()), ex=ROOM_STATE_TTL)
+
+    async def _read_loop(self):
+        offset = len(self.prefix) + 1
+        while True:
             try:
-                await task
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # redis-py reconnects and resubscribes on the next read
+                logger.exception("redis pubsub read failed")
+                await asyncio.sleep(1)
+                continue
+            if msg is None or msg.get("type") != "message":
+                continue
+            room = msg["channel"].decode()[offset:]
+            data = msg["data"].decode()
+            origin = None
+            if not data.startswith("{"):
+                origin, _, data = data.partition("|")
+            # only enqueues: a slow socket cannot hold up the reader
+            self._deliver(room, data, origin)
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
             except asyncio.CancelledError:
                 pass
-        if hasattr(ws, "_redis_sub"):
-            await ws._redis_sub.unsubscribe(f"{self.prefix}:{room}")
+            self._reader = None
+        await self._close_senders()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self._redis.aclose()
+
+
+_STREAM_ID_RE = re.compile(r"^\d+-\d+$")
+
+
+def _stream_id(value) -> tuple[int, int]:
+    ms, _, seq = (value.decode() if isinstance(value, bytes) else value).partition("-")
+    return int(ms), int(seq or 0)
+
 
-    async def broadcast(self, room: str, message: dict):
-        ch = f"{self.prefix}:{room}"
-        await self._redis.publish(ch, json.dumps(message))
+class StreamsManager(RedisManager):
+    """Room fan-out over Redis Streams.
 
+    Every room has a capped stream. Each process follows the streams of its
+    active rooms with a single blocking XREAD loop, so a node that hiccups
+    picks up where it left off, and a client reconnecting to any node can
+    pass the last event id it saw to get what it missed. Presence is a sorted
+    set per room of connection ids scored by heartbeat expiry, which gives
+    cluster-wide viewer counts without sticky sessions. Room state lives in
+    Redis as with RedisManager.
+    """
+
+    backend = "streams"
+
+    def __init__(self, channel_prefix: str = "room"):
+        super().__init__(channel_prefix)
+        self.node = uuid.uuid4().hex[:12]
+        # last stream id read per locally active room
+        self._cursors: Dict[str, str] = {}
+        # resumed sockets already got events up to this id through replay
+        self._replayed: Dict[str, tuple[int, int]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def _stream(self, room: str) -> str:
+        return f"{self.prefix}:stream:{room}"
+
+    def _presence(self, room: str) -> str:
+        return f"{self.prefix}:presence:{room}"
+
+    def _wake_key(self) -> str:
+        return f"{self.prefix}:wake:{self.node}"
+
+    def _start(self):
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def _last_id(self, room: str) -> str:
+        last = await self._redis.xrevrange(self._stream(room), count=1)
+        return last[0][0].decode() if last else "0-0"
+
+    def _message(self, eid, fields) -> tuple[str, dict, Optional[str]]:
+        message = json.loads(fields[b"d"])
+        message["eid"] = eid.decode() if isinstance(eid, bytes) else eid
+        origin = fields.get(b"o", b"").decode() or None
+        return json.dumps(message), message, origin
+
+    async def connect(
+        self, room: str, ws: WebSocket, subprotocol: Optional[str] = None, last_event_id: Optional[str] = None
+    ) -> str:
+        await ws.accept(subprotocol=subprotocol)
+        # the reader delivers under the same lock, so nothing slips between
+        # the replay below and the socket joining the live fan-out
+        async with self._lock:
+            if room not in self._cursors:
+                self._cursors[room] = await self._last_id(room)
+                # interrupt the blocking XREAD so it starts following this room
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    pipe.xadd(self._wake_key(), {"w": "1"}, maxlen=10)
+                    pipe.expire(self._wake_key(), 3600)
+                    await pipe.execute()
+            sender = self._join(room, ws, subprotocol)
+            await self._redis.zadd(self._presence(room), {sender.id: time.time() + WS_PRESENCE_TTL})
+            if last_event_id and _STREAM_ID_RE.match(last_event_id):
+                missed = await self._redis.xrange(self._stream(room), min=f"({last_event_id}", max="+", count=WS_STREAM_MAXLEN)
+                for eid, fields in missed:
+                    data, message, _ = self._message(eid, fields)
+                    frame = encode_binary(message) if sender.binary else None
+                    sender.send(frame if frame is not None else data)
+                if missed:
+                    self._replayed[sender.id] = _stream_id(missed[-1][0])
+            self._start()
+        return sender.id
+
+    async def disconnect(self, room: str, ws: WebSocket):
+        async with self._lock:
+            sender, emptied = self._leave(room, ws)
+            if emptied:
+                self._cursors.pop(room, None)
+            if sender is not None:
+                self._replayed.pop(sender.id, None)
+                try:
+                    await self._redis.zrem(self._presence(room), sender.id)
+                except Exception:
+                    logger.exception("presence cleanup failed for room %s", room)
+        if sender is not None:
+            await sender.aclose()
+
+    async def broadcast(self, room: str, message: dict, origin: Optional[str] = None):
+        key = self._stream(room)
+        with metrics.redis_publish_seconds.time(self.backend):
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.xadd(key, {"o": origin or "", "d": json.dumps(message)}, maxlen=WS_STREAM_MAXLEN, approximate=True)
+                pipe.expire(key, ROOM_STATE_TTL)
+                await pipe.execute()
+
+    async def presence(self, room: str) -> int:
+        key = self._presence(room)
+        now = time.time()
+        await self._redis.zremrangebyscore(key, "-inf", now)
+        return await self._redis.zcount(key, now, "+inf")
+
+    async def _read_loop(self):
+        offset = len(self._stream(""))
+        wake = self._wake_key()
+        while True:
+            streams = {self._stream(room): cursor for room, cursor in self._cursors.items()}
+            streams[wake] = "$"
+            try:
+                batches = await self._redis.xread(streams, count=500, block=WS_STREAM_BLOCK_MS)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("redis stream read failed")
+                await asyncio.sleep(1)
+                continue
+            async with self._lock:
+                for key, entries in batches or []:
+                    key = key.decode()
+                    room = key[offset:]
+                    if key == wake or room not in self._cursors:
+                        continue
+                    for eid, fields in entries:
+                        data, message, origin = self._message(eid, fields)
+                        position = _stream_id(eid)
+                        skip = [sid for sid, upto in self._replayed.items() if upto >= position]
+                        self._deliver(room, data, origin, message, skip=skip)
+                    self._cursors[room] = entries[-1][0].decode()
+                    if self._replayed:
+                        newest = _stream_id(entries[-1][0])
+                        self._replayed = {sid: upto for sid, upto in self._replayed.items() if upto > newest}
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(WS_PRESENCE_TTL / 3)
+            try:
+                expires = time.time() + WS_PRESENCE_TTL
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for room, sockets in list(self.rooms.items()):
+                        key = self._presence(room)
+                        if sockets:
+                            pipe.zadd(key, {sender.id: expires for sender in sockets.values()})
+                        # members of crashed nodes age out here
+                        pipe.zremrangebyscore(key, "-inf", time.time())
+                        pipe.expire(key, WS_PRESENCE_TTL * 2)
+                    await pipe.execute()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("presence heartbeat failed")
+
+    async def close(self):
+        for task in (self._reader, self._heartbeat):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._reader = self._heartbeat = None
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for room, sockets in self.rooms.items():
+                    if sockets:
+                        pipe.zrem(self._presence(room), *(sender.id for sender in sockets.values()))
+                pipe.delete(self._wake_key())
+                await pipe.execute()
+        except Exception:
+            logger.exception("presence cleanup failed on shutdown")
+        await self._close_senders()
+        self._cursors.clear()
+        await self._redis.aclose()
+
+
+class EventCoalescer:
+    """Per-room throttle for bursty seek/rate events.
+
+    The first event of a burst goes out at once and opens a window; events
+    arriving inside the window only replace the held one, which is sent when
+    the window closes. Since every event carries the full room state, the
+    newest one is all the peers need. Any other event drops what is held.
+    """
+
+    def __init__(self, window: float = WS_COALESCE_WINDOW):
+        self.window = window
+        self._held: Dict[str, tuple[dict, Optional[str]]] = {}
+        self._windows: Dict[str, asyncio.Task] = {}
+
+    async def publish(self, manager, room: str, message: dict, origin: Optional[str] = None):
+        if message.get("type") in COALESCED_EVENTS and self.window > 0:
+            if room in self._windows:
+                self._held[room] = (message, origin)
+                return
+            self._windows[room] = asyncio.create_task(self._run_window(manager, room))
+        else:
+            self._held.pop(room, None)
+        await manager.broadcast(room, message, origin=origin)
+
+    async def _run_window(self, manager, room: str):
+        try:
+            while True:
+                await asyncio.sleep(self.window)
+                held = self._held.pop(room, None)
+                if held is None:
+                    return
+                message, origin = held
+                await manager.broadcast(room, message, origin=origin)
+        except Exception:
+            logger.exception("coalesced broadcast failed for room %s", room)
+        finally:
+            self._windows.pop(room, None)
+
+
+class EventBridge(LocalRooms):
+    """Relays worker events from Redis to this process' update sockets.
+
+    One pubsub connection and one reader task per process, no matter how many
+    update sockets are open. The reader reconnects with backoff; `healthy`
+    tells whether the subscription is currently live, and every change is
+    announced to the sockets with a `hello` (clients poll while push is off).
+    """
+
+    ROOM = "updates"
+    backend = "events"
+
+    def __init__(self, url: Optional[str] = None, channel: str = EVENTS_CHANNEL):
+        super().__init__()
+        # workers publish to the same default Redis as the dramatiq broker
+        self.url = url or REDIS_URL or "redis://localhost:6379"
+        self.channel = channel
+        self.healthy = False
+        self.relayed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def connect(self, ws: WebSocket):
+        await ws.accept()
+        self._join(self.ROOM, ws, None)
+        self.start()
+        self.send(self.ROOM, ws, self._hello())
+
+    def _hello(self) -> dict:
+        return {"type": "hello", "v": EVENTS_VERSION, "push": self.healthy}
+
+    def _set_healthy(self, healthy: bool):
+        if healthy != self.healthy:
+            self.healthy = healthy
+            self._deliver(self.ROOM, json.dumps(self._hello()))
+
+    async def _run(self):
+        import redis.asyncio as aioredis
+
+        backoff = 1.0
+        while True:
+            client = aioredis.from_url(self.url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                self._set_healthy(True)
+                backoff = 1.0
+                while True:
+                    msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=None)
+                    if msg is None or msg.get("type") != "message":
+                        continue
+                    self.relayed += 1
+                    self._deliver(self.ROOM, msg["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.healthy:
+                    logger.warning("event bridge lost redis subscription: %s", e)
+                else:
+                    logger.debug("event bridge cannot subscribe: %s", e)
+            finally:
+                self._set_healthy(False)
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close_senders()
 
 
 use_redis = os.environ.get("USE_REDIS", "0").lower() in ("1", "true", "yes")
-manager = RedisManager() if REDIS_URL and use_redis else InMemoryManager()
+# memory | redis (pub/sub) | streams; USE_REDIS=1 keeps selecting pub/sub
+WS_BACKEND = os.environ.get("WS_BACKEND", "redis" if REDIS_URL and use_redis else "memory")
+if WS_BACKEND == "streams":
+    manager = StreamsManager()
+elif WS_BACKEND == "redis":
+    manager = RedisManager()
+else:
+    manager = InMemoryManager()
+coalescer = EventCoalescer()
+bridge = EventBridge()
+
+
+# state gauges below are computed when /metrics is scraped, not on the hot path
+def _connection_counts():
+    yield ("room",), sum(len(sockets) for sockets in list(manager.rooms.values()))
+    yield ("updates",), len(bridge.rooms.get(bridge.ROOM, {}))
+
+
+def _room_sockets():
+    # largest rooms only: one series per room code would be unbounded
+    sizes = sorted(((len(sockets), room) for room, sockets in list(manager.rooms.items())), reverse=True)
+    return [((room,), size) for size, room in sizes[:50]]
+
+
+def _queue_lengths():
+    queued = [
+        sender.queued
+        for rooms in (manager.rooms, bridge.rooms)
+        for sockets in list(rooms.values())
+        for sender in list(sockets.values())
+    ]
+    return [(("total",), sum(queued)), (("max",), max(queued, default=0))]
+
+
+metrics.gauge("kino_ws_connections", "Open WebSocket connections on this process.", ("kind",), _connection_counts)
+metrics.gauge("kino_ws_rooms", "Rooms with at least one socket on this process.", callback=lambda: len(manager.rooms))
+metrics.gauge("kino_ws_room_sockets", "Sockets per room on this process (largest 50 rooms).", ("room",), _room_sockets)
+metrics.gauge("kino_ws_send_queue_messages", "Messages waiting in per-socket send queues.", ("stat",), _queue_lengths)
+metrics.gauge("kino_events_bridge_up", "1 while the worker event subscription is live.", callback=lambda: int(bridge.healthy))
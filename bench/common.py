@@ -0,0 +1,34 @@
+"""Helpers shared by the benchmarks that run the app in a subprocess."""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, **env: str) -> subprocess.Popen:
+    """Start `uvicorn app.main:app` on `port` with `env` on top of os.environ.
+
+    Sample preloading and metrics are off unless `env` turns them on.
+    Returns once the port accepts connections.
+    """
+    env = dict(os.environ, PRELOAD_SAMPLE_VIDEOS="0", METRICS_ENABLED="0", **env)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
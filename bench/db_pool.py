@@ -0,0 +1,108 @@
+"""Load benchmark for the API database layer.
+
+Runs concurrent requests against `/api/videos` and `/api/rooms` in-process
+(httpx + ASGI transport, no network) and reports requests/second, latency
+percentiles and how many DB connections were opened.
+
+    python -m bench.db_pool                 # shared pooled async engine
+    python -m bench.db_pool --legacy        # engine-per-request (old behaviour)
+
+Point DATABASE_URL at Postgres to get numbers representative of production;
+the default is a throwaway SQLite file.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='kino_bench_')}/bench.db"
+os.environ.setdefault("PRELOAD_SAMPLE_VIDEOS", "0")
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import db
+from app.main import app
+from app.models import Video
+
+connections_opened = 0
+
+
+@event.listens_for(Pool, "connect")
+def _count_connect(dbapi_conn, record):
+    global connections_opened
+    connections_opened += 1
+
+
+async def legacy_session():
+    # mimics the pre-pool behaviour: a fresh engine (and pool) per request
+    engine = create_async_engine(db._async_url(db.DATABASE_URL))
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+    finally:
+        await engine.dispose()
+
+
+def seed(rows: int):
+    db.create_db_and_tables()
+    with db.get_session() as session:
+        for i in range(rows):
+            session.add(Video(filename=f"bench_{i}.mp4", s3_key=f"videos/bench_{i}.mp4", status="ready"))
+        session.commit()
+
+
+async def run(requests: int, concurrency: int):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(i: int):
+            path = "/api/videos" if i % 2 == 0 else "/api/rooms"
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.get(path)
+                latencies.append(time.perf_counter() - t0)
+                r.raise_for_status()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - t0
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--legacy", action="store_true", help="open a new engine per request")
+    args = parser.parse_args()
+
+    seed(args.rows)
+    if args.legacy:
+        app.dependency_overrides[db.get_async_session] = legacy_session
+
+    global connections_opened
+    connections_opened = 0
+    elapsed, latencies = asyncio.run(run(args.requests, args.concurrency))
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    mode = "legacy (engine per request)" if args.legacy else f"pooled (pool_size={db.DB_POOL_SIZE})"
+    print(f"mode:          {mode}")
+    print(f"database:      {db.DATABASE_URL}")
+    print(f"requests:      {args.requests} @ concurrency {args.concurrency}")
+    print(f"req/s:         {args.requests / elapsed:.1f}")
+    print(f"p50 / p99 ms:  {statistics.median(latencies) * 1000:.2f} / {p99 * 1000:.2f}")
+    print(f"connections:   {connections_opened}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""S3 load of a room starting the same video, with and without the HLS edge cache.
+
+Uploads SEGMENTS fake segments of SIZE bytes under hls/bench-edge/, starts
+`uvicorn app.main:app` and lets VIEWERS clients fetch every segment through
+`/api/hls` at the same moment, in playback order. Without the cache each
+request is a redirect that the client follows to S3; with it the app fetches
+each object once and serves the rest from disk.
+
+    python -m bench.edge_cache --viewers 200
+    python -m bench.edge_cache --viewers 200 --legacy     # presigned redirects (cache off)
+
+Needs S3 at S3_ENDPOINT_URL. The server uses a throwaway SQLite file unless
+DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='kino_bench_')}/bench.db"
+
+import httpx
+
+from app.s3 import get_s3, ensure_bucket, S3_BUCKET_NAME
+from bench.common import free_port, start_server
+
+STEM = "bench-edge"
+
+
+def seed(segments: int, size: int) -> list[str]:
+    ensure_bucket()
+    paths = []
+    for i in range(segments):
+        path = f"720p/seg_{i:03d}.ts"
+        get_s3().put_object(Bucket=S3_BUCKET_NAME, Key=f"hls/{STEM}/{path}", Body=os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+async def viewer(client: httpx.AsyncClient, base: str, paths: list[str], latencies: list[float], counts: dict):
+    for path in paths:
+        t0 = time.perf_counter()
+        r = await client.get(f"{base}/api/hls/{STEM}/{path}")
+        latencies.append(time.perf_counter() - t0)
+        counts["s3_gets"] += len(r.history)  # each followed redirect is a GET on S3
+        counts["bytes"] += len(r.content)
+        if r.status_code != 200:
+            counts["errors"] += 1
+
+
+async def run(args, base: str, paths: list[str]) -> dict:
+    latencies: list[float] = []
+    counts = {"s3_gets": 0, "bytes": 0, "errors": 0}
+    limits = httpx.Limits(max_connections=args.viewers * 2)
+    async with httpx.AsyncClient(follow_redirects=True, timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(viewer(client, base, paths, latencies, counts) for _ in range(args.viewers)))
+        elapsed = time.perf_counter() - t0
+        stats = None
+        if not args.legacy:
+            stats = (await client.get(f"{base}/api/edge-cache")).json()
+    lat = sorted(latencies)
+    pct = lambda p: lat[min(len(lat) - 1, int(len(lat) * p))] * 1000
+    return {"elapsed": elapsed, "p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "counts": counts, "stats": stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--viewers", type=int, default=100)
+    parser.add_argument("--segments", type=int, default=5)
+    parser.add_argument("--size", type=int, default=1_000_000, help="bytes per segment")
+    parser.add_argument("--legacy", action="store_true", help="cache off: every viewer follows a redirect to S3")
+    args = parser.parse_args()
+
+    paths = seed(args.segments, args.size)
+    port = free_port()
+    cache_dir = "" if args.legacy else tempfile.mkdtemp(prefix="kino_edge_")
+    proc = start_server(port, HLS_EDGE_CACHE_DIR=cache_dir)
+    try:
+        res = asyncio.run(run(args, f"http://127.0.0.1:{port}", paths))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    requests = args.viewers * args.segments
+    counts, stats = res["counts"], res["stats"]
+    s3_gets = counts["s3_gets"] if args.legacy else stats["misses"]
+    s3_bytes = s3_gets * args.size
+    print(f"mode:          {'redirect (legacy)' if args.legacy else 'edge cache'}  viewers: {args.viewers}  segments: {args.segments} x {args.size} B")
+    print(f"wall time:     {res['elapsed']:.2f}s ({counts['bytes'] / res['elapsed'] / 1e6:.1f} MB/s delivered)")
+    print(f"latency ms:    p50 {res['p50']:.1f}  p95 {res['p95']:.1f}  p99 {res['p99']:.1f}")
+    print(f"S3 GETs:       {s3_gets} for {requests} segment requests ({s3_bytes / 1e6:.1f} MB from S3)")
+    if stats:
+        print(f"hit ratio:     {stats['hit_ratio']:.3f} (hits {stats['hits']}, coalesced {stats['coalesced']}, misses {stats['misses']})")
+        print(f"bytes saved:   {stats['bytes_saved'] / 1e6:.1f} MB")
+    print(f"errors:        {counts['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Micro-benchmark of GET /api/videos over a large catalog.
+
+Seeds a throwaway SQLite database with `--rows` videos and times walking the
+whole catalog (1000-row pages) in-process. Presigning is local (no S3 traffic), so the
+numbers isolate client construction and signing cost.
+
+    python -m bench.list_videos              # shared client + URL cache
+    python -m bench.list_videos --legacy     # new boto3 client per URL, no cache
+    python -m bench.list_videos --slim       # unsigned listing projection
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='kino_bench_')}/bench.db"
+os.environ.setdefault("PRELOAD_SAMPLE_VIDEOS", "0")
+
+import boto3
+from botocore.client import Config
+from fastapi.testclient import TestClient
+
+from app import api, db, s3
+from app.main import app
+from app.models import Video
+
+
+def legacy_make_video_url(key: str) -> str:
+    # the pre-cache implementation: one client build and one signature per call
+    client = boto3.client(
+        "s3",
+        endpoint_url=s3.S3_PUBLIC_ENDPOINT,
+        aws_access_key_id=s3.S3_ACCESS_KEY,
+        aws_secret_access_key=s3.S3_SECRET_KEY,
+        config=Config(signature_version="s3v4"),
+        region_name="us-east-1",
+    )
+    return client.generate_presigned_url(
+        ClientMethod="get_object",
+        Params={"Bucket": s3.S3_BUCKET_NAME, "Key": key},
+        ExpiresIn=3600,
+    )
+
+
+def seed(rows: int):
+    db.create_db_and_tables()
+    with db.get_session() as session:
+        for i in range(rows):
+            session.add(Video(filename=f"bench_{i}.mp4", s3_key=f"videos/bench_{i:06d}.mp4", status="ready"))
+        session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy", action="store_true", help="build a boto3 client per URL, no cache")
+    parser.add_argument("--slim", action="store_true", help="request the unsigned listing projection")
+    args = parser.parse_args()
+
+    seed(args.rows)
+    if args.legacy:
+        api.make_video_url = legacy_make_video_url
+
+    timings = []
+    with TestClient(app) as client:
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            rows, cursor = 0, None
+            while True:
+                params = {"limit": 1000, "slim": args.slim}
+                if cursor:
+                    params["cursor"] = cursor
+                r = client.get("/api/videos", params=params)
+                r.raise_for_status()
+                rows += len(r.json())
+                cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            timings.append(time.perf_counter() - t0)
+
+    print(f"mode:        {'legacy' if args.legacy else 'cached'}{' slim' if args.slim else ''}")
+    print(f"rows:        {rows}")
+    print(f"first ms:    {timings[0] * 1000:.1f}")
+    if len(timings) > 1:
+        print(f"warm ms:     {statistics.median(timings[1:]) * 1000:.1f} (median of {len(timings) - 1})")
+    if not args.legacy:
+        print(f"url cache:   {s3.url_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Time to first segment for a room that has just picked a video.
+
+Seeds a fake HLS video (master, three variants, SEGMENTS segments each) in S3
+and a Video row, starts `uvicorn app.main:app` with the edge cache on,
+connects VIEWERS sockets to one room and sends a `video` event from one of
+them. After DELAY ms (the client fetching the video and attaching hls.js)
+every viewer requests master -> first variant -> first segment. Reports the
+time until each viewer has its first segment and how many S3 GETs happened
+on the viewers' path versus ahead of them.
+
+    python -m bench.room_prefetch --viewers 100
+    python -m bench.room_prefetch --viewers 100 --legacy    # no prefetch (ROOM_PREFETCH_SEGMENTS=0)
+
+Needs S3 at S3_ENDPOINT_URL. The server and the bench share a throwaway
+SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='kino_bench_')}/bench.db"
+
+import httpx
+import websockets
+
+from app import db
+from app.models import Video
+from app.s3 import get_s3, ensure_bucket, S3_BUCKET_NAME
+from bench.common import free_port, start_server
+
+LABELS = (("1080p", 5000000, "1920x1080"), ("720p", 2800000, "1280x720"), ("360p", 800000, "640x360"))
+
+
+def seed(segments: int, size: int) -> tuple[int, str]:
+    ensure_bucket()
+    stem = uuid.uuid4().hex
+    s3 = get_s3()
+    master = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for label, bandwidth, resolution in LABELS:
+        master += [f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION={resolution}", f"{label}/playlist.m3u8"]
+        playlist = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:6"]
+        for i in range(segments):
+            s3.put_object(Bucket=S3_BUCKET_NAME, Key=f"hls/{stem}/{label}/seg_{i:03d}.ts", Body=os.urandom(size))
+            playlist += ["#EXTINF:6.0,", f"seg_{i:03d}.ts"]
+        playlist.append("#EXT-X-ENDLIST")
+        s3.put_object(Bucket=S3_BUCKET_NAME, Key=f"hls/{stem}/{label}/playlist.m3u8", Body="\n".join(playlist).encode())
+    s3.put_object(Bucket=S3_BUCKET_NAME, Key=f"hls/{stem}/master.m3u8", Body="\n".join(master).encode())
+
+    db.create_db_and_tables()
+    with db.get_session() as session:
+        v = Video(filename="bench.mp4", s3_key=f"videos/{stem}.mp4", hls_master=f"/api/hls/{stem}/master.m3u8", status="ready")
+        session.add(v)
+        session.commit()
+        return v.id, stem
+
+
+async def run(args, base: str, video_id: int, stem: str) -> dict:
+    room = f"prefetch-{uuid.uuid4().hex[:8]}"
+    sockets = [await websockets.connect(f"{base.replace('http', 'ws')}/ws/{room}") for _ in range(args.viewers)]
+    limits = httpx.Limits(max_connections=args.viewers * 2)
+    async with httpx.AsyncClient(base_url=base, timeout=120, limits=limits) as client:
+
+        async def first_segment() -> float:
+            master = await client.get(f"/api/hls/{stem}/master.m3u8")
+            variant = next(l for l in master.text.splitlines() if l and not l.startswith("#"))
+            playlist = await client.get(f"/api/hls/{stem}/{variant}")
+            segment = next(l for l in playlist.text.splitlines() if l and not l.startswith("#"))
+            r = await client.get(f"/api/hls/{stem}/{variant.rsplit('/', 1)[0]}/{segment}")
+            r.raise_for_status()
+            return time.perf_counter()
+
+        t0 = time.perf_counter()
+        await sockets[0].send(json.dumps({"type": "video", "videoId": video_id}))
+        await asyncio.sleep(args.delay / 1000)
+        done = await asyncio.gather(*(first_segment() for _ in range(args.viewers)))
+        stats = (await client.get("/api/edge-cache")).json()
+    for ws in sockets:
+        await ws.close()
+    ttfs = sorted(t - t0 for t in done)
+    return {"ttfs": ttfs, "stats": stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--viewers", type=int, default=50)
+    parser.add_argument("--segments", type=int, default=5, help="segments per variant")
+    parser.add_argument("--size", type=int, default=2_000_000, help="bytes per segment")
+    parser.add_argument("--delay", type=float, default=300, help="ms between the video event and the viewers' requests")
+    parser.add_argument("--legacy", action="store_true", help="prefetch off")
+    args = parser.parse_args()
+
+    video_id, stem = seed(args.segments, args.size)
+    port = free_port()
+    proc = start_server(
+        port,
+        HLS_EDGE_CACHE_DIR=tempfile.mkdtemp(prefix="kino_edge_"),
+        ROOM_PREFETCH_SEGMENTS="0" if args.legacy else os.environ.get("ROOM_PREFETCH_SEGMENTS", "3"),
+    )
+    try:
+        res = asyncio.run(run(args, f"http://127.0.0.1:{port}", video_id, stem))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    ttfs, stats = res["ttfs"], res["stats"]
+    pct = lambda p: ttfs[min(len(ttfs) - 1, int(len(ttfs) * p))] * 1000
+    print(f"mode:               {'no prefetch (legacy)' if args.legacy else 'room prefetch'}  viewers: {args.viewers}  delay: {args.delay:.0f} ms")
+    print(f"first segment ms:   p50 {pct(0.5):.1f}  p95 {pct(0.95):.1f}  max {pct(1.0):.1f}  (from the video event)")
+    print(f"S3 GETs on viewers' path: {stats['misses']}  prefetched: {stats['prefetched']}  coalesced: {stats['coalesced']}")
+
+
+if __name__ == "__main__":
+    main()
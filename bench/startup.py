@@ -0,0 +1,94 @@
+"""Cold import time of the app modules and time until uvicorn serves requests.
+
+Every measurement runs in a fresh interpreter. Import times are cumulative
+(a module includes whatever it imports first); startup is measured from
+spawning `uvicorn app.main:app` to the first HTTP response. Both use a
+throwaway SQLite file unless DATABASE_URL is set.
+
+    python -m bench.startup
+    python -m bench.startup --s3-endpoint http://10.255.255.1:9000   # unreachable MinIO
+    python -m bench.startup --preload --repeat 5                      # with sample preload on
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='kino_bench_')}/bench.db"
+
+import httpx
+
+from bench.common import free_port
+
+MODULES = ("app.metrics", "app.s3", "app.db", "app.websocket", "app.tasks", "app.api", "app.main")
+
+
+def import_time(module: str, env: dict, timeout: float) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    try:
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return float("inf")
+    if out.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{out.stderr[-2000:]}")
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def startup_time(env: dict, timeout: float) -> float:
+    port = free_port()
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/openapi.json", timeout=1)
+                return time.perf_counter() - t0
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        return float("inf")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def fmt(values: list[float]) -> str:
+    if any(v == float("inf") for v in values):
+        return "timeout"
+    return f"{statistics.median(values) * 1000:8.0f} ms  (min {min(values) * 1000:.0f}, max {max(values) * 1000:.0f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--s3-endpoint", help="override S3_ENDPOINT_URL, e.g. an unreachable address")
+    parser.add_argument("--preload", action="store_true", help="keep PRELOAD_SAMPLE_VIDEOS on")
+    parser.add_argument("--timeout", type=float, default=120, help="give up on one measurement after this many seconds")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PRELOAD_SAMPLE_VIDEOS="1" if args.preload else "0")
+    if args.s3_endpoint:
+        env["S3_ENDPOINT_URL"] = args.s3_endpoint
+
+    print(f"s3 endpoint:  {env.get('S3_ENDPOINT_URL', 'default')}  preload: {args.preload}  repeat: {args.repeat}")
+    for module in MODULES:
+        print(f"import {module:<14} {fmt([import_time(module, env, args.timeout) for _ in range(args.repeat)])}")
+    print(f"startup (first response) {fmt([startup_time(env, args.timeout) for _ in range(args.repeat)])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Round-trips per transcode job for status writes and their events.
+
+Runs JOBS simulated jobs on THREADS worker threads; every job goes through
+the status changes a real transcode makes (processing, processing + master
+playlist, ready). Counts DB statements, commits and connections opened plus
+Redis round-trips and connections, per job.
+
+    python -m bench.status_events                 # StatusPublisher (group commit + outbox + pipeline)
+    python -m bench.status_events --legacy        # session + client per status change (old behaviour)
+
+Needs Redis at REDIS_URL. Point DATABASE_URL at Postgres to get numbers
+representative of production; the default is a throwaway SQLite file.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='kino_bench_')}/bench.db"
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from app import db, tasks
+from app.events import EVENTS_CHANNEL, StatusPublisher, VideoStatusEvent
+from app.models import Video
+
+counts = {"db_statements": 0, "db_commits": 0, "db_connections": 0, "redis_round_trips": 0, "redis_connections": 0}
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counts["db_statements"] += 1
+
+
+@event.listens_for(Engine, "commit")
+def _count_commit(conn):
+    counts["db_commits"] += 1
+
+
+@event.listens_for(Pool, "connect")
+def _count_connect(dbapi_conn, record):
+    counts["db_connections"] += 1
+
+
+_send_packed = redis.connection.AbstractConnection.send_packed_command
+_sock_connect = redis.connection.Connection._connect
+
+
+def _counting_send(self, command, check_health=True):
+    counts["redis_round_trips"] += 1
+    return _send_packed(self, command, check_health)
+
+
+def _counting_connect(self):
+    counts["redis_connections"] += 1
+    return _sock_connect(self)
+
+
+redis.connection.AbstractConnection.send_packed_command = _counting_send
+redis.connection.Connection._connect = _counting_connect
+
+
+def legacy_set_status(video_id: int, status: str, hls_master=None):
+    # the old path: a session and a fresh Redis client per status change
+    with db.get_session() as session:
+        v = session.get(Video, video_id)
+        v.status = status
+        if hls_master:
+            v.hls_master = hls_master
+        session.add(v)
+        session.commit()
+    client = redis.Redis.from_url(tasks.REDIS_URL)
+    client.publish(EVENTS_CHANNEL, VideoStatusEvent(id=video_id, status=status, hls_master=hls_master).to_json())
+    client.close()
+
+
+def seed(jobs: int) -> list[int]:
+    db.create_db_and_tables()
+    with db.get_session() as session:
+        videos = [Video(filename=f"bench_{i}.mp4", s3_key=f"videos/bench_{i}.mp4") for i in range(jobs)]
+        session.add_all(videos)
+        session.commit()
+        return [v.id for v in videos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--legacy", action="store_true")
+    args = parser.parse_args()
+
+    ids = seed(args.jobs)
+    client = redis.Redis.from_url(tasks.REDIS_URL)
+    publisher = StatusPublisher(client, db.get_session)
+    set_status = legacy_set_status if args.legacy else publisher.set_status
+
+    def job(video_id: int):
+        set_status(video_id, "processing")
+        set_status(video_id, "processing", f"/api/hls/bench_{video_id}/master.m3u8")
+        set_status(video_id, "ready", f"/api/hls/bench_{video_id}/master.m3u8")
+
+    for k in counts:
+        counts[k] = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(job, ids))
+    elapsed = time.perf_counter() - t0
+
+    print(f"mode:                       {'legacy' if args.legacy else 'publisher'}  jobs: {args.jobs}  threads: {args.threads}")
+    print(f"wall time:                  {elapsed:.2f}s ({args.jobs / elapsed:.0f} jobs/s)")
+    for k, v in counts.items():
+        print(f"{k + ' / job:':<28}{v / args.jobs:.2f}")
+    if not args.legacy:
+        print(f"flushes:                    {publisher.stats['flushes']} ({publisher.stats['writes'] / max(publisher.stats['flushes'], 1):.1f} writes each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Transcode throughput (videos/hour) across concurrency settings.
+
+Generates synthetic inputs with ffmpeg's lavfi test sources (mixed durations),
+then runs the worker's single-pass HLS encode on all of them through
+`TranscodeScheduler` for each `--concurrency` value, splitting the host's
+cores between the slots exactly like the worker does. No S3/DB involved.
+
+    python -m bench.transcode_throughput --concurrency 1 2 4
+    python -m bench.transcode_throughput --simulate   # no ffmpeg: scheduler overhead only
+"""
+import argparse
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app import tasks
+
+
+def make_inputs(workdir: Path, durations: list[int], height: int) -> list[tuple[Path, int]]:
+    inputs = []
+    for i, seconds in enumerate(durations):
+        path = workdir / f"input_{i}_{seconds}s.mp4"
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-v", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size={height * 16 // 9}x{height}:rate=24",
+                "-f", "lavfi", "-i", "sine=frequency=440",
+                "-t", str(seconds), "-shortest",
+                "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac",
+                str(path),
+            ],
+            check=True,
+        )
+        inputs.append((path, seconds))
+    return inputs
+
+
+def encode(scheduler: tasks.TranscodeScheduler, src: Path, seconds: int, outdir: Path, simulate: bool):
+    source = {"width": 1920, "height": 1080, "has_audio": True, "duration": seconds}
+    if not simulate:
+        source = tasks.probe_source(src)
+    renditions = tasks.select_ladder(source)
+    for r in renditions:
+        (outdir / r.label).mkdir(parents=True, exist_ok=True)
+    with scheduler.slot("upload", source.get("duration") or 0.0) as threads:
+        if simulate:
+            for r in renditions:
+                tasks._simulate_rendition(outdir / r.label, r.label)
+            return
+        cmd = tasks._ffmpeg_hls_command(src, outdir, renditions, threads=threads)
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run(inputs, concurrency: int, workdir: Path, simulate: bool) -> float:
+    threads = max(1, tasks.CPU_COUNT // concurrency)
+    scheduler = tasks.TranscodeScheduler(concurrency, threads)
+    jobs = []
+    t0 = time.perf_counter()
+    for i, (src, seconds) in enumerate(inputs):
+        out = workdir / f"c{concurrency}_{i}"
+        job = threading.Thread(target=encode, args=(scheduler, src, seconds, out, simulate))
+        job.start()
+        jobs.append(job)
+    for job in jobs:
+        job.join()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--durations", type=int, nargs="+", default=[5, 10, 20, 5, 10, 30])
+    parser.add_argument("--height", type=int, default=720, help="synthetic source height")
+    parser.add_argument("--simulate", action="store_true", help="skip ffmpeg (simulated segments)")
+    args = parser.parse_args()
+
+    simulate = args.simulate or shutil.which("ffmpeg") is None
+    workdir = Path(tempfile.mkdtemp(prefix="kino_tp_"))
+    try:
+        if simulate:
+            inputs = [(workdir / f"input_{i}.mp4", d) for i, d in enumerate(args.durations)]
+        else:
+            inputs = make_inputs(workdir, args.durations, args.height)
+        print(f"cores: {tasks.CPU_COUNT}  videos: {len(inputs)}  content: {sum(args.durations)} s  "
+              f"mode: {'simulate' if simulate else 'ffmpeg'}")
+        print(f"{'concurrency':>11} {'threads/job':>11} {'wall s':>8} {'videos/h':>9}")
+        for c in args.concurrency:
+            elapsed = run(inputs, c, workdir, simulate)
+            print(f"{c:>11} {max(1, tasks.CPU_COUNT // c):>11} {elapsed:>8.1f} {len(inputs) * 3600 / elapsed:>9.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
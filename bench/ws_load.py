@@ -0,0 +1,203 @@
+"""WebSocket load test for the room sync path.
+
+Starts `uvicorn app.main:app` in a subprocess with the chosen room backend
+(or targets a running server with --url), opens ROOMS x CLIENTS sockets to
+`/ws/{room_code}` and drives each room with a play/pause/seek/scrub pattern.
+Reports end-to-end latency percentiles (client send -> every other viewer
+received), delivered messages per second and the server's RSS.
+
+    python -m bench.ws_load --rooms 50 --clients 20
+    python -m bench.ws_load --backend redis --rooms 50 --clients 20     # needs Redis at REDIS_URL
+    python -m bench.ws_load --backend streams --binary
+    python -m bench.ws_load --url ws://127.0.0.1:8000 --pid 1234        # existing server
+
+Scrub bursts are coalesced by the server (WS_COALESCE_WINDOW), so their
+latency includes the deliberate hold time. The spawned server uses a
+throwaway SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Optional
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='kino_bench_')}/bench.db"
+
+import websockets
+
+from app.protocol import BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL, decode_binary, encode_binary
+from bench.common import free_port, start_server
+
+
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        out = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+        return int(out.strip()) / 1024
+    except (ValueError, OSError):
+        return None
+
+
+class Stats:
+    def __init__(self):
+        # (room, type, position) -> send time; positions are unique per room
+        self.sent: dict[tuple, float] = {}
+        self.latencies: list[float] = []
+        self.received = 0
+        self.events_sent = 0
+        self.errors = 0
+
+
+class Client:
+    def __init__(self, url: str, room: str, binary: bool, stats: Stats):
+        self.url = url
+        self.room = room
+        self.binary = binary
+        self.stats = stats
+        self.ws = None
+
+    async def connect(self):
+        protocols = [BINARY_SUBPROTOCOL if self.binary else JSON_SUBPROTOCOL]
+        self.ws = await websockets.connect(f"{self.url}/ws/{self.room}", subprotocols=protocols, max_queue=None)
+        asyncio.create_task(self.read())
+
+    async def read(self):
+        try:
+            async for raw in self.ws:
+                now = time.perf_counter()
+                msg = decode_binary(raw) if isinstance(raw, bytes) else json.loads(raw)
+                if not msg or msg.get("type") in ("state", "pong"):
+                    continue
+                self.stats.received += 1
+                t0 = self.stats.sent.get((self.room, msg["type"], round(msg.get("position") or 0, 3)))
+                if t0 is not None:
+                    self.stats.latencies.append(now - t0)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception:
+            self.stats.errors += 1
+
+    async def send(self, event: dict):
+        self.stats.sent[(self.room, event["type"], round(event["position"], 3))] = time.perf_counter()
+        self.stats.events_sent += 1
+        frame = encode_binary(event) if self.binary else None
+        await self.ws.send(frame if frame is not None else json.dumps(event))
+
+
+async def drive_room(clients: list[Client], rate: float, until: float, seq: list[int]):
+    """One room's activity: mostly playing, with pauses, seeks and scrub bursts."""
+
+    def position() -> float:
+        # unique per event so receivers can match it to its send time
+        seq[0] += 1
+        return seq[0] + random.random() / 10
+
+    playing = False
+    while time.perf_counter() < until:
+        await asyncio.sleep(random.expovariate(rate))
+        actor = random.choice(clients)
+        roll = random.random()
+        try:
+            if not playing or roll < 0.3:
+                playing = not playing
+                await actor.send({"type": "play" if playing else "pause", "position": position()})
+            elif roll < 0.8:
+                await actor.send({"type": "seek", "position": position()})
+            else:
+                for _ in range(random.randint(3, 10)):
+                    await actor.send({"type": "seek", "position": position()})
+                    await asyncio.sleep(0.02)
+        except websockets.ConnectionClosed:
+            actor.stats.errors += 1
+
+
+async def run(args, url: str, pid: Optional[int]):
+    stats = Stats()
+    rooms = [[Client(url, f"load-{i}", args.binary, stats) for _ in range(args.clients)] for i in range(args.rooms)]
+    rss_idle = rss_mb(pid)
+
+    t0 = time.perf_counter()
+    sem = asyncio.Semaphore(200)
+
+    async def connect(c: Client):
+        async with sem:
+            await c.connect()
+
+    await asyncio.gather(*(connect(c) for clients in rooms for c in clients))
+    connect_s = time.perf_counter() - t0
+    rss_connected = rss_mb(pid)
+
+    await asyncio.sleep(1)
+    received_before = stats.received
+    t0 = time.perf_counter()
+    until = t0 + args.duration
+    await asyncio.gather(*(drive_room(clients, args.rate, until, [0]) for clients in rooms))
+    await asyncio.sleep(1)
+    elapsed = time.perf_counter() - t0
+    rss_loaded = rss_mb(pid)
+
+    for clients in rooms:
+        for c in clients:
+            await c.ws.close()
+
+    lat = sorted(stats.latencies)
+
+    def pct(p: float) -> float:
+        return lat[min(len(lat) - 1, int(len(lat) * p))] * 1000 if lat else float("nan")
+
+    sockets = args.rooms * args.clients
+    fmt = lambda v: f"{v:.1f} MB" if v is not None else "n/a"
+    print(f"backend:        {args.backend if not args.url else 'external'}{' (binary)' if args.binary else ''}")
+    print(f"sockets:        {sockets} ({args.rooms} rooms x {args.clients} clients), connected in {connect_s:.2f}s")
+    print(f"events sent:    {stats.events_sent} ({stats.events_sent / args.duration:.1f}/s)")
+    print(f"delivered:      {stats.received - received_before} ({(stats.received - received_before) / elapsed:.1f} msg/s)")
+    print(f"latency ms:     p50 {pct(0.5):.2f}  p95 {pct(0.95):.2f}  p99 {pct(0.99):.2f}  max {pct(1.0):.2f}")
+    if lat:
+        print(f"latency mean:   {statistics.mean(lat) * 1000:.2f} ms over {len(lat)} deliveries")
+    print(f"server RSS:     idle {fmt(rss_idle)}, connected {fmt(rss_connected)}, loaded {fmt(rss_loaded)}")
+    print(f"errors:         {stats.errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=10, help="viewers per room")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--rate", type=float, default=2, help="actions per second per room")
+    parser.add_argument("--backend", choices=("memory", "redis", "streams"), default="memory")
+    parser.add_argument("--binary", action="store_true", help="use the kino.bin.v1 subprotocol")
+    parser.add_argument("--url", help="target a running server, e.g. ws://127.0.0.1:8000")
+    parser.add_argument("--pid", type=int, help="server pid for RSS when using --url")
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        url, pid = args.url.rstrip("/"), args.pid
+    else:
+        port = free_port()
+        proc = start_server(port, WS_BACKEND=args.backend)
+        url, pid = f"ws://127.0.0.1:{port}", proc.pid
+    try:
+        asyncio.run(run(args, url, pid))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Redis fan-out benchmark for the websocket RedisManager.
+
+Connects N in-process fake sockets to one room, publishes broadcasts through
+the manager and reports Redis client connections held and CPU time per
+broadcast (this process and, when the server reports it, Redis itself) for
+growing room sizes.
+
+    python -m bench.ws_redis_fanout                      # multiplexed manager
+    python -m bench.ws_redis_fanout --legacy             # pubsub per socket (old behaviour)
+    python -m bench.ws_redis_fanout --sizes 10 100 1000
+
+Needs a running Redis at REDIS_URL (default redis://localhost:6379).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from redis.exceptions import ResponseError
+
+from app import websocket
+
+
+class FakeSocket:
+    def __init__(self, counter: dict):
+        self.counter = counter
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.counter["received"] += 1
+        if self.counter["received"] >= self.counter["expected"]:
+            self.counter["done"].set()
+
+
+class LegacyRedisManager(websocket.RedisManager):
+    # mimics the pre-multiplexing behaviour: a pubsub and reader task per socket
+    def __init__(self, channel_prefix: str = "room"):
+        import redis.asyncio as aioredis
+
+        super().__init__(channel_prefix)
+        # room for one pooled connection per socket
+        self._redis = aioredis.from_url(websocket.REDIS_URL or "redis://localhost:6379", max_connections=100_000)
+
+    async def connect(self, room, ws):
+        await ws.accept()
+        sub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await sub.subscribe(self._channel(room))
+
+        async def reader():
+            while True:
+                msg = await sub.get_message(ignore_subscribe_messages=True, timeout=None)
+                if msg and msg.get("type") == "message":
+                    await ws.send_text(msg["data"].decode())
+
+        ws._redis_sub = sub
+        ws._redis_task = asyncio.create_task(reader())
+
+    async def disconnect(self, room, ws):
+        ws._redis_task.cancel()
+        try:
+            await ws._redis_task
+        except asyncio.CancelledError:
+            pass
+        await ws._redis_sub.aclose()
+
+
+async def redis_stats(client) -> tuple[int, float]:
+    try:
+        info = await client.info()
+    except ResponseError:
+        # some Redis-compatible servers don't implement INFO
+        return 0, 0.0
+    cpu = float(info.get("used_cpu_user", 0)) + float(info.get("used_cpu_sys", 0))
+    return int(info.get("connected_clients", 0)), cpu
+
+
+async def run_size(manager_cls, size: int, broadcasts: int) -> dict:
+    manager = manager_cls(channel_prefix="bench")
+    room = f"fanout-{size}"
+    counter = {"received": 0, "expected": size * broadcasts, "done": asyncio.Event()}
+    sockets = [FakeSocket(counter) for _ in range(size)]
+
+    clients_before, _ = await redis_stats(manager._redis)
+    for ws in sockets:
+        await manager.connect(room, ws)
+    clients_after, redis_cpu0 = await redis_stats(manager._redis)
+    # how many times Redis delivers each published message
+    [(_, subscribers)] = await manager._redis.pubsub_numsub(manager._channel(room))
+
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    for i in range(broadcasts):
+        await manager.broadcast(room, {"from": "bench", "payload": json.dumps({"i": i})})
+    await asyncio.wait_for(counter["done"].wait(), timeout=120)
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    _, redis_cpu1 = await redis_stats(manager._redis)
+
+    for ws in sockets:
+        await manager.disconnect(room, ws)
+    await manager.close()
+    return {
+        "size": size,
+        # pubsub connections opened by connect() plus the pooled publish connection
+        "connections": clients_after - clients_before + 1,
+        "subscribers": subscribers,
+        "app_cpu_ms": cpu / broadcasts * 1000,
+        "redis_cpu_ms": (redis_cpu1 - redis_cpu0) / broadcasts * 1000,
+        "latency_ms": elapsed / broadcasts * 1000,
+    }
+
+
+async def run(args):
+    manager_cls = LegacyRedisManager if args.legacy else websocket.RedisManager
+    mode = "legacy (pubsub per socket)" if args.legacy else "multiplexed (pubsub per process)"
+    print(f"mode:  {mode}")
+    print(f"redis: {websocket.REDIS_URL or 'redis://localhost:6379'}")
+    print(
+        f"{'sockets':>8} {'redis conns':>12} {'subscribers':>12} {'app cpu/bcast ms':>17} "
+        f"{'redis cpu/bcast ms':>19} {'wall/bcast ms':>14}"
+    )
+    for size in args.sizes:
+        r = await run_size(manager_cls, size, args.broadcasts)
+        print(
+            f"{r['size']:>8} {r['connections']:>12} {r['subscribers']:>12} {r['app_cpu_ms']:>17.3f} "
+            f"{r['redis_cpu_ms']:>19.3f} {r['latency_ms']:>14.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 500])
+    parser.add_argument("--broadcasts", type=int, default=200)
+    parser.add_argument("--legacy", action="store_true", help="one pubsub connection per socket")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
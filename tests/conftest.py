@@ -0,0 +1,15 @@
+import pytest
+
+from app import db
+
+
+@pytest.fixture
+def tmp_db(monkeypatch, tmp_path):
+    """Point app.db at a fresh SQLite file with the schema applied."""
+    monkeypatch.setattr(db, "DATABASE_URL", f"sqlite:///{tmp_path}/test.db")
+    monkeypatch.setattr(db, "_engine", None)
+    monkeypatch.setattr(db, "_async_engine", None)
+    db.create_db_and_tables()
+    yield db
+    if db._engine is not None:
+        db._engine.dispose()
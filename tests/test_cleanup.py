@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta, timezone
+
+import json
+
+import pytest
+from sqlmodel import select
+
+from app import tasks
+from app.models import OutboxEvent, Video
+
+fakeredis = pytest.importorskip("fakeredis")
+
+OLD = datetime.now(timezone.utc) - timedelta(days=30)
+NEW = datetime.now(timezone.utc)
+
+
+class FakePaginator:
+    def __init__(self, s3, name):
+        self.s3 = s3
+        self.name = name
+
+    def paginate(self, Bucket, Prefix, PaginationConfig=None):
+        if self.name == "list_objects_v2":
+            yield {"Contents": [{"Key": k, "LastModified": t} for k, t in sorted(self.s3.objects.items()) if k.startswith(Prefix)]}
+        else:
+            yield {"Uploads": [u for u in self.s3.uploads if u["Key"].startswith(Prefix)]}
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+        self.aborted = []
+
+    def get_paginator(self, name):
+        return FakePaginator(self, name)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(UploadId)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(tasks, "get_s3", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(tasks, "redis_client", client)
+    return client
+
+
+def add_video(tmp_db, s3_key: str) -> int:
+    with tmp_db.get_session() as session:
+        v = Video(filename="a.mp4", s3_key=s3_key, status="deleting")
+        session.add(v)
+        session.commit()
+        return v.id
+
+
+def test_is_orphan():
+    keys, stems = {"videos/a.mp4"}, {"a"}
+    assert not tasks._is_orphan("videos/a.mp4", keys, stems)
+    assert tasks._is_orphan("videos/b.mp4", keys, stems)
+    assert not tasks._is_orphan("hls/a/720p/seg_000.ts", keys, stems)
+    assert tasks._is_orphan("hls/b/master.m3u8", keys, stems)
+    # not laid out like transcode output: leave it alone
+    assert not tasks._is_orphan("hls/b", keys, stems)
+
+
+def test_delete_video_removes_objects_then_row(tmp_db, s3, monkeypatch):
+    woken = []
+    monkeypatch.setattr(tasks.status_publisher, "wake", lambda: woken.append(True))
+    video_id = add_video(tmp_db, "videos/a.mp4")
+    add_video(tmp_db, "videos/b.mp4")
+    for key in ("videos/a.mp4", "hls/a/master.m3u8", "hls/a/720p/seg_000.ts", "videos/b.mp4", "hls/b/master.m3u8"):
+        s3.objects[key] = OLD
+    tasks._delete_video(video_id, "videos/a.mp4")
+    assert set(s3.objects) == {"videos/b.mp4", "hls/b/master.m3u8"}
+    with tmp_db.get_session() as session:
+        assert session.get(Video, video_id) is None
+        events = [json.loads(e.payload) for e in session.exec(select(OutboxEvent))]
+    assert [(e["id"], e["status"]) for e in events] == [(video_id, "deleted")]
+    assert woken
+
+
+def test_sweep_deletes_old_orphans_and_aborts_stale_uploads(tmp_db, s3):
+    add_video(tmp_db, "videos/a.mp4")
+    s3.objects.update({
+        "videos/a.mp4": OLD,
+        "hls/a/master.m3u8": OLD,
+        "videos/gone.mp4": OLD,
+        "hls/gone/master.m3u8": OLD,
+        # may belong to an upload whose row isn't committed yet
+        "videos/fresh.mp4": NEW,
+    })
+    s3.uploads = [
+        {"Key": "videos/stale.mp4", "UploadId": "stale", "Initiated": OLD},
+        {"Key": "videos/resuming.mp4", "UploadId": "resuming", "Initiated": NEW},
+    ]
+
+    stats = tasks.sweep_orphans_once(dry_run=True)
+    assert (stats["orphaned"], stats["deleted"], stats["aborted_uploads"]) == (2, 0, 1)
+    assert len(s3.objects) == 5 and s3.aborted == []
+
+    stats = tasks.sweep_orphans_once()
+    assert stats == {"scanned": 5, "orphaned": 2, "deleted": 2, "aborted_uploads": 1}
+    assert set(s3.objects) == {"videos/a.mp4", "hls/a/master.m3u8", "videos/fresh.mp4"}
+    assert s3.aborted == ["stale"]
+
+
+@pytest.fixture
+def chain(monkeypatch, redis):
+    """Records sweeps and the runs each sweep schedules instead of doing them."""
+    calls = {"swept": 0, "scheduled": []}
+
+    def sweep():
+        calls["swept"] += 1
+
+    monkeypatch.setattr(tasks, "sweep_orphans_once", sweep)
+    monkeypatch.setattr(tasks.sweep_orphans, "send", lambda token: calls["scheduled"].append(token))
+    monkeypatch.setattr(
+        tasks.sweep_orphans, "send_with_options", lambda args, delay: calls["scheduled"].append(args[0])
+    )
+    return calls
+
+
+def test_start_sweeper_starts_one_chain(redis, chain):
+    tasks.start_sweeper()
+    tasks.start_sweeper()
+    assert len(chain["scheduled"]) == 1
+    assert redis.get(tasks.SWEEP_CHAIN_KEY).decode() == chain["scheduled"][0]
+
+
+def test_chain_keeps_its_token_and_stale_chains_stop(redis, chain):
+    tasks.start_sweeper()
+    token = chain["scheduled"][0]
+    tasks.sweep_orphans(token)
+    assert chain["swept"] == 1 and chain["scheduled"] == [token, token]
+
+    # a chain left over from before the key was replaced ends quietly
+    tasks.sweep_orphans("old-chain")
+    assert chain["swept"] == 1 and chain["scheduled"] == [token, token]
+
+    # the key lapsed (Redis flushed, long outage): the live chain takes it back
+    redis.delete(tasks.SWEEP_CHAIN_KEY, tasks.SWEEP_LOCK_KEY)
+    tasks.sweep_orphans(token)
+    assert chain["swept"] == 2 and chain["scheduled"][-1] == token
+    assert redis.get(tasks.SWEEP_CHAIN_KEY).decode() == token
+
+
+def test_delete_keeps_objects_another_row_shares(tmp_db, s3, monkeypatch):
+    monkeypatch.setattr(tasks.status_publisher, "wake", lambda: None)
+    video_id = add_video(tmp_db, "videos/a.mp4")
+    add_video(tmp_db, "videos/a.mp4")
+    s3.objects.update({"videos/a.mp4": OLD, "hls/a/master.m3u8": OLD})
+    tasks._delete_video(video_id, "videos/a.mp4")
+    assert set(s3.objects) == {"videos/a.mp4", "hls/a/master.m3u8"}
+    with tmp_db.get_session() as session:
+        assert session.get(Video, video_id) is None
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import _decode_cursor, _encode_cursor
+from app.models import Video
+
+
+def test_id_cursor_round_trip():
+    cursor = _encode_cursor(Video(id=42, filename="a.mp4", s3_key="videos/a.mp4"), "id")
+    assert "=" not in cursor
+    assert _decode_cursor(cursor, "id") == 42
+
+
+def test_newest_cursor_round_trip():
+    uploaded_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    video = Video(id=7, filename="a.mp4", s3_key="videos/a.mp4", uploaded_at=uploaded_at)
+    assert _decode_cursor(_encode_cursor(video, "newest"), "newest") == (uploaded_at, 7)
+
+
+@pytest.mark.parametrize("cursor, order", [("!!!", "id"), ("YWJj", "id"), ("NDI", "newest"), ("", "id")])
+def test_invalid_cursor_is_a_400(cursor, order):
+    with pytest.raises(HTTPException) as e:
+        _decode_cursor(cursor, order)
+    assert e.value.status_code == 400
@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import literal
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import db
+
+
+@pytest.fixture(autouse=True)
+def tmp_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(db, "DATABASE_URL", f"sqlite:///{tmp_path}/test.db")
+    monkeypatch.setattr(db, "_engine", None)
+    monkeypatch.setattr(db, "_async_engine", None)
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+
+
+def test_engine_is_created_once_and_shared_by_sessions():
+    engine = db.get_engine()
+    assert db.get_engine() is engine
+    with db.get_session() as session:
+        assert session.get_bind() is engine
+    engine.dispose()
+
+
+def test_async_url_picks_the_asyncio_driver(monkeypatch):
+    assert db._async_url("sqlite:///./data/dev.db") == "sqlite+aiosqlite:///./data/dev.db"
+    assert db._async_url("postgresql://u:p@db/kino") == "postgresql+asyncpg://u:p@db/kino"
+    assert db._async_url("postgresql+psycopg2://u:p@db/kino") == "postgresql+asyncpg://u:p@db/kino"
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "postgresql+asyncpg://other/kino")
+    assert db._async_url("postgresql://u:p@db/kino") == "postgresql+asyncpg://other/kino"
+
+
+@pytest.mark.asyncio
+async def test_async_session_dependency_uses_the_shared_async_engine():
+    sessions = db.get_async_session()
+    session = await sessions.__anext__()
+    assert isinstance(session, AsyncSession)
+    assert session.bind is db.get_async_engine()
+    assert (await session.exec(select(literal(1)))).one() == 1
+    await sessions.aclose()
+
+    engine = db.get_async_engine()
+    await db.dispose_engines()
+    assert db._async_engine is None and db._engine is None
+    assert db.get_async_engine() is not engine
+    await db.dispose_engines()
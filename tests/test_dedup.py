@@ -0,0 +1,74 @@
+import pytest
+from sqlmodel import Session
+
+from app import tasks
+from app.events import StatusPublisher
+from app.models import Video
+
+
+@pytest.fixture
+def videos(tmp_db, monkeypatch):
+    """Adds rows; status writes go through a publisher without Redis."""
+    engine = tmp_db.get_engine()
+    monkeypatch.setattr(tasks, "status_publisher", StatusPublisher(None, lambda: Session(engine)))
+
+    def add(s3_key: str, **fields) -> int:
+        with tmp_db.get_session() as session:
+            v = Video(filename="a.mp4", s3_key=s3_key, **fields)
+            session.add(v)
+            session.commit()
+            return v.id
+
+    return add
+
+
+@pytest.fixture
+def deleted(monkeypatch):
+    keys = []
+    monkeypatch.setattr(tasks, "_delete_keys", keys.extend)
+    return keys
+
+
+def ready(content_hash: str, **overrides) -> dict:
+    fields = dict(
+        status="ready", hls_master="/api/hls/a/master.m3u8", content_hash=content_hash,
+        ladder_fingerprint=tasks.LADDER_FINGERPRINT,
+    )
+    return {**fields, **overrides}
+
+
+def test_shared_with_others(videos):
+    a = videos("videos/a.mp4")
+    b = videos("videos/a.mp4")
+    c = videos("videos/c.mp4")
+    assert tasks._shared_with_others("videos/a.mp4", a)
+    assert tasks._shared_with_others("videos/a.mp4", b)
+    assert not tasks._shared_with_others("videos/c.mp4", c)
+
+
+def test_duplicate_takes_over_the_ready_output(tmp_db, videos, deleted):
+    videos("videos/a.mp4", **ready("h1"))
+    dup = videos("videos/b.mp4", status="processing")
+    assert tasks._reuse_cached_output(dup, "videos/b.mp4", "h1")
+    with tmp_db.get_session() as session:
+        v = session.get(Video, dup)
+        assert (v.status, v.s3_key, v.hls_master, v.content_hash) == ("ready", "videos/a.mp4", "/api/hls/a/master.m3u8", "h1")
+    assert deleted == ["videos/b.mp4"]
+
+
+def test_no_reuse_across_ladders_or_unfinished_output(tmp_db, videos, deleted):
+    videos("videos/a.mp4", **ready("h1", ladder_fingerprint="other"))
+    videos("videos/c.mp4", content_hash="h1", status="processing")
+    dup = videos("videos/b.mp4", status="processing")
+    assert not tasks._reuse_cached_output(dup, "videos/b.mp4", "h1")
+    with tmp_db.get_session() as session:
+        assert session.get(Video, dup).s3_key == "videos/b.mp4"
+    assert deleted == []
+
+
+def test_source_shared_with_another_row_is_kept(videos, deleted):
+    videos("videos/a.mp4", **ready("h1"))
+    dup = videos("videos/b.mp4", status="processing")
+    videos("videos/b.mp4", status="processing")
+    assert tasks._reuse_cached_output(dup, "videos/b.mp4", "h1")
+    assert deleted == []
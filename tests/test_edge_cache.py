@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app import edge_cache as ec
+
+
+class FakeS3:
+    def __init__(self, size=100):
+        self.size = size
+        self.downloads = []
+
+    def download_file(self, bucket, key, filename):
+        self.downloads.append(key)
+        if key.startswith("missing"):
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        with open(filename, "wb") as f:
+            f.write(b"x" * self.size)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(ec, "get_s3", lambda: fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_hits_are_served_from_disk(tmp_path, s3):
+    cache = ec.EdgeCache(str(tmp_path), 1000)
+    path, size = await cache.get("hls/a/seg_000.ts")
+    assert (path.read_bytes(), size) == (b"x" * 100, 100)
+    assert await cache.get("hls/a/seg_000.ts") == (path, 100)
+    assert s3.downloads == ["hls/a/seg_000.ts"]
+    assert await cache.get("missing.ts") is None
+    stats = cache.report()
+    assert (stats["hits"], stats["misses"], stats["bytes_saved"]) == (1, 2, 100)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_download(tmp_path, s3):
+    cache = ec.EdgeCache(str(tmp_path), 1000)
+    entries = await asyncio.gather(*(cache.get("seg.ts") for _ in range(5)))
+    assert len(set(entries)) == 1
+    assert s3.downloads == ["seg.ts"]
+    assert cache.report()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_is_evicted(tmp_path, s3):
+    cache = ec.EdgeCache(str(tmp_path), 250)
+    a, _ = await cache.get("a.ts")
+    b, _ = await cache.get("b.ts")
+    await cache.get("a.ts")
+    c, _ = await cache.get("c.ts")
+    assert a.exists() and c.exists() and not b.exists()
+    stats = cache.report()
+    assert (stats["evictions"], stats["entries"], stats["size_bytes"]) == (1, 2, 200)
+
+
+@pytest.mark.asyncio
+async def test_pinned_entries_survive_until_released(tmp_path, s3):
+    cache = ec.EdgeCache(str(tmp_path), 150)
+    a, _ = await cache.get("a.ts", pin=True)
+    b, _ = await cache.get("b.ts")
+    c, _ = await cache.get("c.ts")
+    assert a.exists() and not b.exists() and c.exists()
+    cache.release(a)
+    d, _ = await cache.get("d.ts")
+    assert not a.exists() and not c.exists() and d.exists()
+
+
+@pytest.mark.asyncio
+async def test_index_is_rebuilt_from_disk(tmp_path, s3):
+    cache = ec.EdgeCache(str(tmp_path), 1000)
+    await cache.get("a.ts")
+    (tmp_path / "ab").mkdir()
+    (tmp_path / "ab" / "leftover.part").write_bytes(b"partial")
+    restarted = ec.EdgeCache(str(tmp_path), 1000)
+    assert await restarted.get("a.ts") is not None
+    assert s3.downloads == ["a.ts"]
+    assert not (tmp_path / "ab" / "leftover.part").exists()
@@ -0,0 +1,57 @@
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+
+from app import api
+
+PLAYLISTS = {
+    "hls/abc/master.m3u8": ('"m1"', b"#EXTM3U\n", True),
+    "hls/abc/720p/index.m3u8": ('"v1"', b"#EXTM3U\n#EXTINF:4,\nseg_000.ts\n", False),
+    "hls/abc/480p/index.m3u8": ('"v2"', b"#EXTM3U\n#EXTINF:4,\nseg_000.ts\n#EXT-X-ENDLIST\n", True),
+}
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch):
+    monkeypatch.setattr(api, "_load_playlist", PLAYLISTS.get)
+    monkeypatch.setattr(api, "make_video_url", lambda key: f"https://s3.test/{key}?sig")
+    app = FastAPI()
+    app.include_router(api.router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+
+@pytest.mark.asyncio
+async def test_playlist_carries_etag_and_cache_control(client):
+    r = await client.get("/api/hls/abc/master.m3u8")
+    assert r.status_code == 200 and r.content == b"#EXTM3U\n"
+    assert r.headers["etag"] == '"m1"'
+    assert r.headers["cache-control"] == f"public, max-age={api.HLS_MASTER_MAX_AGE}"
+
+    live = await client.get("/api/hls/abc/720p/index.m3u8")
+    assert live.headers["cache-control"] == "no-cache"
+    final = await client.get("/api/hls/abc/480p/index.m3u8")
+    assert final.headers["cache-control"] == f"public, max-age={api.HLS_FINAL_MAX_AGE}"
+
+
+@pytest.mark.asyncio
+async def test_matching_if_none_match_is_a_304(client):
+    r = await client.get("/api/hls/abc/720p/index.m3u8", headers={"If-None-Match": '"v1"'})
+    assert r.status_code == 304 and r.content == b""
+    assert r.headers["etag"] == '"v1"'
+
+    stale = await client.get("/api/hls/abc/720p/index.m3u8", headers={"If-None-Match": '"old"'})
+    assert stale.status_code == 200 and stale.content.startswith(b"#EXTM3U")
+
+
+@pytest.mark.asyncio
+async def test_segments_redirect_and_bad_paths_are_404(client):
+    r = await client.get("/api/hls/abc/720p/seg_000.ts")
+    assert r.status_code == 302
+    assert r.headers["location"] == "https://s3.test/hls/abc/720p/seg_000.ts?sig"
+    assert r.headers["cache-control"].startswith("private")
+
+    assert (await client.get("/api/hls/abc/missing.m3u8")).status_code == 404
+    assert (await client.get("/api/hls/abc/720p/../../x/master.m3u8")).status_code == 404
+    assert (await client.get("/api/hls/a%20b/master.m3u8")).status_code == 404
@@ -0,0 +1,84 @@
+from app.tasks import TS_PACKET_SIZE, _ts_keyframes, write_iframe_playlist
+
+VIDEO_PID = 0x100
+PMT_PID = 0x1000
+
+
+def _packet(pid: int, payload: bytes, pusi: bool = False, random_access: bool = False) -> bytes:
+    header = bytes([0x47, (0x40 if pusi else 0) | pid >> 8, pid & 0xFF])
+    if random_access:
+        header += bytes([0x30, 1, 0x40])
+    else:
+        header += bytes([0x10])
+    return (header + payload).ljust(TS_PACKET_SIZE, b"\xff")
+
+
+def _pat() -> bytes:
+    section = bytes([0x00, 0xB0, 13, 0, 1, 0xC1, 0, 0, 0, 1, 0xE0 | PMT_PID >> 8, PMT_PID & 0xFF]) + b"\0" * 4
+    return _packet(0, b"\0" + section, pusi=True)
+
+
+def _pmt() -> bytes:
+    # one audio (AAC) stream before the H.264 one
+    streams = bytes([0x0F, 0xE1, 0x01, 0xF0, 0]) + bytes([0x1B, 0xE0 | VIDEO_PID >> 8, VIDEO_PID & 0xFF, 0xF0, 0])
+    section = bytes([0x02, 0xB0, 13 + len(streams), 0, 1, 0xC1, 0, 0, 0xE1, 0x00, 0xF0, 0]) + streams + b"\0" * 4
+    return _packet(PMT_PID, b"\0" + section, pusi=True)
+
+
+def _frame(pts_s: float, keyframe: bool, packets: int = 1) -> bytes:
+    pts = int(pts_s * 90000)
+    pts_bytes = bytes([
+        0x21 | (pts >> 29) & 0x0E, (pts >> 22) & 0xFF, (pts >> 14) & 0xFE | 1, (pts >> 7) & 0xFF, (pts << 1) & 0xFE | 1,
+    ])
+    pes = b"\0\0\x01\xe0\0\0\x80\x80\x05" + pts_bytes
+    out = _packet(VIDEO_PID, pes, pusi=True, random_access=keyframe)
+    for _ in range(packets - 1):
+        out += _packet(VIDEO_PID, b"\0" * 10)
+    return out
+
+
+def _segment(path, frames):
+    path.write_bytes(_pat() + _pmt() + b"".join(_frame(*f) for f in frames))
+
+
+def test_keyframes_are_found_with_their_byte_ranges(tmp_path):
+    seg = tmp_path / "seg_000.ts"
+    _segment(seg, [(1.0, True, 2), (1.04, False, 1), (3.0, True, 3)])
+    header, frames = _ts_keyframes(seg)
+    p = TS_PACKET_SIZE
+    assert header == 2 * p
+    assert frames == [(2 * p, 2 * p, 1.0), (5 * p, 3 * p, 3.0)]
+
+
+def test_segment_without_pmt_has_no_keyframes(tmp_path):
+    seg = tmp_path / "seg_000.ts"
+    seg.write_bytes(_frame(1.0, True, 2))
+    assert _ts_keyframes(seg) == (0, [])
+
+
+def test_iframe_playlist(tmp_path):
+    _segment(tmp_path / "seg_000.ts", [(1.0, True, 2), (1.04, False, 1), (3.0, True, 3)])
+    _segment(tmp_path / "seg_001.ts", [(5.0, True, 2)])
+    (tmp_path / "playlist.m3u8").write_text(
+        "#EXTM3U\n#EXTINF:4.0,\nseg_000.ts\n#EXTINF:4.0,\nseg_001.ts\n#EXT-X-ENDLIST\n"
+    )
+    p = TS_PACKET_SIZE
+    # durations 2, 2, 4 s; the second frame is the densest
+    assert write_iframe_playlist(tmp_path) == 3 * p * 8 // 2
+    lines = (tmp_path / "iframes.m3u8").read_text().splitlines()
+    assert "#EXT-X-I-FRAMES-ONLY" in lines
+    assert "#EXT-X-TARGETDURATION:4" in lines
+    assert lines.count(f'#EXT-X-MAP:URI="seg_000.ts",BYTERANGE="{2 * p}@0"') == 1
+    assert lines.count(f'#EXT-X-MAP:URI="seg_001.ts",BYTERANGE="{2 * p}@0"') == 1
+    assert [l for l in lines if l.startswith("#EXT-X-BYTERANGE")] == [
+        f"#EXT-X-BYTERANGE:{2 * p}@{2 * p}", f"#EXT-X-BYTERANGE:{3 * p}@{5 * p}", f"#EXT-X-BYTERANGE:{2 * p}@{2 * p}",
+    ]
+    assert [l for l in lines if l.startswith("#EXTINF")] == ["#EXTINF:2.000,", "#EXTINF:2.000,", "#EXTINF:4.000,"]
+    assert lines[-1] == "#EXT-X-ENDLIST"
+
+
+def test_no_iframe_playlist_without_keyframes(tmp_path):
+    _segment(tmp_path / "seg_000.ts", [(1.0, False, 1)])
+    (tmp_path / "playlist.m3u8").write_text("#EXTM3U\n#EXTINF:4.0,\nseg_000.ts\n")
+    assert write_iframe_playlist(tmp_path) is None
+    assert not (tmp_path / "iframes.m3u8").exists()
@@ -0,0 +1,29 @@
+from app.tasks import Rendition, select_ladder
+
+LADDER = [Rendition("1080p", 1080, 5000), Rendition("720p", 720, 2800), Rendition("480p", 480, 1400), Rendition("360p", 360, 800)]
+
+
+def test_never_upscales():
+    chosen = select_ladder({"width": 1280, "height": 720}, LADDER, audio_only=False)
+    assert [r.label for r in chosen] == ["720p", "480p", "360p"]
+    assert [r.width for r in chosen] == [1280, 854, 640]
+    assert all(r.audio_kbps == 128 for r in chosen)
+
+
+def test_small_source_keeps_native_height():
+    chosen = select_ladder({"width": 320, "height": 241}, LADDER, audio_only=False)
+    assert [(r.label, r.height, r.width, r.video_kbps) for r in chosen] == [("240p", 240, 318, 800)]
+
+
+def test_silent_source():
+    chosen = select_ladder({"width": 1920, "height": 1080, "has_audio": False}, LADDER, audio_only=True)
+    assert len(chosen) == 4
+    assert all(r.audio_kbps == 0 for r in chosen)
+
+
+def test_audio_renditions():
+    chosen = select_ladder({"width": 1920, "height": 1080}, LADDER, audio_only=True)
+    assert chosen[-1].label == "audio" and chosen[-1].height is None
+    # no video stream at all: audio only
+    assert [r.label for r in select_ladder({}, LADDER, audio_only=False)] == ["audio"]
+    assert select_ladder({"has_audio": False}, LADDER, audio_only=False) == []
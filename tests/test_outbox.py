@@ -0,0 +1,80 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlmodel import Session, select
+
+from app.events import EVENTS_CHANNEL, StatusPublisher, VideoStatusEvent
+from app.models import OutboxEvent, Video
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def session_factory(tmp_db):
+    # bound to this test's database: the flush thread outlives the test
+    engine = tmp_db.get_engine()
+    return lambda: Session(engine)
+
+
+@pytest.fixture
+def redis():
+    client = fakeredis.FakeRedis()
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(EVENTS_CHANNEL)
+    pubsub.get_message(timeout=0.1)  # the subscribe confirmation
+    client.received = lambda: [json.loads(m["data"]) for m in iter(lambda: pubsub.get_message(timeout=0.1), None)]
+    return client
+
+
+def add_videos(session_factory, *statuses) -> list[int]:
+    with session_factory() as session:
+        videos = [Video(filename=f"{i}.mp4", s3_key=f"videos/{i}.mp4", status=s) for i, s in enumerate(statuses)]
+        session.add_all(videos)
+        session.commit()
+        return [v.id for v in videos]
+
+
+def outbox(session_factory) -> list[OutboxEvent]:
+    with session_factory() as session:
+        return session.exec(select(OutboxEvent)).all()
+
+
+def test_concurrent_status_writes_are_committed_and_published(session_factory, redis):
+    ids = add_videos(session_factory, *["uploaded"] * 8)
+    publisher = StatusPublisher(redis, session_factory)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda vid: publisher.set_status(vid, "ready", f"/api/hls/{vid}/master.m3u8"), ids))
+    assert results == [True] * 8
+    assert publisher.stats["writes"] == 8 and publisher.stats["flushes"] <= 8
+    with session_factory() as session:
+        assert {v.status for v in session.exec(select(Video))} == {"ready"}
+    events = redis.received()
+    assert sorted(e["id"] for e in events) == ids
+    assert all(e["type"] == "video_status" and e["hls_master"] for e in events)
+    assert outbox(session_factory) == []
+
+
+def test_deleting_and_missing_videos_are_not_updated(session_factory, redis):
+    (video_id,) = add_videos(session_factory, "deleting")
+    publisher = StatusPublisher(redis, session_factory)
+    assert publisher.set_status(video_id, "ready") is False
+    assert publisher.set_status(video_id + 1, "ready") is False
+    with session_factory() as session:
+        assert session.get(Video, video_id).status == "deleting"
+    assert redis.received() == [] and outbox(session_factory) == []
+
+
+def test_rows_left_in_the_outbox_are_relayed_later(session_factory, redis):
+    (video_id,) = add_videos(session_factory, "uploaded")
+    # Redis unreachable: the status change commits, its event waits
+    assert StatusPublisher(None, session_factory).set_status(video_id, "processing")
+    with session_factory() as session:
+        session.add(OutboxEvent(channel=EVENTS_CHANNEL, payload=VideoStatusEvent(id=video_id, status="deleted").to_json()))
+        session.commit()
+    assert len(outbox(session_factory)) == 2
+
+    publisher = StatusPublisher(redis, session_factory)
+    publisher._relay_pending()
+    assert [e["status"] for e in redis.received()] == ["processing", "deleted"]
+    assert outbox(session_factory) == []
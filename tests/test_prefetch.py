@@ -0,0 +1,75 @@
+import pytest
+from sqlmodel import select
+
+from app import api
+from app.models import Room, Video
+
+MASTER = b"""#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=3000000,RESOLUTION=1280x720
+720p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=900000,RESOLUTION=640x360
+360p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=1800000,RESOLUTION=854x480
+480p/index.m3u8
+"""
+VARIANT = b"#EXTM3U\n" + b"".join(b"#EXTINF:4,\nseg_%03d.ts\n" % i for i in range(5))
+PLAYLISTS = {
+    "hls/abc/master.m3u8": ('"m"', MASTER, True),
+    "hls/abc/720p/index.m3u8": ('"a"', VARIANT, True),
+    "hls/abc/360p/index.m3u8": ('"b"', VARIANT, True),
+    "hls/abc/480p/index.m3u8": ('"c"', VARIANT, True),
+}
+
+
+class FakeEdgeCache:
+    def __init__(self):
+        self.warmed = []
+
+    async def warm(self, key):
+        self.warmed.append(key)
+        return True
+
+
+@pytest.fixture
+def video(tmp_db, monkeypatch):
+    monkeypatch.setattr(api, "_load_playlist", PLAYLISTS.get)
+    with tmp_db.get_session() as session:
+        v = Video(filename="abc.mp4", s3_key="videos/abc.mp4", hls_master="/api/hls/abc/master.m3u8", status="ready")
+        session.add(v)
+        session.commit()
+        yield v.id
+
+
+@pytest.mark.asyncio
+async def test_prefetch_warms_the_start_segments(tmp_db, video, monkeypatch):
+    cache = FakeEdgeCache()
+    monkeypatch.setattr(api, "get_edge_cache", lambda: cache)
+    monkeypatch.setattr(api, "ROOM_PREFETCH_SEGMENTS", 2)
+    keys = await api.prefetch_video(video)
+    # first listed variant and the lowest-bandwidth one
+    expected = ["hls/abc/720p/seg_000.ts", "hls/abc/720p/seg_001.ts", "hls/abc/360p/seg_000.ts", "hls/abc/360p/seg_001.ts"]
+    assert keys == expected
+    assert sorted(cache.warmed) == sorted(expected)
+    assert await api.prefetch_video(video + 1) == []
+    await tmp_db.dispose_engines()
+
+
+@pytest.mark.asyncio
+async def test_prefetch_is_a_no_op_without_the_edge_cache(video, monkeypatch):
+    monkeypatch.setattr(api, "get_edge_cache", lambda: None)
+    monkeypatch.setattr(api, "_load_playlist", lambda key: pytest.fail(f"fetched {key}"))
+    assert await api.prefetch_video(video) == []
+
+
+@pytest.mark.asyncio
+async def test_room_video_is_stored_for_existing_rooms_only(tmp_db, video, monkeypatch):
+    monkeypatch.setattr(api, "ROOM_PREFETCH_SEGMENTS", 0)
+    with tmp_db.get_session() as session:
+        session.add(Room(code="movie-night"))
+        session.commit()
+    await api._select_room_video("movie-night", video)
+    await api._select_room_video("made-up-code", video)
+    with tmp_db.get_session() as session:
+        rooms = session.exec(select(Room)).all()
+    assert [(r.code, r.video_id) for r in rooms] == [("movie-night", video)]
+    await tmp_db.dispose_engines()
@@ -0,0 +1,59 @@
+import math
+
+from app.protocol import BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL, choose_subprotocol, decode_binary, encode_binary
+
+
+def test_event_round_trip():
+    message = {"type": "seek", "position": 12.5, "rate": 1.5, "paused": True, "videoId": 7, "serverTime": 1700000000123}
+    frame = encode_binary(message)
+    assert len(frame) == 26
+    assert decode_binary(frame) == message
+
+
+def test_state_round_trip_with_eid():
+    message = {
+        "type": "state", "position": 3.0, "rate": 1.0, "paused": False, "videoId": None,
+        "serverTime": 1700000000000, "now": 1700000000500, "eid": "1700000000000-3",
+    }
+    frame = encode_binary(message)
+    assert len(frame) == 34 + 16
+    assert decode_binary(frame) == message
+
+
+def test_ping_pong_round_trip():
+    assert decode_binary(encode_binary({"type": "ping", "t0": 5})) == {"type": "ping", "t0": 5}
+    assert decode_binary(encode_binary({"type": "pong", "t0": 5, "t1": 9})) == {"type": "pong", "t0": 5, "t1": 9}
+
+
+def test_malformed_eid_is_dropped():
+    frame = encode_binary({"type": "play", "position": 1.0, "eid": "not-an-id"})
+    assert len(frame) == 26
+    assert "eid" not in decode_binary(frame)
+
+
+def test_values_out_of_range_fall_back_to_json():
+    assert encode_binary({"type": "video", "videoId": 2 ** 31}) is None
+    assert encode_binary({"type": "video", "videoId": -2 ** 31 - 1}) is None
+    assert encode_binary({"type": "ping", "t0": 2 ** 63}) is None
+    assert encode_binary({"type": "video", "videoId": math.nan}) is None
+
+
+def test_messages_without_binary_form():
+    assert encode_binary({"type": "chat", "text": "hi"}) is None
+    assert encode_binary({}) is None
+
+
+def test_decode_rejects_bad_frames():
+    frame = encode_binary({"type": "pause", "position": 1.0})
+    assert decode_binary(b"") is None
+    assert decode_binary(b"\xff" + frame[1:]) is None
+    assert decode_binary(frame[:-1]) is None
+    assert decode_binary(frame + b"\x00") is None
+    # eid flag set but no eid attached
+    assert decode_binary(frame[:1] + bytes([frame[1] | 2]) + frame[2:]) is None
+
+
+def test_choose_subprotocol():
+    assert choose_subprotocol([JSON_SUBPROTOCOL, BINARY_SUBPROTOCOL]) == BINARY_SUBPROTOCOL
+    assert choose_subprotocol([BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL], allow_binary=False) == JSON_SUBPROTOCOL
+    assert choose_subprotocol(["other"]) is None
@@ -0,0 +1,63 @@
+from app.room_state import MAX_VIDEO_ID, PlaybackState
+
+
+def test_play_extrapolates_position():
+    state = PlaybackState()
+    assert state.apply({"type": "play", "position": 10.0}, t_ms=1000)
+    assert not state.paused
+    assert state.position_at(3000) == 12.0
+    assert state.apply({"type": "rate", "rate": 2.0}, t_ms=3000)
+    assert state.position == 12.0
+    assert state.position_at(4000) == 14.0
+
+
+def test_pause_freezes_position():
+    state = PlaybackState()
+    state.apply({"type": "play", "position": 0.0}, t_ms=1000)
+    state.apply({"type": "pause"}, t_ms=6000)
+    assert state.paused
+    assert state.position == 5.0
+    assert state.position_at(60000) == 5.0
+
+
+def test_video_resets_playback():
+    state = PlaybackState()
+    state.apply({"type": "play", "position": 42.0}, t_ms=1000)
+    assert state.apply({"type": "video", "videoId": 3}, t_ms=2000)
+    assert (state.video_id, state.position, state.paused) == (3, 0.0, True)
+
+
+def test_invalid_events_leave_state_untouched():
+    state = PlaybackState()
+    state.apply({"type": "video", "videoId": 3}, t_ms=1000)
+    before = state.to_dict()
+    for video_id in (MAX_VIDEO_ID + 1, -1, 1.5, float("nan"), True, "3"):
+        assert not state.apply({"type": "video", "videoId": video_id}, t_ms=2000)
+    assert not state.apply({"type": "chat", "text": "hi"}, t_ms=2000)
+    assert state.to_dict() == before
+
+
+def test_bad_numbers_are_ignored_and_rate_is_clamped():
+    state = PlaybackState()
+    state.apply({"type": "seek", "position": 5.0}, t_ms=1000)
+    state.apply({"type": "seek", "position": float("inf")}, t_ms=1000)
+    assert state.position == 5.0
+    state.apply({"type": "seek", "position": -3}, t_ms=1000)
+    assert state.position == 0.0
+    state.apply({"type": "rate", "rate": 1000}, t_ms=1000)
+    assert state.rate == 16.0
+
+
+def test_snapshot_and_round_trip():
+    state = PlaybackState()
+    state.apply({"type": "video", "videoId": 9}, t_ms=1000)
+    state.apply({"type": "play", "position": 1.0}, t_ms=2000)
+    assert state.snapshot() == {"videoId": 9, "position": 1.0, "rate": 1.0, "paused": False, "serverTime": 2000}
+    state.updated_at = 0  # not expired
+    assert PlaybackState.from_dict(state.to_dict()) == state
+    assert PlaybackState.from_dict(None) == PlaybackState()
+
+
+def test_expired_state_starts_over():
+    state = PlaybackState(video_id=1, position=30.0, updated_at=1)
+    assert PlaybackState.from_dict(state.to_dict()) == PlaybackState()
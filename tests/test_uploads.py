@@ -0,0 +1,113 @@
+import hashlib
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app import api
+from app import s3 as s3_mod
+from app.db import get_async_session
+from app.uploads import StreamingUpload
+
+
+class FakeS3:
+    """Stands in for the multipart helpers of app.s3; records every call."""
+
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.parts = {}
+        self.put = []
+        self.completed = []
+        self.aborted = []
+
+    def start(self, key):
+        return "upload-1"
+
+    def upload_part(self, key, upload_id, part_number, data):
+        if part_number == self.fail_part:
+            raise ConnectionError("part upload failed")
+        self.parts[part_number] = data
+        return f"etag-{part_number}"
+
+    def complete(self, key, upload_id, parts):
+        self.completed.append(sorted(p["PartNumber"] for p in parts))
+
+    def abort(self, key, upload_id):
+        self.aborted.append(upload_id)
+
+    def put_object(self, **kwargs):
+        self.put.append(kwargs)
+
+
+@pytest.fixture
+def fake_s3(monkeypatch):
+    def install(**kwargs):
+        fake = FakeS3(**kwargs)
+        monkeypatch.setattr(s3_mod, "start_multipart_upload", fake.start)
+        monkeypatch.setattr(s3_mod, "upload_part", fake.upload_part)
+        monkeypatch.setattr(s3_mod, "complete_multipart_upload", fake.complete)
+        monkeypatch.setattr(s3_mod, "abort_multipart_upload", fake.abort)
+        monkeypatch.setattr(s3_mod, "get_s3", lambda: fake)
+        return fake
+    return install
+
+
+@pytest.mark.asyncio
+async def test_small_body_is_a_single_put(fake_s3):
+    fake = fake_s3()
+    upload = StreamingUpload("videos/a.mp4", part_size=10)
+    await upload.write(b"hello")
+    assert await upload.finish() == "videos/a.mp4"
+    assert fake.put[0]["Body"] == b"hello"
+    assert not fake.completed and upload.sha256 == hashlib.sha256(b"hello").hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_large_body_is_sent_in_parts(fake_s3):
+    fake = fake_s3()
+    upload = StreamingUpload("videos/a.mp4", part_size=10, concurrency=2)
+    body = bytes(range(35))
+    for i in range(0, len(body), 7):
+        await upload.write(body[i:i + 7])
+    await upload.finish()
+    assert fake.completed == [[1, 2, 3, 4]]
+    assert b"".join(fake.parts[n] for n in sorted(fake.parts)) == body
+    assert upload.size == 35 and not fake.aborted
+
+
+@pytest.mark.asyncio
+async def test_failed_part_aborts_instead_of_completing(fake_s3):
+    fake = fake_s3(fail_part=2)
+    upload = StreamingUpload("videos/a.mp4", part_size=10, concurrency=4)
+    await upload.write(b"x" * 30)
+    with pytest.raises(ConnectionError):
+        await upload.finish()
+    assert fake.completed == []
+    assert fake.aborted == ["upload-1"]
+
+
+@pytest.mark.asyncio
+async def test_failed_part_surfaces_on_the_next_write(fake_s3):
+    fake = fake_s3(fail_part=1)
+    upload = StreamingUpload("videos/a.mp4", part_size=10, concurrency=1)
+    with pytest.raises(ConnectionError):
+        for _ in range(5):
+            await upload.write(b"x" * 10)
+    await upload.abort()
+    await upload.abort()
+    assert fake.aborted == ["upload-1"]
+    assert fake.completed == []
+
+
+@pytest.mark.asyncio
+async def test_multipart_body_without_boundary_is_rejected(fake_s3):
+    fake = fake_s3()
+    app = FastAPI()
+    app.include_router(api.router)
+    app.dependency_overrides[get_async_session] = lambda: None
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        r = await client.post("/api/videos", content=b"--x\r\n", headers={"content-type": "multipart/form-data"})
+    assert r.status_code == 400
+    assert "boundary" in r.json()["detail"]
+    assert not fake.put and not fake.completed
@@ -0,0 +1,47 @@
+import pytest
+
+from app import s3 as s3_mod
+from app.s3 import UrlCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(s3_mod.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = UrlCache(maxsize=10, ttl=60)
+    cache.put("a", "url-a")
+    clock[0] += 59
+    assert cache.get("a") == "url-a"
+    clock[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 0, "maxsize": 10, "hits": 1, "misses": 1}
+
+
+def test_put_ttl_overrides_default(clock):
+    cache = UrlCache(maxsize=10, ttl=60)
+    cache.put("a", "url-a", ttl=5)
+    clock[0] += 5
+    assert cache.get("a") is None
+    cache.put("b", "url-b", ttl=0)
+    assert cache.get("b") is None
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = UrlCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = UrlCache(maxsize=0, ttl=60)
+    cache.put("a", 1)
+    assert cache.get("a") is None
@@ -0,0 +1,207 @@
+import asyncio
+import json
+
+import pytest
+
+from app import websocket
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+class FakeSocket:
+    def __init__(self, gate=None, fail=False):
+        self.sent = []
+        self.closed_with = None
+        # a cleared gate stalls every send, like a viewer on a slow link
+        self.gate = gate
+        self.fail = fail
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, data):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        if self.gate is not None:
+            await self.gate.wait()
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_redis_rooms_share_one_subscription_per_process():
+    manager = websocket.RedisManager()
+    manager._redis = fakeredis.FakeAsyncRedis()
+    a, b, other = FakeSocket(), FakeSocket(), FakeSocket()
+    await manager.connect("r1", a)
+    await manager.connect("r1", b)
+    await manager.connect("r2", other)
+    assert set(manager._pubsub.channels) == {b"room:r1", b"room:r2"}
+
+    await manager.broadcast("r1", {"type": "play"})
+    await until(lambda: a.sent and b.sent)
+    assert a.sent == b.sent == [{"type": "play"}] and other.sent == []
+
+    await manager.disconnect("r1", a)
+    assert b"room:r1" in manager._pubsub.channels
+    await manager.disconnect("r1", b)
+    await until(lambda: b"room:r1" not in manager._pubsub.channels)
+    assert "r1" not in manager.rooms
+    await manager.close()
+
+
+async def stalled_sender(policy, closed):
+    """A sender whose writer is stuck on "0" with a full queue of "1", "2"."""
+    ws = FakeSocket(gate=asyncio.Event())
+    sender = websocket.SocketSender(ws, on_close=lambda: closed.append(True), maxsize=2, policy=policy)
+    sender.send('"0"')
+    await asyncio.sleep(0)
+    sender.send('"1"')
+    sender.send('"2"')
+    return ws, sender
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_discards_the_stalest_queued_message():
+    closed = []
+    ws, sender = await stalled_sender("drop_oldest", closed)
+    sender.send('"3"')
+    assert sender.dropped == 1
+    ws.gate.set()
+    await until(lambda: len(ws.sent) == 3)
+    assert ws.sent == ["0", "2", "3"] and not closed
+    await sender.aclose()
+
+
+@pytest.mark.asyncio
+async def test_coalesce_keeps_only_the_newest_message():
+    closed = []
+    ws, sender = await stalled_sender("coalesce", closed)
+    sender.send('"3"')
+    assert sender.dropped == 2
+    ws.gate.set()
+    await until(lambda: len(ws.sent) == 2)
+    assert ws.sent == ["0", "3"] and not closed
+    await sender.aclose()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_policy_closes_the_slow_socket():
+    closed = []
+    ws, sender = await stalled_sender("disconnect", closed)
+    sender.send('"3"')
+    assert sender.closed and closed == [True]
+    await until(lambda: ws.closed_with == 1013)
+    sender.send('"4"')
+    assert ws.sent == []
+
+
+@pytest.mark.asyncio
+async def test_failed_send_drops_the_socket_from_its_room():
+    manager = websocket.InMemoryManager()
+    ok, broken = FakeSocket(), FakeSocket(fail=True)
+    await manager.connect("r", ok)
+    await manager.connect("r", broken)
+    await manager.broadcast("r", {"type": "pause"})
+    await until(lambda: len(manager.rooms["r"]) == 1)
+    assert ok.sent == [{"type": "pause"}]
+    await manager.close()
+
+
+class RecordingManager:
+    def __init__(self):
+        self.sent = []
+
+    async def broadcast(self, room, message, origin=None):
+        self.sent.append((room, message["type"], message.get("position"), origin))
+
+
+@pytest.mark.asyncio
+async def test_seek_burst_sends_first_and_newest_only():
+    manager = RecordingManager()
+    coalescer = websocket.EventCoalescer(window=0.05)
+    for position in (1, 2, 3):
+        await coalescer.publish(manager, "r", {"type": "seek", "position": position}, origin="c1")
+    await coalescer.publish(manager, "other", {"type": "seek", "position": 9})
+    assert manager.sent == [("r", "seek", 1, "c1"), ("other", "seek", 9, None)]
+    await until(lambda: not coalescer._windows)
+    assert manager.sent[2:] == [("r", "seek", 3, "c1")]
+
+
+@pytest.mark.asyncio
+async def test_other_events_pass_through_and_drop_the_held_seek():
+    manager = RecordingManager()
+    coalescer = websocket.EventCoalescer(window=0.05)
+    await coalescer.publish(manager, "r", {"type": "seek", "position": 1})
+    await coalescer.publish(manager, "r", {"type": "seek", "position": 2})
+    await coalescer.publish(manager, "r", {"type": "play", "position": 2})
+    assert [m[1] for m in manager.sent] == ["seek", "play"]
+    await until(lambda: not coalescer._windows)
+    assert [m[1] for m in manager.sent] == ["seek", "play"]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_skips_the_socket_it_came_from():
+    manager = websocket.InMemoryManager()
+    a, b = FakeSocket(), FakeSocket()
+    origin = await manager.connect("r", a)
+    await manager.connect("r", b)
+    await manager.broadcast("r", {"type": "play"}, origin=origin)
+    await until(lambda: b.sent)
+    assert a.sent == [] and b.sent == [{"type": "play"}]
+    await manager.close()
+
+
+@pytest.fixture
+def streams(monkeypatch):
+    manager = websocket.StreamsManager()
+    manager._redis = fakeredis.FakeAsyncRedis()
+    # the reader is started by hand so the test controls where it lags
+    start = manager._start
+    monkeypatch.setattr(manager, "_start", lambda: None)
+    return manager, start
+
+
+@pytest.mark.asyncio
+async def test_resumed_socket_gets_missed_events_exactly_once(streams):
+    manager, start = streams
+    live, resumed = FakeSocket(), FakeSocket()
+    await manager.connect("r", live)
+    for position in (1, 2, 3):
+        await manager.broadcast("r", {"type": "seek", "position": position})
+    first = (await manager._redis.xrange(manager._stream("r"), count=1))[0][0].decode()
+
+    await manager.connect("r", resumed, last_event_id=first)
+    await until(lambda: len(resumed.sent) == 2)
+    assert [m["position"] for m in resumed.sent] == [2, 3]
+    assert all(m["eid"] for m in resumed.sent)
+
+    # the reader is still behind the replay: it must skip the resumed socket
+    start()
+    await until(lambda: len(live.sent) == 3)
+    await manager.broadcast("r", {"type": "seek", "position": 4})
+    await until(lambda: len(live.sent) == 4 and len(resumed.sent) == 3)
+    assert [m["position"] for m in resumed.sent] == [2, 3, 4]
+    assert manager._replayed == {}
+    assert await manager.presence("r") == 2
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_invalid_last_event_id_replays_nothing(streams):
+    manager, start = streams
+    await manager.broadcast("r", {"type": "play"})
+    ws = FakeSocket()
+    await manager.connect("r", ws, last_event_id="not-an-id")
+    await asyncio.sleep(0.05)
+    assert ws.sent == [] and manager._replayed == {}
+    await manager.close()